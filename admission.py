@@ -0,0 +1,166 @@
+"""
+Admission control for the Flask and ASGI APIs
+Each endpoint class has its own concurrency limit and a bounded wait
+queue, so a burst of exports or unfiltered data downloads cannot occupy
+every worker thread while dashboard clicks wait behind them. A request
+that finds its class full and its queue full, or that waits longer than
+the class allows, is shed at once with 503 and Retry-After.
+"""
+
+import functools
+import os
+import threading
+import time
+
+# class name -> (max concurrent, max waiting, max wait seconds, Retry-After seconds)
+CLASS_LIMITS = {
+    'interactive': (int(os.environ.get('ADMIT_INTERACTIVE', 16)), 64, 5.0, 1),
+    'bulk': (int(os.environ.get('ADMIT_BULK', 4)), 8, 2.0, 5),
+    'export': (int(os.environ.get('ADMIT_EXPORT', 2)), 2, 1.0, 15),
+}
+
+
+def data_class(filters, arrow):
+    """Unfiltered or Arrow downloads are bulk; narrowed dashboard queries are interactive."""
+    if arrow or not (filters['product'] or filters['pickup_dates'] or filters['date_start']):
+        return 'bulk'
+    return 'interactive'
+
+
+# Flask endpoint (view name) -> class name, or a callable (filters, wants
+# Arrow) -> class name when the cost depends on the query. The one table for
+# both the Flask views (app.admitted) and asgi.py's native routes, whose
+# handlers share the view names.
+ENDPOINT_CLASSES = {
+    'summary': 'interactive',
+    'data': data_class,
+    'table': 'interactive',
+    'product_by_day': 'bulk',
+    'totals': 'interactive',
+    'trend': 'interactive',
+    'lookup': 'interactive',
+    'pickup_queue_status': 'interactive',
+    'pickup_queue_days': 'interactive',
+    'seasons_summary': 'interactive',
+    'export_pdf': 'export',
+    'export_product_by_day_pdf': 'export',
+    'export_xls': 'export',
+}
+
+
+class AdmissionClass:
+    """Counting gate with a bounded, timed wait queue."""
+
+    def __init__(self, name, max_concurrent, max_waiting, max_wait, retry_after):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0, "wait_seconds": 0.0}
+
+    def try_acquire(self):
+        """Admit at once if a slot is free and nobody is queued; never waits."""
+        with self._cond:
+            if self.in_flight < self.max_concurrent and not self.waiting:
+                self.in_flight += 1
+                self._stats["admitted"] += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Return True once admitted, or False if the request should be shed."""
+        with self._cond:
+            if self.in_flight < self.max_concurrent and not self.waiting:
+                self.in_flight += 1
+                self._stats["admitted"] += 1
+                return True
+            if self.waiting >= self.max_waiting:
+                self._stats["rejected_full"] += 1
+                return False
+            self.waiting += 1
+            self._stats["queued"] += 1
+            started = time.monotonic()
+            deadline = started + self.max_wait
+            try:
+                while self.in_flight >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["rejected_timeout"] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self.in_flight += 1
+                self._stats["admitted"] += 1
+                return True
+            finally:
+                self.waiting -= 1
+                self._stats["wait_seconds"] += time.monotonic() - started
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "limit": self.max_concurrent,
+                "queue_limit": self.max_waiting,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+
+classes = {name: AdmissionClass(name, *limits) for name, limits in CLASS_LIMITS.items()}
+
+
+def overloaded_payload(name):
+    """JSON body of the 503 sent when a request of a class is shed."""
+    return {
+        "success": False,
+        "error": f"Server busy ({name} requests at capacity). Please retry shortly.",
+        "overloaded": True,
+        "retry_after": classes[name].retry_after,
+    }
+
+
+def limit(admission_class):
+    """
+    Decorator placing a Flask view in an admission class.
+
+    Args:
+        admission_class: Class name, or a callable returning one for the
+            current request (e.g. unfiltered downloads count as bulk)
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify
+            name = admission_class() if callable(admission_class) else admission_class
+            gate = classes[name]
+            if not gate.acquire():
+                response = jsonify(overloaded_payload(name))
+                response.status_code = 503
+                response.headers['Retry-After'] = str(gate.retry_after)
+                return response
+            try:
+                return view(*args, **kwargs)
+            finally:
+                gate.release()
+        return wrapper
+    return decorator
+
+
+def endpoint_class(endpoint, filters=None, arrow=False):
+    """Admission class of an endpoint for a request, or None if it is not limited."""
+    name = ENDPOINT_CLASSES.get(endpoint)
+    return name(filters, arrow) if callable(name) else name
+
+
+def metrics():
+    """Per-class concurrency, queue depth and rejection counters."""
+    return {name: gate.metrics() for name, gate in classes.items()}
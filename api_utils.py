@@ -3,6 +3,7 @@ Shared utilities for API functions
 This module contains common functions used across all API endpoints
 """
 
+import numpy as np
 import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
@@ -10,6 +11,12 @@ import os
 import json
 import base64
 import time
+import threading
+import logging
+
+import schema_registry
+from request_profiler import stage
+from sheets_scheduler import scheduler, is_rate_limit_error, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
 
 # Google Sheets configuration
 SPREADSHEET_ID = "1YAHO5rHhFVEReyAuxa7r2SDnoH7BnDfsmSEZ1LyjB8A"
@@ -21,10 +28,27 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive.readonly"
 ]
 
-# Cache for data loading to reduce API calls
+# Cache for data loading to reduce API calls. The published OrderStore is an
+# immutable snapshot: refreshes build a new one and swap the reference.
 _data_cache = None
-_cache_timestamp = None
 CACHE_DURATION = 300  # Cache for 5 minutes
+_data_version = 0
+_load_lock = threading.Lock()  # One Sheets fetch at a time
+_publish_lock = threading.Lock()  # Serializes version numbering and the swap
+
+# Refresh coordination for push invalidation
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+_refresh_pending = False
+
+# Callables run after each refresh as listener(old_store, new_store, changed_order_ids)
+_refresh_listeners = []
+
+# Set by the ASGI server: called instead of fetching on the caller's thread
+# when a stale snapshot exists
+_stale_handler = None
+
+logger = logging.getLogger(__name__)
 
 
 def get_credentials():
@@ -39,227 +63,570 @@ def get_credentials():
     return Credentials.from_service_account_file(creds_path, scopes=SCOPES)
 
 
-def load_data():
-    """Load and merge data from Google Sheets with caching."""
-    global _data_cache, _cache_timestamp
-    
-    current_time = time.time()
-    
-    # Return cached data if available and not expired
-    if _data_cache is not None and _cache_timestamp is not None:
-        if current_time - _cache_timestamp < CACHE_DURATION:
-            return _data_cache
+def load_data(force=False, priority=PRIORITY_INTERACTIVE):
+    """Load orders and line items from Google Sheets with caching.
+
+    Returns the current OrderStore snapshot. Pass force=True to bypass the
+    cache expiry, e.g. after an invalidation. Concurrent callers share a
+    single fetch, and Sheets calls go through the shared quota scheduler at
+    the given priority. While a refresh is in progress, readers get the
+    stale snapshot immediately instead of queueing behind the fetch.
+    """
+    snapshot = _data_cache
+    if not force and is_fresh(snapshot):
+        return snapshot
+    if not force and snapshot is not None and _stale_handler is not None:
+        _stale_handler()
+        return snapshot
+    if not force and snapshot is not None and _load_lock.locked():
+        return snapshot
     
-    try:
+    with _load_lock:
+        # Another thread may have refreshed while we waited for the lock
+        snapshot = _data_cache
+        if not force and is_fresh(snapshot):
+            return snapshot
+        
+        try:
+            import snapshot_sync
+            if snapshot_sync.enabled():
+                # Several nodes: one elected node fetches, the others pull its snapshot
+                return snapshot_sync.sync(priority, force)
+            import data_sources
+            customer_orders_df, bakery_products_df = data_sources.fetch_all(priority)
+            with stage('build'):
+                store = build_order_store(customer_orders_df, bakery_products_df, copy=False)
+            return publish_snapshot(store)
+        except Exception as e:
+            if snapshot is not None:
+                return snapshot
+            raise Exception(f"Error loading data: {str(e)}")
+
+
+def fetch_sheets(priority=PRIORITY_INTERACTIVE, spreadsheet_id=None, orders_sheet=None, products_sheet=None):
+    """
+    Read both sheets and convert their date and numeric columns.
+
+    Args:
+        priority: Quota scheduler priority class
+        spreadsheet_id: Spreadsheet to read (default SPREADSHEET_ID), e.g.
+            a previous season's copy being archived or another store's
+        orders_sheet, products_sheet: Sheet names (default
+            CUSTOMER_ORDERS_SHEET_NAME and BAKERY_PRODUCTS_SHEET_NAME)
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df)
+    """
+    with stage('fetch'):
         creds = get_credentials()
         client = gspread.authorize(creds)
         
         # Read Customer Orders
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        orders_sheet = spreadsheet.worksheet(CUSTOMER_ORDERS_SHEET_NAME)
-        customer_orders_data = orders_sheet.get_all_records()
+        spreadsheet = scheduler.call(client.open_by_key, spreadsheet_id or SPREADSHEET_ID, priority=priority)
+        orders_worksheet = scheduler.call(spreadsheet.worksheet, orders_sheet or CUSTOMER_ORDERS_SHEET_NAME, priority=priority)
+        customer_orders_data = scheduler.call(orders_worksheet.get_all_records, priority=priority)
         customer_orders_df = pd.DataFrame(customer_orders_data)
         
         # Read Bakery Products
-        products_sheet = spreadsheet.worksheet(BAKERY_PRODUCTS_SHEET_NAME)
-        bakery_products_data = products_sheet.get_all_records()
+        products_worksheet = scheduler.call(spreadsheet.worksheet, products_sheet or BAKERY_PRODUCTS_SHEET_NAME, priority=priority)
+        bakery_products_data = scheduler.call(products_worksheet.get_all_records, priority=priority)
         bakery_products_df = pd.DataFrame(bakery_products_data)
-        
-        # Ensure date columns are read as strings/text
-        date_columns = ['Order Date', 'Due Pickup Date', 'Pickup Timestamp', 'Due Date']
-        for col in date_columns:
-            if col in customer_orders_df.columns:
-                customer_orders_df[col] = customer_orders_df[col].astype(str).replace('nan', '')
-            if col in bakery_products_df.columns:
-                bakery_products_df[col] = bakery_products_df[col].astype(str).replace('nan', '')
-        
-        # Parse dates from text
-        customer_orders_df = parse_dates(customer_orders_df)
-        bakery_products_df = parse_dates(bakery_products_df)
-        
-        # Merge data
-        if 'OrderID' in customer_orders_df.columns and 'OrderID' in bakery_products_df.columns:
-            customer_orders_df['OrderID'] = customer_orders_df['OrderID'].astype(str).str.strip().str.upper()
-            bakery_products_df['OrderID'] = bakery_products_df['OrderID'].astype(str).str.strip().str.upper()
-            
-            merged_df = pd.merge(
-                customer_orders_df,
-                bakery_products_df,
-                on='OrderID',
-                how='inner',
-                suffixes=('', '_product')
-            )
-        else:
-            merged_df = customer_orders_df
-        
-        # Update cache
-        _data_cache = merged_df
-        _cache_timestamp = current_time
-        
-        return merged_df
-    except Exception as e:
-        if _data_cache is not None:
-            return _data_cache
-        raise Exception(f"Error loading data: {str(e)}")
+    
+    # Parse dates and numbers once, using the plan compiled for these headers
+    with stage('parse'):
+        schema_registry.prepare_frames(customer_orders_df, bakery_products_df, spreadsheet_id or SPREADSHEET_ID)
+    
+    return customer_orders_df, bakery_products_df
 
 
-def parse_dates(df):
-    """Parse date columns from various formats."""
-    df = df.copy()
-    
-    # Parse Order Date
-    if 'Order Date' in df.columns:
-        df['Order Date'] = df['Order Date'].astype(str).replace(['nan', 'None', ''], '')
-        df['Order Date'] = pd.to_datetime(df['Order Date'], errors='coerce', format='%m-%d-%Y')
-        mask_not_parsed = df['Order Date'].isna()
-        if mask_not_parsed.any():
-            df.loc[mask_not_parsed, 'Order Date'] = pd.to_datetime(
-                df.loc[mask_not_parsed, 'Order Date'],
-                errors='coerce',
-                format='%m/%d/%Y'
-            )
-        mask_still_not_parsed = df['Order Date'].isna()
-        if mask_still_not_parsed.any():
-            df.loc[mask_still_not_parsed, 'Order Date'] = pd.to_datetime(
-                df.loc[mask_still_not_parsed, 'Order Date'],
-                errors='coerce',
-                dayfirst=False,
-                yearfirst=False
-            )
+def is_fresh(snapshot):
+    """Return True if a snapshot is younger than CACHE_DURATION."""
+    return snapshot is not None and time.time() - snapshot.loaded_at < CACHE_DURATION
+
+
+def current_snapshot():
+    """Return the published snapshot without triggering a load (may be None)."""
+    return _data_cache
+
+
+def publish_snapshot(store, loaded_at=None, version=None):
+    """
+    Atomically swap a freshly built store in as the current snapshot.
+
+    The version is only bumped when some order actually changed, so clients
+    holding the current version have nothing to re-query. A version numbered
+    elsewhere (a snapshot pulled from the shared store) is used as given, so
+    every node serves the same numbering. Refresh listeners run after the
+    swap, outside the lock.
+
+    Returns:
+        The snapshot now being served
+    """
+    global _data_cache, _data_version
+    loaded_at = time.time() if loaded_at is None else loaded_at
     
-    # Parse Due Pickup Date
-    if 'Due Pickup Date' in df.columns:
-        original_col = df['Due Pickup Date'].copy()
-        df['Due Pickup Date'] = df['Due Pickup Date'].astype(str)
-        df['Due Pickup Date'] = df['Due Pickup Date'].replace(['nan', 'None', 'NaT', 'NaN'], '')
-        
-        mask_not_empty = df['Due Pickup Date'].str.strip() != ''
+    with _publish_lock:
+        previous = _data_cache
+        changed_order_ids = changed_orders(previous, store)
+        if previous is not None and not changed_order_ids and version in (None, previous.version):
+            _data_cache = previous.restamp(loaded_at)
+            return _data_cache
         
-        if mask_not_empty.any():
-            original_strings = original_col.astype(str).replace(['nan', 'None', 'NaT', 'NaN'], '')
-            
-            parsed_dates = pd.to_datetime(
-                original_strings.loc[mask_not_empty], 
-                errors='coerce', 
-                format='%m-%d-%Y'
-            )
-            df.loc[mask_not_empty, 'Due Pickup Date'] = parsed_dates
-            
-            mask_not_parsed = df['Due Pickup Date'].isna() & mask_not_empty
-            if mask_not_parsed.any():
-                df.loc[mask_not_parsed, 'Due Pickup Date'] = pd.to_datetime(
-                    original_strings.loc[mask_not_parsed], 
-                    errors='coerce', 
-                    format='%m/%d/%Y'
-                )
-            
-            mask_still_not_parsed = df['Due Pickup Date'].isna() & mask_not_empty
-            if mask_still_not_parsed.any():
-                df.loc[mask_still_not_parsed, 'Due Pickup Date'] = pd.to_datetime(
-                    original_strings.loc[mask_still_not_parsed], 
-                    errors='coerce', 
-                    dayfirst=False, 
-                    yearfirst=False
-                )
-    
-    # Parse Pickup Timestamp
-    if 'Pickup Timestamp' in df.columns:
-        df['Pickup Timestamp'] = df['Pickup Timestamp'].astype(str).replace(['nan', 'None', ''], '')
-        df['Pickup Timestamp'] = pd.to_datetime(df['Pickup Timestamp'], errors='coerce', dayfirst=False, yearfirst=False)
+        _data_version = _data_version + 1 if version is None else version
+        snapshot = store.restamp(loaded_at, version=_data_version)
+        _data_cache = snapshot
     
-    # Parse Due Date
-    if 'Due Date' in df.columns:
-        df['Due Date'] = df['Due Date'].astype(str).replace(['nan', 'None', ''], '')
-        df['Due Date'] = pd.to_datetime(df['Due Date'], errors='coerce', format='%m-%d-%Y')
-        mask_not_parsed = df['Due Date'].isna()
-        if mask_not_parsed.any():
-            df.loc[mask_not_parsed, 'Due Date'] = pd.to_datetime(
-                df.loc[mask_not_parsed, 'Due Date'], 
-                errors='coerce', 
-                format='%m/%d/%Y'
-            )
+    for listener in list(_refresh_listeners):
+        try:
+            listener(previous, snapshot, changed_order_ids)
+        except Exception as e:
+            logger.error(f"Refresh listener {listener!r} failed: {e}")
     
-    return df
+    return snapshot
+
+
+class OrderStore:
+    """
+    Customer orders and their line items kept as two normalized tables.
+
+    ``orders`` holds one row per order indexed by OrderID. ``line_items`` holds
+    the Bakery Products rows with a categorical OrderID whose codes are the
+    positions of the owning order, so order-level columns are only gathered
+    onto line items when a caller asks for them.
+
+    A published store is an immutable, versioned snapshot shared by every
+    request thread: attributes cannot be reassigned, the position and hash
+    arrays are read-only, and readers select rows through masks and take()
+    instead of copying or modifying the tables.
+    """
+
+    def __init__(self, orders, line_items, columns, version=0, loaded_at=None,
+                 line_order_pos=None, order_hashes=None, schema=None):
+        self.orders = orders
+        self.line_items = line_items
+        self.columns = columns
+        self.schema = schema
+        self.version = version
+        self.loaded_at = time.time() if loaded_at is None else loaded_at
+        if line_order_pos is None:
+            if 'OrderID' in line_items.columns:
+                line_order_pos = line_items['OrderID'].cat.codes.to_numpy().astype(np.intp)
+            else:
+                line_order_pos = np.zeros(0, dtype=np.intp)
+            line_order_pos.flags.writeable = False
+        self.line_order_pos = line_order_pos
+        self._order_hashes = order_hashes
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"OrderStore snapshots are immutable (cannot set {name!r})")
+        object.__setattr__(self, name, value)
+
+    def restamp(self, loaded_at, version=None):
+        """Return a snapshot sharing this one's tables with a new load time and version."""
+        return OrderStore(
+            self.orders,
+            self.line_items,
+            self.columns,
+            version=self.version if version is None else version,
+            loaded_at=loaded_at,
+            line_order_pos=self.line_order_pos,
+            order_hashes=self._order_hashes,
+            schema=self.schema,
+        )
+
+    def role(self, name, default=None):
+        """Column playing a named schema role, e.g. 'order_type' -> 'Order Type '."""
+        if self.schema is None:
+            return schema_registry.ROLE_ALIASES.get(name, [default])[0]
+        return self.schema.role(name, default)
+
+    def owner(self, col):
+        """Return the table holding a column, or None if neither has it."""
+        if col in self.orders.columns:
+            return self.orders
+        if col in self.line_items.columns and col != 'OrderID':
+            return self.line_items
+        return None
+
+    @property
+    def order_hashes(self):
+        """
+        Content hash per order covering the order row and all its line items.
+
+        Returns a uint64 Series indexed by OrderID.
+        """
+        if self._order_hashes is None:
+            hashes = pd.util.hash_pandas_object(self.orders, index=True).to_numpy().copy()
+            if len(self.line_items):
+                line_hashes = pd.util.hash_pandas_object(
+                    self.line_items.drop(columns=['OrderID']), index=False
+                ).to_numpy()
+                # Wrapping uint64 addition makes the result independent of line order
+                np.add.at(hashes, self.line_order_pos, line_hashes)
+            hashes.flags.writeable = False
+            # Computed lazily; safe to race since every thread computes the same value
+            object.__setattr__(self, '_order_hashes', pd.Series(hashes, index=self.orders.index))
+        return self._order_hashes
+
+    @property
+    def fingerprint(self):
+        """Hex digest of the snapshot's content, equal on every process serving the same data."""
+        # Wrapping uint64 sum of the per-order hashes, so it ignores row order
+        total = np.add.reduce(self.order_hashes.to_numpy(), dtype=np.uint64) if len(self.orders) else 0
+        return f"{int(total):016x}"
+
+    @property
+    def token(self):
+        """
+        "<version>.<fingerprint>": identifies a snapshot across worker processes,
+        whose version counters are independent unless snapshot_sync is on.
+        """
+        return f"{self.version}.{self.fingerprint}"
 
+    def join(self, columns=None, line_mask=None):
+        """
+        Build a line-item frame with only the requested columns.
 
-def filter_data(df, filters):
-    """Apply filters to the dataframe."""
-    filtered_df = df.copy()
+        Args:
+            columns: Column names to include (default: every column, in the
+                order the old merged frame used)
+            line_mask: Optional boolean array selecting line items, or an
+                integer array of line item positions (kept in that order)
+
+        Returns:
+            DataFrame with one row per selected line item
+        """
+        if columns is None:
+            columns = self.columns
+        if line_mask is None:
+            positions = np.arange(len(self.line_items))
+        elif np.issubdtype(np.asarray(line_mask).dtype, np.integer):
+            positions = np.asarray(line_mask)
+        else:
+            positions = np.flatnonzero(line_mask)
+        order_pos = self.line_order_pos[positions]
+
+        data = {}
+        for col in columns:
+            if col == 'OrderID':
+                data[col] = self.orders.index.take(order_pos)
+            elif col in self.orders.columns:
+                data[col] = self.orders[col].take(order_pos).to_numpy()
+            elif col in self.line_items.columns:
+                data[col] = self.line_items[col].take(positions).to_numpy()
+        return pd.DataFrame(data, columns=[c for c in columns if c in data])
+
+
+def build_order_store(customer_orders_df, bakery_products_df, copy=True):
+    """
+    Normalize the two sheets into an OrderStore.
+
+    Orders without line items are kept. Line items whose OrderID has no
+    matching order are dropped, as the old inner join did, and line-item
+    columns that clash with an order column get the ``_product`` suffix.
+    Pass copy=False when the caller owns the input frames and no longer
+    needs them unchanged.
+    """
+    schema = schema_registry.schema_for(customer_orders_df.columns, bakery_products_df.columns)
+    orders = customer_orders_df.copy() if copy else customer_orders_df
+    if 'OrderID' not in customer_orders_df.columns or 'OrderID' not in bakery_products_df.columns:
+        orders.index.name = 'OrderID'
+        line_items = pd.DataFrame({'OrderID': pd.Categorical([], categories=orders.index)})
+        return OrderStore(orders, line_items, list(orders.columns), schema=schema)
+
+    line_items = bakery_products_df.copy() if copy else bakery_products_df
+    orders['OrderID'] = orders['OrderID'].astype(str).str.strip().str.upper()
+    line_items['OrderID'] = line_items['OrderID'].astype(str).str.strip().str.upper()
+
+    order_columns = list(orders.columns)
+    orders = orders[~orders['OrderID'].duplicated(keep='first')].set_index('OrderID')
+
+    clashes = {
+        col: f"{col}_product"
+        for col in line_items.columns
+        if col != 'OrderID' and col in orders.columns
+    }
+    line_items = line_items.rename(columns=clashes)
+    line_items['OrderID'] = pd.Categorical(line_items['OrderID'], categories=orders.index)
+    line_items = line_items[line_items['OrderID'].cat.codes.to_numpy() >= 0].reset_index(drop=True)
+
+    columns = order_columns + [c for c in line_items.columns if c != 'OrderID']
+    return OrderStore(orders, line_items, columns, schema=schema)
+
+
+def changed_orders(old_store, new_store):
+    """
+    List the OrderIDs that were added, removed or modified between two stores.
+
+    Every order counts as changed when there is no previous store.
+    """
+    new_hashes = new_store.order_hashes
+    if old_store is None:
+        return list(new_hashes.index)
+    if old_store.orders is new_store.orders and old_store.line_items is new_store.line_items:
+        return []
+    old_hashes = old_store.order_hashes
+    aligned = old_hashes.reindex(new_hashes.index)
+    modified = new_hashes.index[aligned.isna().to_numpy() | (aligned.to_numpy() != new_hashes.to_numpy())]
+    removed = old_hashes.index.difference(new_hashes.index)
+    return list(modified) + list(removed)
+
+
+def set_stale_handler(handler):
+    """
+    Make load_data() return a stale snapshot at once and call handler() to
+    refresh it elsewhere (the ASGI server schedules its awaited refresh).
+    Pass None to fetch on the calling thread again.
+    """
+    global _stale_handler
+    _stale_handler = handler
+
+
+def add_refresh_listener(listener):
+    """Register a callable run as listener(old_store, new_store, changed_order_ids) after each refresh."""
+    if listener not in _refresh_listeners:
+        _refresh_listeners.append(listener)
+
+
+def request_refresh():
+    """
+    Start an immediate background refresh of the cached data.
+
+    Requests that arrive while a refresh is running are coalesced into a
+    single follow-up refresh, so a burst of invalidations costs at most two
+    Sheets reads.
+
+    Returns:
+        True if a new refresh thread was started, False if one was queued
+    """
+    global _refresh_thread, _refresh_pending
+    with _refresh_lock:
+        if _refresh_thread is not None:
+            _refresh_pending = True
+            return False
+        _refresh_thread = threading.Thread(target=_run_refreshes, name="data-refresh", daemon=True)
+        _refresh_thread.start()
+        return True
+
+
+def _run_refreshes():
+    """Refresh until no further invalidation arrived during the last one."""
+    global _refresh_thread, _refresh_pending
+    while True:
+        try:
+            load_data(force=True, priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.error(f"Background refresh failed: {e}")
+        with _refresh_lock:
+            if not _refresh_pending:
+                _refresh_thread = None
+                return
+            _refresh_pending = False
+
+
+def parse_dates(df, copy=True):
+    """Parse date columns from various formats.
+
+    Uses the date rules of the schema registry's plan for df's header row.
+    Pass copy=False to parse a frame the caller owns in place.
+    """
+    if copy:
+        df = df.copy()
+    return schema_registry.table_plan(df.columns).convert_dates(df)
+
+
+def filter_date(filters, key):
+    """
+    Parse the date_start or date_end filter.
+
+    Returns:
+        Normalized Timestamp, or None when the filter is blank
+
+    Raises:
+        ValueError: If the value is not a date
+    """
+    value = (filters.get(key) or '').strip()
+    if not value:
+        return None
+    try:
+        day = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        day = pd.NaT
+    if pd.isna(day):
+        raise ValueError(f"{key} must be a date (YYYY-MM-DD), got {value!r}")
+    return day.normalize()
+
+
+def check_filters(filters):
+    """Raise ValueError if a date filter cannot be parsed."""
+    for key in ('date_start', 'date_end'):
+        filter_date(filters, key)
+
+
+def filter_masks(store, filters):
+    """
+    Evaluate filters against the table that owns each filtered column.
+
+    Args:
+        store: OrderStore to filter
+        filters: Dict of filter values as sent by the dashboard
+
+    Returns:
+        Tuple (order_mask, line_mask) of boolean arrays. A line item passes
+        when it and its order pass; when a line-item filter is active an
+        order passes only if at least one of its line items does.
+    """
+    order_mask = np.ones(len(store.orders), dtype=bool)
+    line_mask = np.ones(len(store.line_items), dtype=bool)
+    line_filtered = False
+
+    def apply(col, predicate):
+        nonlocal order_mask, line_mask, line_filtered
+        table = store.owner(col) if col is not None else None
+        if table is None:
+            return
+        mask = predicate(table[col]).to_numpy(dtype=bool)
+        if table is store.orders:
+            order_mask &= mask
+        else:
+            line_mask &= mask
+            line_filtered = True
     
     # Filter by Order Date
-    if filters.get('date_start'):
-        start_date = pd.Timestamp(filters['date_start']).normalize()
-        filtered_df = filtered_df[filtered_df['Order Date'].notna() & (filtered_df['Order Date'] >= start_date)]
-    if filters.get('date_end'):
-        end_date = pd.Timestamp(filters['date_end']).normalize() + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
-        filtered_df = filtered_df[filtered_df['Order Date'].notna() & (filtered_df['Order Date'] <= end_date)]
+    start_date, end_date = filter_date(filters, 'date_start'), filter_date(filters, 'date_end')
+    if start_date is not None:
+        apply(store.role('order_date'), lambda s: s.notna() & (s >= start_date))
+    if end_date is not None:
+        end_date = end_date + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        apply(store.role('order_date'), lambda s: s.notna() & (s <= end_date))
     
     # Filter by Order Type
     if filters.get('order_type') and filters['order_type']:
-        if 'Order Type ' in filtered_df.columns:
-            order_types = [ot.strip() for ot in filters['order_type'].split(',') if ot.strip()]
-            if order_types:
-                mask = pd.Series([False] * len(filtered_df), index=filtered_df.index)
-                for order_type in order_types:
-                    mask |= (filtered_df['Order Type '] == order_type)
-                filtered_df = filtered_df[mask]
+        order_types = [ot.strip() for ot in filters['order_type'].split(',') if ot.strip()]
+        if order_types:
+            apply(store.role('order_type'), lambda s: s.isin(order_types))
     
     # Filter by Product Description
     if filters.get('product') and filters['product']:
-        if 'Product Description' in filtered_df.columns:
-            products = [p.strip() for p in filters['product'].split(',') if p.strip()]
-            if products:
-                mask = pd.Series([False] * len(filtered_df), index=filtered_df.index)
+        products = [p.strip() for p in filters['product'].split(',') if p.strip()]
+        if products:
+            def match_products(s):
+                mask = pd.Series(False, index=s.index)
                 for product in products:
-                    mask |= filtered_df['Product Description'].str.contains(
-                        product, case=False, na=False
-                    )
-                filtered_df = filtered_df[mask]
+                    mask |= s.str.contains(product, case=False, na=False)
+                return mask
+            apply(store.role('product'), match_products)
     
     # Filter by Pickup Dates
     if filters.get('pickup_dates') and filters['pickup_dates']:
-        if 'Due Pickup Date' in filtered_df.columns:
-            pickup_dates = [d.strip() for d in filters['pickup_dates'].split(',') if d.strip()]
-            if pickup_dates:
-                pickup_date_objs = []
-                for date_str in pickup_dates:
-                    try:
-                        date_obj = pd.to_datetime(date_str).normalize()
-                        pickup_date_objs.append(date_obj)
-                    except:
-                        pass
-                
-                if pickup_date_objs:
-                    mask = pd.Series([False] * len(filtered_df), index=filtered_df.index)
-                    for date_obj in pickup_date_objs:
-                        if pd.api.types.is_datetime64_any_dtype(filtered_df['Due Pickup Date']):
-                            mask |= (
-                                filtered_df['Due Pickup Date'].notna() & 
-                                (filtered_df['Due Pickup Date'].dt.normalize() == date_obj)
-                            )
-                        else:
-                            try:
-                                parsed_dates = pd.to_datetime(filtered_df['Due Pickup Date'], errors='coerce')
-                                mask |= (
-                                    parsed_dates.notna() & 
-                                    (parsed_dates.dt.normalize() == date_obj)
-                                )
-                            except:
-                                pass
-                    filtered_df = filtered_df[mask]
+        pickup_dates = [d.strip() for d in filters['pickup_dates'].split(',') if d.strip()]
+        pickup_date_objs = []
+        for date_str in pickup_dates:
+            try:
+                pickup_date_objs.append(pd.to_datetime(date_str).normalize())
+            except:
+                pass
+        
+        if pickup_date_objs:
+            def match_pickup_dates(s):
+                # Already datetime64 via the conversion plan; no per-request parsing
+                return s.notna() & s.dt.normalize().isin(pickup_date_objs)
+            apply(store.role('pickup_date'), match_pickup_dates)
+    
+    line_mask &= order_mask[store.line_order_pos]
+    if line_filtered:
+        orders_with_lines = np.bincount(
+            store.line_order_pos[line_mask], minlength=len(store.orders)
+        ) > 0
+        order_mask &= orders_with_lines
     
-    return filtered_df
+    return order_mask, line_mask
+
+
+def filter_data(store, filters, columns=None):
+    """
+    Apply filters and return the matching line items.
+
+    Args:
+        store: OrderStore to filter
+        filters: Dict of filter values
+        columns: Optional list of columns to join onto the line items
+
+    Returns:
+        DataFrame with one row per matching line item
+    """
+    with stage('filter'):
+        _, line_mask = filter_masks(store, filters)
+    with stage('join'):
+        return store.join(columns, line_mask)
+
+
+def order_summary(store, filters):
+    """Count matching orders and line items without joining the tables.
+
+    Pure order-date ranges are answered from the prefix-sum day index.
+    Without any filter every order counts, including undated ones the
+    day index does not hold.
+    """
+    if not any(filters.values()):
+        return {"total_orders": len(store.orders), "total_items": len(store.line_items)}
+    has_range = filters.get('date_start') or filters.get('date_end')
+    if has_range and store.role('order_date') in store.orders.columns:
+        import day_index
+        if day_index.is_date_only(filters):
+            totals = day_index.get_day_index(store).axis('order').totals(
+                filter_date(filters, 'date_start'), filter_date(filters, 'date_end')
+            )
+            return {"total_orders": totals['orders'], "total_items": totals['line_items']}
+    with stage('filter'):
+        order_mask, line_mask = filter_masks(store, filters)
+    return {
+        "total_orders": int(order_mask.sum()),
+        "total_items": int(line_mask.sum()),
+    }
+
+
+def product_by_day(store, filters):
+    """
+    Pivot the matching line items by pickup day and product.
+
+    Returns:
+        DataFrame with Due Pickup Date, Product Description and Quantity
+        (number of line items), sorted by day then product
+    """
+    with stage('filter'):
+        _, line_mask = filter_masks(store, filters)
+    day_col, product_col = store.role('pickup_date'), store.role('product')
+    with stage('join'):
+        df = store.join([day_col, product_col], line_mask)
+    if product_col not in df.columns:
+        return pd.DataFrame(columns=['Due Pickup Date', 'Product Description', 'Quantity'])
+    if day_col in df.columns:
+        days = df[day_col].dt.normalize()
+    else:
+        days = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    products = df[product_col].fillna('Unknown Product').replace('', 'Unknown Product')
+    pivot = (
+        pd.DataFrame({'Due Pickup Date': days, 'Product Description': products})
+        .groupby(['Due Pickup Date', 'Product Description'], dropna=False, sort=True)
+        .size()
+        .reset_index(name='Quantity')
+    )
+    return pivot
 
 
 def handle_rate_limit_error(e):
-    """Handle Google Sheets API rate limit errors."""
-    error_str = str(e)
-    if '429' in error_str or 'RESOURCE_EXHAUSTED' in error_str or 'quota' in error_str.lower():
+    """Handle Google Sheets API rate limit errors that outlasted the scheduler's retries."""
+    if is_rate_limit_error(e):
         from flask import jsonify
-        return jsonify({
+        response = jsonify({
             "success": False,
             "error": "Google Sheets API rate limit exceeded. Please wait a minute and try again.",
             "rate_limited": True
-        }), 429
+        })
+        response.headers['Retry-After'] = str(max(1, int(scheduler.retry_after() + 0.999)))
+        return response, 429
     return None
 
@@ -6,6 +6,8 @@ Deployable on Vercel as serverless functions
 import sys
 import traceback
 import os
+import json
+import importlib.util
 
 # Print to stderr immediately (before logging is set up) to catch early errors
 def emergency_log(message):
@@ -43,7 +45,7 @@ except Exception as e:
     raise
 
 try:
-    from flask import Flask, jsonify, request
+    from flask import Flask, jsonify, request, Response, stream_with_context
     logger.info("✓ Flask imported successfully")
 except Exception as e:
     error_msg = f"✗ Failed to import Flask: {e}"
@@ -70,10 +72,42 @@ except Exception as e:
         pass
     raise
 
+try:
+    import api_utils
+    import live_updates
+    import sheets_scheduler
+    import request_profiler
+    import slow_requests
+    import day_index
+    import customer_index
+    import pickup_queue
+    import admission
+    import sort_index
+    import query_cache
+    import snapshot_sync
+    import delta_sync
+    logger.info("✓ api_utils imported successfully")
+except Exception as e:
+    error_msg = f"✗ Failed to import api_utils: {e}"
+    emergency_log(error_msg)
+    emergency_log(traceback.format_exc())
+    try:
+        logger.error(error_msg)
+        logger.error(traceback.format_exc())
+    except:
+        pass
+    raise
+
 # Create Flask app
 try:
     app = Flask(__name__)
     CORS(app)  # Enable CORS for frontend
+    if request_profiler.install(app):
+        logger.info("✓ On-demand request profiling enabled")
+    if slow_requests.install(app):
+        logger.info("✓ Slow-request capture enabled")
+    if snapshot_sync.install(app):
+        logger.info("✓ Shared snapshot store enabled")
     logger.info("✓ Flask app created")
 except Exception as e:
     error_msg = f"✗ Failed to create Flask app: {e}"
@@ -116,7 +150,29 @@ def index():
         "status": "ok",
         "message": "Flask app is running on Vercel",
         "endpoints": {
-            "/api/health": "Health check endpoint"
+            "/api/health": "Health check endpoint",
+            "/api/summary": "Order and line item counts for the current filters",
+            "/api/data": "Filtered line items with their order columns (JSON or Arrow)",
+            "/api/product-by-day": "Line item counts per pickup day and product (JSON or Arrow)",
+            "/api/invalidate": "Trigger an immediate data refresh (token required)",
+            "/api/events": "Server-Sent Events stream of snapshot versions",
+            "/api/sheets/quota": "Remaining Google Sheets API budget",
+            "/api/sources": "Freshness and last error of each store's spreadsheet",
+            "/api/schema": "Column roles resolved from the sheet headers",
+            "/api/totals": "Date-range totals from the day index (axis=order|pickup, by=order_type|category)",
+            "/api/trend": "Daily series from the day index",
+            "/api/lookup": "Find orders by OrderID or customer name (q=...)",
+            "/api/pickup-queue": "Outstanding pickups and hourly throughput for a day",
+            "/api/pickup-queue/days": "Pending and completed counts per pickup day",
+            "/api/seasons": "Archived seasons and their partitions",
+            "/api/seasons/summary": "Year-over-year totals for the same calendar window",
+            "/api/table": "One sorted page of the filtered line items (sort=, dir=asc|desc, page=, page_size=)",
+            "/api/export/pdf": "Filtered line items as a PDF report",
+            "/api/export/product-by-day/pdf": "Product quantities per pickup day as a PDF (per-day sections cached)",
+            "/api/export/xls": "Filtered line items as an Excel workbook",
+            "/api/admission": "Concurrency, queue depth and rejection counts per endpoint class",
+            "/api/cache": "Warmed hot queries and their hit rate",
+            "/api/snapshot-sync": "This node's role and the shared snapshot version"
         }
     })
 
@@ -130,6 +186,481 @@ def test():
         "routes": [str(rule) for rule in app.url_map.iter_rules()]
     })
 
+# ============================================================================
+# DATA ROUTES - Backed by the normalized order store in api_utils
+# ============================================================================
+
+# pyarrow is optional (requirements-optional.txt): it alone would take the
+# Vercel function past its size limit
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+ARROW_UNAVAILABLE_ERROR = "Arrow responses need pyarrow (pip install -r requirements-optional.txt)"
+PARQUET_UNAVAILABLE_ERROR = "pyarrow not installed: season archives need it (pip install -r requirements-optional.txt)"
+
+
+def get_filters():
+    """Read the dashboard filter parameters from the query string."""
+    return {
+        key: request.args.get(key, '')
+        for key in ('date_start', 'date_end', 'order_type', 'product', 'pickup_dates')
+    }
+
+
+def invalid_filters():
+    """400 response if date_start or date_end is not a date, else None."""
+    try:
+        api_utils.check_filters(get_filters())
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return None
+
+
+def limit_arg(default, maximum):
+    """Read the limit parameter, clamped to [1, maximum] (ValueError if not an integer)."""
+    value = request.args.get('limit') or default
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        raise ValueError(f"limit must be an integer, got {value!r}")
+
+
+def data_error_response(e):
+    """Turn a data loading error into a JSON error response."""
+    logger.error(f"Data request failed: {e}")
+    logger.error(traceback.format_exc())
+    rate_limit_response = api_utils.handle_rate_limit_error(e)
+    if rate_limit_response is not None:
+        return rate_limit_response
+    return jsonify({"success": False, "error": str(e)}), 500
+
+
+def admitted(view):
+    """Place a view in its class from admission.ENDPOINT_CLASSES."""
+    name = admission.ENDPOINT_CLASSES[view.__name__]
+    if callable(name):
+        return admission.limit(lambda: name(get_filters(), wants_arrow()))(view)
+    return admission.limit(name)(view)
+
+
+@app.route('/api/summary', methods=['GET'])
+@admitted
+def summary():
+    """Order and line item counts, computed on the orders table."""
+    invalid = invalid_filters()
+    if invalid is not None:
+        return invalid
+    try:
+        store = api_utils.load_data()
+        cached = query_cache.lookup(store, 'summary', get_filters())
+        if cached is not None:
+            return app.response_class(query_cache.envelope(store.version, 'summary', cached, store.token), mimetype='application/json')
+        return jsonify({
+            "success": True,
+            "version": store.version,
+            "snapshot": store.token,
+            "summary": api_utils.order_summary(store, get_filters())
+        })
+    except Exception as e:
+        return data_error_response(e)
+
+
+def json_records_response(df, version):
+    """Serialize a frame as the {"success", "version", "data"} JSON envelope."""
+    with request_profiler.stage('serialize'):
+        body = (
+            f'{{"success": true, "version": {version}, "data": '
+            + df.to_json(orient='records', date_format='iso')
+            + '}'
+        )
+    return app.response_class(body, mimetype='application/json')
+
+
+def arrow_response(table, version):
+    """Serialize an Arrow table as an IPC stream response."""
+    import arrow_ipc
+    with request_profiler.stage('serialize'):
+        stream = arrow_ipc.to_ipc_stream(table, {"version": version})
+    response = app.response_class(
+        stream,
+        mimetype=arrow_ipc.ARROW_STREAM_MIMETYPE
+    )
+    response.headers['X-Snapshot-Version'] = str(version)
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
+def wants_arrow():
+    """True if the client asked for Arrow IPC instead of JSON and pyarrow is installed."""
+    fmt = request.args.get('format', '').lower()
+    if fmt:
+        return fmt == 'arrow' and ARROW_AVAILABLE
+    return ARROW_AVAILABLE and 'application/vnd.apache.arrow.stream' in request.headers.get('Accept', '')
+
+
+def arrow_unavailable():
+    """
+    406 response for ?format=arrow without pyarrow, else None. An Accept
+    header alone just gets JSON.
+    """
+    if request.args.get('format', '').lower() == 'arrow' and not ARROW_AVAILABLE:
+        return jsonify({"success": False, "error": ARROW_UNAVAILABLE_ERROR}), 406
+    return None
+
+
+@app.route('/api/data', methods=['GET'])
+@admitted
+def data():
+    """Filtered line items, joined with only the requested order columns.
+
+    Send ?format=arrow or Accept: application/vnd.apache.arrow.stream for
+    an Arrow IPC stream instead of JSON. Send ?since=<delta_base> (empty on
+    the first request) for keyed rows and, later, only the changed ones.
+    """
+    unavailable = arrow_unavailable() or invalid_filters()
+    if unavailable is not None:
+        return unavailable
+    try:
+        store = api_utils.load_data()
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        if 'since' in request.args and not wants_arrow():
+            body = delta_sync.data_body(store, get_filters(), columns or None, request.args['since'])
+            return app.response_class(body, mimetype='application/json')
+        if wants_arrow():
+            import arrow_ipc
+            _, line_mask = api_utils.filter_masks(store, get_filters())
+            return arrow_response(arrow_ipc.line_items_table(store, columns or None, line_mask), store.version)
+        cached = query_cache.lookup(store, 'data', get_filters(), columns)
+        if cached is not None:
+            return app.response_class(query_cache.envelope(store.version, 'data', cached), mimetype='application/json')
+        df = api_utils.filter_data(store, get_filters(), columns or None)
+        return json_records_response(df, store.version)
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/table', methods=['GET'])
+@admitted
+def table():
+    """One page of the filtered line items, sorted with the precomputed permutations."""
+    try:
+        store = api_utils.load_data()
+        direction = request.args.get('dir', 'asc').lower()
+        if direction not in ('asc', 'desc'):
+            raise ValueError(f"Unknown sort direction {direction!r}")
+        page = max(1, int(request.args.get('page', 1)))
+        page_size = max(1, min(int(request.args.get('page_size', sort_index.DEFAULT_PAGE_SIZE)), sort_index.MAX_PAGE_SIZE))
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        df, total, key = sort_index.table_page(
+            store, get_filters(), request.args.get('sort'), direction == 'desc', page, page_size, columns or None
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return data_error_response(e)
+    with request_profiler.stage('serialize'):
+        header = json.dumps({
+            "success": True,
+            "version": store.version,
+            "sort": key,
+            "dir": direction,
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "pages": -(-total // page_size),
+        })
+        body = header[:-1] + ', "data": ' + df.to_json(orient='records', date_format='iso') + '}'
+    return app.response_class(body, mimetype='application/json')
+
+
+@app.route('/api/product-by-day', methods=['GET'])
+@admitted
+def product_by_day():
+    """Line item counts per pickup day and product (JSON or Arrow)."""
+    unavailable = arrow_unavailable() or invalid_filters()
+    if unavailable is not None:
+        return unavailable
+    try:
+        store = api_utils.load_data()
+        if not wants_arrow():
+            cached = query_cache.lookup(store, 'product_by_day', get_filters())
+            if cached is not None:
+                return app.response_class(query_cache.envelope(store.version, 'data', cached), mimetype='application/json')
+        pivot = api_utils.product_by_day(store, get_filters())
+        if wants_arrow():
+            import arrow_ipc
+            return arrow_response(arrow_ipc.frame_to_table(pivot), store.version)
+        return json_records_response(pivot, store.version)
+    except Exception as e:
+        return data_error_response(e)
+
+@app.route('/api/invalidate', methods=['POST'])
+def invalidate():
+    """Start an immediate refresh; called by the Sheets Apps Script trigger."""
+    payload = request.get_json(silent=True) or {}
+    token = request.headers.get('X-Invalidate-Token') or payload.get('token')
+    if not live_updates.check_invalidate_token(token):
+        return jsonify({"success": False, "error": "Invalid or missing invalidation token"}), 403
+    started = api_utils.request_refresh()
+    if not snapshot_sync.enabled():
+        # With a shared snapshot store the leader's refresh reaches every process already
+        live_updates.broadcast_invalidation()
+    logger.info(f"Invalidation received from {payload.get('source', 'unknown')} (started={started})")
+    return jsonify({"success": True, "refresh": "started" if started else "queued"}), 202
+
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Server-Sent Events stream announcing new snapshot versions."""
+    current = api_utils.current_snapshot()
+    response = Response(
+        stream_with_context(live_updates.event_stream(current)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/schema', methods=['GET'])
+def schema():
+    """Column roles resolved for the current sheet headers."""
+    try:
+        store = api_utils.load_data()
+        return jsonify({
+            "success": True,
+            "schema": store.schema.describe() if store.schema is not None else None
+        })
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/sheets/quota', methods=['GET'])
+def sheets_quota():
+    """Remaining Sheets API budget and scheduler counters."""
+    return jsonify({"success": True, "quota": sheets_scheduler.scheduler.metrics()})
+
+
+@app.route('/api/sources', methods=['GET'])
+def sources():
+    """Per-store spreadsheet freshness, fetch time and last error."""
+    import data_sources
+    return jsonify({"success": True, "sources": data_sources.status()})
+
+
+def day_range_args():
+    """Read the axis, date range and breakdown for the day index routes."""
+    by = request.args.get('by') or None
+    if by is not None and by not in day_index.BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown {by!r}")
+    return (
+        request.args.get('axis', 'order'),
+        request.args.get('date_start') or None,
+        request.args.get('date_end') or None,
+        by,
+    )
+
+
+@app.route('/api/totals', methods=['GET'])
+@admitted
+def totals():
+    """Revenue, quantity, line item and order totals for a date range."""
+    try:
+        store = api_utils.load_data()
+        axis, start, end, by = day_range_args()
+        return jsonify({
+            "success": True,
+            "version": store.version,
+            "totals": day_index.get_day_index(store).axis(axis).totals(start, end, by)
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/trend', methods=['GET'])
+@admitted
+def trend():
+    """Daily revenue, quantity, line item and order series for a date range."""
+    try:
+        store = api_utils.load_data()
+        axis, start, end, by = day_range_args()
+        series = day_index.get_day_index(store).axis(axis).trend(start, end, by)
+        return json_records_response(series, store.version)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return data_error_response(e)
+
+@app.route('/api/lookup', methods=['GET'])
+@admitted
+def lookup():
+    """Find orders by OrderID or customer name prefix, with their line items."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"success": False, "error": "Missing q parameter"}), 400
+    try:
+        limit = limit_arg(customer_index.DEFAULT_LIMIT, 200)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        store = api_utils.load_data()
+        index = customer_index.get_index(store)
+        searched, positions, total = index.lookup(query, limit)
+        return jsonify({
+            "success": True,
+            "version": searched.version,
+            "total": total,
+            "orders": index.orders_with_lines(searched, positions)
+        })
+    except Exception as e:
+        return data_error_response(e)
+
+@app.route('/api/pickup-queue', methods=['GET'])
+@admitted
+def pickup_queue_status():
+    """Outstanding and completed pickups for a day (default today).
+
+    Add include=orders to list the outstanding orders, earliest due first.
+    """
+    try:
+        day = pickup_queue.day_key(request.args.get('day'))
+        limit = limit_arg(100, 1000)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    try:
+        store = api_utils.load_data()
+        queue = pickup_queue.get_queue(store)
+        response = {
+            "success": True,
+            "version": store.version,
+            "day": day,
+            "queue": queue.day_summary(day)
+        }
+        if request.args.get('include') == 'orders':
+            response["pending_orders"] = pickup_queue.pending_records(store, queue.pending_orders(day, limit))
+        return jsonify(response)
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/pickup-queue/days', methods=['GET'])
+@admitted
+def pickup_queue_days():
+    """Pending and completed counts for every pickup day."""
+    try:
+        store = api_utils.load_data()
+        return jsonify({
+            "success": True,
+            "version": store.version,
+            "days": pickup_queue.get_queue(store).all_days()
+        })
+    except Exception as e:
+        return data_error_response(e)
+
+@app.route('/api/seasons', methods=['GET'])
+def seasons():
+    """Archived seasons and their partition statistics."""
+    try:
+        import season_archive
+        if not season_archive.PARQUET_AVAILABLE:
+            return jsonify({"success": False, "error": PARQUET_UNAVAILABLE_ERROR}), 501
+        return jsonify({"success": True, "partitions": season_archive.read_manifest()})
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/seasons/summary', methods=['GET'])
+@admitted
+def seasons_summary():
+    """Year-over-year totals: the live season next to every archived season."""
+    try:
+        import season_archive
+        store = api_utils.load_data()
+        return jsonify({
+            "success": True,
+            "version": store.version,
+            "seasons": season_archive.yoy_summary(store, get_filters())
+        })
+    except Exception as e:
+        return data_error_response(e)
+
+
+def file_response(body, mimetype, filename, extension):
+    """Binary download response with a dated attachment filename."""
+    response = app.response_class(body, mimetype=mimetype)
+    stamp = __import__('datetime').date.today().isoformat()
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}_{stamp}.{extension}"'
+    return response
+
+
+@app.route('/api/export/pdf', methods=['GET'])
+@admitted
+def export_pdf():
+    """The filtered line items as a PDF table."""
+    invalid = invalid_filters()
+    if invalid is not None:
+        return invalid
+    try:
+        import exports
+        store = api_utils.load_data()
+        return file_response(exports.orders_pdf(store, get_filters()), 'application/pdf', 'orders', 'pdf')
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/export/product-by-day/pdf', methods=['GET'])
+@admitted
+def export_product_by_day_pdf():
+    """Product quantities per pickup day as a PDF; unchanged days come from the section cache."""
+    invalid = invalid_filters()
+    if invalid is not None:
+        return invalid
+    try:
+        import product_pdf
+        store = api_utils.load_data()
+        body, rendered, reused = product_pdf.product_by_day_pdf(store, get_filters())
+        response = file_response(body, 'application/pdf', 'product_by_day', 'pdf')
+        response.headers['X-PDF-Sections'] = f"rendered={rendered}, cached={reused}"
+        return response
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/export/xls', methods=['GET'])
+@admitted
+def export_xls():
+    """The filtered line items as an Excel workbook."""
+    invalid = invalid_filters()
+    if invalid is not None:
+        return invalid
+    try:
+        import exports
+        store = api_utils.load_data()
+        return file_response(
+            exports.orders_xlsx(store, get_filters()),
+            'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            'orders', 'xlsx'
+        )
+    except Exception as e:
+        return data_error_response(e)
+
+
+@app.route('/api/admission', methods=['GET'])
+def admission_metrics():
+    """Per-class concurrency, queue depth and rejection counters."""
+    return jsonify({"success": True, "classes": admission.metrics()})
+
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    """Warmed hot queries, their hit rate, the learned filter sets and the delta history."""
+    return jsonify({"success": True, "cache": query_cache.stats(), "delta": delta_sync.stats()})
+
+
+@app.route('/api/snapshot-sync', methods=['GET'])
+def snapshot_sync_status():
+    """Shared snapshot store: leader, latest version and this node's version."""
+    return jsonify({"success": True, "sync": snapshot_sync.status()})
+
 # ============================================================================
 # COMMENTED OUT - Complex functionality (Google Sheets, data loading, etc.)
 # ============================================================================
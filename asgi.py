@@ -0,0 +1,491 @@
+"""
+ASGI serving mode for the dashboard API
+Serves cached reads on the event loop and never lets a Sheets refresh block
+a request. The Sheets values are read with one awaited batchGet call through
+the shared quota scheduler. Parsing, filtering and serialization run on a
+bounded thread pool. Routes without a native handler (invalidate, events,
+schema, ...) are passed to the Flask app on a separate pool, so both modes
+expose the same API; the CPU-heavy ones among them (exports, table pages)
+run on the bounded pool instead. Native routes go through the same
+admission classes as their Flask views, and Flask views never fetch the
+sheets themselves: a stale snapshot is served while the awaited refresh
+runs.
+
+Run with: gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import sys
+import urllib.parse
+
+import gspread.utils
+import httpx
+import pandas as pd
+
+import admission
+import api_utils
+import data_sources
+import query_cache
+import snapshot_sync
+import delta_sync
+import schema_registry
+from sheets_scheduler import scheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from app import app as flask_app, ARROW_AVAILABLE, ARROW_UNAVAILABLE_ERROR
+
+SHEETS_BATCH_GET_URL = "https://sheets.googleapis.com/v4/spreadsheets/{id}/values:batchGet"
+SHEETS_TIMEOUT = 30.0  # seconds
+
+# pandas / ReportLab work runs here; a fixed size keeps a burst of filtered
+# reads from starving the loop of CPU
+CPU_WORKERS = int(os.environ.get("ASGI_CPU_WORKERS", min(4, os.cpu_count() or 1)))
+# Flask fallback routes, including long-lived SSE streams
+WSGI_WORKERS = int(os.environ.get("ASGI_WSGI_WORKERS", 32))
+# Flask fallback routes that render with pandas / ReportLab; served on the CPU pool
+CPU_FALLBACK_PREFIXES = ('/api/export/', '/api/table', '/api/seasons/summary')
+
+cpu_executor = concurrent.futures.ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix="asgi-cpu")
+wsgi_executor = concurrent.futures.ThreadPoolExecutor(WSGI_WORKERS, thread_name_prefix="asgi-wsgi")
+# Requests queued for an admission class wait here, off the loop
+admission_executor = concurrent.futures.ThreadPoolExecutor(
+    sum(gate.max_waiting for gate in admission.classes.values()), thread_name_prefix="asgi-admit"
+)
+
+_http_client = None
+_credentials = None
+_refresh_task = None
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# ASYNC DATA LOADING
+# ============================================================================
+
+def values_to_frame(values):
+    """
+    Build a DataFrame from a values range the way gspread's get_all_records does.
+
+    The first row is the header; short rows are padded with blanks and
+    numeric text is converted to numbers.
+    """
+    if not values:
+        return pd.DataFrame()
+    header, rows = values[0], values[1:]
+    width = len(header)
+    records = [
+        gspread.utils.numericise_all((row + [''] * width)[:width], empty2zero=False, default_blank='')
+        for row in rows
+    ]
+    return pd.DataFrame(records, columns=header)
+
+
+async def _access_token():
+    """Return a valid OAuth token, refreshing it off the loop when needed."""
+    global _credentials
+    if _credentials is None:
+        _credentials = api_utils.get_credentials()
+    if not _credentials.valid:
+        from google.auth.transport.requests import Request
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _credentials.refresh, Request())
+    return _credentials.token
+
+
+async def _batch_get(client, ranges):
+    token = await _access_token()
+    response = await client.get(
+        SHEETS_BATCH_GET_URL.format(id=api_utils.SPREADSHEET_ID),
+        params=[('ranges', f"'{r}'") for r in ranges] + [('majorDimension', 'ROWS')],
+        headers={'Authorization': f'Bearer {token}'},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def fetch_sheets_async(priority=PRIORITY_INTERACTIVE):
+    """
+    Awaitable counterpart of api_utils.fetch_sheets.
+
+    Both sheets are read in a single batchGet request, so a refresh costs
+    one token from the quota scheduler instead of four.
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df), converted by the
+        schema registry plan
+    """
+    payload = await scheduler.call_async(
+        _batch_get, _http_client,
+        [api_utils.CUSTOMER_ORDERS_SHEET_NAME, api_utils.BAKERY_PRODUCTS_SHEET_NAME],
+        priority=priority,
+    )
+    orders_values, products_values = (r.get('values', []) for r in payload['valueRanges'])
+
+    def convert():
+        customer_orders_df = values_to_frame(orders_values)
+        bakery_products_df = values_to_frame(products_values)
+        schema_registry.prepare_frames(customer_orders_df, bakery_products_df, api_utils.SPREADSHEET_ID)
+        return customer_orders_df, bakery_products_df
+
+    return await run_cpu(convert)
+
+
+async def _refresh(priority):
+    loop = asyncio.get_running_loop()
+    if snapshot_sync.enabled():
+        # Several nodes: the elected one reads the sheets, the rest pull its snapshot
+        return await loop.run_in_executor(None, snapshot_sync.sync, priority)
+    if data_sources.is_multi_source() or data_sources.configured_sources()[0].is_file:
+        # Several stores (fetched concurrently on the source pool) or exported files
+        customer_orders_df, bakery_products_df = await loop.run_in_executor(None, data_sources.fetch_all, priority)
+    else:
+        customer_orders_df, bakery_products_df = await fetch_sheets_async(priority)
+    store = await run_cpu(api_utils.build_order_store, customer_orders_df, bakery_products_df, False)
+    return await run_cpu(api_utils.publish_snapshot, store)
+
+
+def start_refresh(priority=PRIORITY_BACKGROUND):
+    """Start a refresh unless one is already running; return its task."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.ensure_future(_refresh(priority))
+        _refresh_task.add_done_callback(_log_refresh_failure)
+    return _refresh_task
+
+
+def _log_refresh_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Async refresh failed: {task.exception()}")
+
+
+async def load_data_async():
+    """
+    Return the current snapshot without blocking on Sheets when possible.
+
+    A fresh snapshot is returned as is. A stale one is returned immediately
+    while a single background refresh replaces it. Only the very first
+    request, with nothing cached, waits for the fetch.
+    """
+    snapshot = api_utils.current_snapshot()
+    if api_utils.is_fresh(snapshot):
+        return snapshot
+    if snapshot is not None:
+        start_refresh(PRIORITY_BACKGROUND)
+        return snapshot
+    return await asyncio.shield(start_refresh(PRIORITY_INTERACTIVE))
+
+
+async def run_cpu(fn, *args):
+    """Run CPU-bound work (pandas, pyarrow, ReportLab) on the bounded pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, fn, *args)
+
+
+# ============================================================================
+# NATIVE ROUTES
+# ============================================================================
+
+def _filters(query):
+    return {
+        key: query.get(key, [''])[0]
+        for key in ('date_start', 'date_end', 'order_type', 'product', 'pickup_dates')
+    }
+
+
+def _records_body(df, version):
+    return (
+        f'{{"success": true, "version": {version}, "data": '
+        + df.to_json(orient='records', date_format='iso')
+        + '}'
+    ).encode('utf-8')
+
+
+def _wants_arrow(query, headers):
+    fmt = query.get('format', [''])[0].lower()
+    if fmt:
+        return fmt == 'arrow' and ARROW_AVAILABLE
+    return ARROW_AVAILABLE and 'application/vnd.apache.arrow.stream' in headers.get('accept', '')
+
+
+def _arrow_unavailable(query):
+    if query.get('format', [''])[0].lower() == 'arrow' and not ARROW_AVAILABLE:
+        return 406, {"success": False, "error": ARROW_UNAVAILABLE_ERROR}
+    return None
+
+
+def _invalid_filters(query):
+    try:
+        api_utils.check_filters(_filters(query))
+    except ValueError as e:
+        return 400, {"success": False, "error": str(e)}
+    return None
+
+
+async def health(query, headers):
+    return 200, {"status": "ok", "message": "API is running", "mode": "asgi",
+                 "timestamp": pd.Timestamp.now().isoformat()}
+
+
+async def summary(query, headers):
+    invalid = _invalid_filters(query)
+    if invalid is not None:
+        return invalid
+    store = await load_data_async()
+    cached = query_cache.lookup(store, 'summary', _filters(query))
+    if cached is not None:
+        return 200, query_cache.envelope(store.version, 'summary', cached, store.token).encode('utf-8'), 'application/json', store.version
+    result = await run_cpu(api_utils.order_summary, store, _filters(query))
+    return 200, {"success": True, "version": store.version, "snapshot": store.token, "summary": result}
+
+
+async def data(query, headers):
+    unavailable = _arrow_unavailable(query) or _invalid_filters(query)
+    if unavailable is not None:
+        return unavailable
+    store = await load_data_async()
+    filters = _filters(query)
+    columns = [c.strip() for c in query.get('columns', [''])[0].split(',') if c.strip()] or None
+    if _wants_arrow(query, headers):
+        import arrow_ipc
+
+        def render():
+            _, line_mask = api_utils.filter_masks(store, filters)
+            table = arrow_ipc.line_items_table(store, columns, line_mask)
+            return arrow_ipc.to_ipc_stream(table, {"version": store.version})
+        return 200, await run_cpu(render), arrow_ipc.ARROW_STREAM_MIMETYPE, store.version
+    if 'since' in query:
+        body = await run_cpu(delta_sync.data_body, store, filters, columns, query['since'][0])
+        return 200, body.encode('utf-8'), 'application/json', store.version
+    cached = query_cache.lookup(store, 'data', filters, columns)
+    if cached is not None:
+        return 200, query_cache.envelope(store.version, 'data', cached).encode('utf-8'), 'application/json', store.version
+    body = await run_cpu(lambda: _records_body(api_utils.filter_data(store, filters, columns), store.version))
+    return 200, body, 'application/json', store.version
+
+
+async def product_by_day(query, headers):
+    unavailable = _arrow_unavailable(query) or _invalid_filters(query)
+    if unavailable is not None:
+        return unavailable
+    store = await load_data_async()
+    filters = _filters(query)
+    if _wants_arrow(query, headers):
+        import arrow_ipc
+
+        def render():
+            pivot = api_utils.product_by_day(store, filters)
+            return arrow_ipc.to_ipc_stream(arrow_ipc.frame_to_table(pivot), {"version": store.version})
+        return 200, await run_cpu(render), arrow_ipc.ARROW_STREAM_MIMETYPE, store.version
+    cached = query_cache.lookup(store, 'product_by_day', filters)
+    if cached is not None:
+        return 200, query_cache.envelope(store.version, 'data', cached).encode('utf-8'), 'application/json', store.version
+    body = await run_cpu(lambda: _records_body(api_utils.product_by_day(store, filters), store.version))
+    return 200, body, 'application/json', store.version
+
+
+async def sheets_quota(query, headers):
+    return 200, {"success": True, "quota": scheduler.metrics()}
+
+
+ROUTES = {
+    '/api/health': health,
+    '/api/summary': summary,
+    '/api/data': data,
+    '/api/product-by-day': product_by_day,
+    '/api/sheets/quota': sheets_quota,
+}
+
+
+async def _admit(name):
+    """Enter an admission class without blocking the loop; False if the request is shed."""
+    gate = admission.classes[name]
+    if gate.try_acquire():
+        return True
+    future = asyncio.get_running_loop().run_in_executor(admission_executor, gate.acquire)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The request went away while queued; give the slot back once granted
+        future.add_done_callback(lambda f: f.result() and gate.release())
+        raise
+
+
+# ============================================================================
+# ASGI PLUMBING
+# ============================================================================
+
+async def _send_response(send, status, body, content_type, extra_headers=()):
+    headers = [
+        (b'content-type', content_type.encode('latin-1')),
+        (b'content-length', str(len(body)).encode('latin-1')),
+        (b'access-control-allow-origin', b'*'),
+    ]
+    headers += [(k.encode('latin-1'), v.encode('latin-1')) for k, v in extra_headers]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def _wsgi_environ(scope, body):
+    import io
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': (scope.get('server') or ('localhost', 80))[0],
+        'SERVER_PORT': str((scope.get('server') or ('localhost', 80))[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            key = 'HTTP_' + key
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def call_wsgi(scope, receive, send, executor=None):
+    """
+    Serve a request with the Flask app on the WSGI pool (or another executor).
+
+    The response iterator is advanced one chunk at a time off the loop, so
+    streaming responses such as /api/events keep working, and it is closed
+    as soon as the client disconnects.
+    """
+    body = await _read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: None
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    executor = executor or wsgi_executor
+    watcher = asyncio.ensure_future(watch_disconnect())
+    result = await loop.run_in_executor(executor, flask_app, _wsgi_environ(scope, body), start_response)
+    iterator = iter(result)
+    sentinel = object()
+    try:
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        while not disconnected.is_set():
+            chunk = await loop.run_in_executor(executor, next, iterator, sentinel)
+            if chunk is sentinel:
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(executor, result.close)
+
+
+def _serve_stale_from_flask():
+    """Make Flask fallback views serve a stale snapshot while the loop refreshes it."""
+    loop = asyncio.get_running_loop()
+    api_utils.set_stale_handler(lambda: loop.call_soon_threadsafe(start_refresh))
+
+
+async def lifespan(receive, send):
+    global _http_client
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _http_client = httpx.AsyncClient(timeout=SHEETS_TIMEOUT)
+            _serve_stale_from_flask()
+            snapshot_sync.ensure_started()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _http_client is not None:
+                await _http_client.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    global _http_client
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    if _http_client is None:
+        # Servers that skip the lifespan protocol
+        _http_client = httpx.AsyncClient(timeout=SHEETS_TIMEOUT)
+        _serve_stale_from_flask()
+
+    handler = ROUTES.get(scope['path']) if scope['method'] == 'GET' else None
+    if handler is None:
+        if scope['path'].startswith(CPU_FALLBACK_PREFIXES):
+            if api_utils.current_snapshot() is None:
+                # First request: load here rather than on a pool thread
+                await load_data_async()
+            return await call_wsgi(scope, receive, send, cpu_executor)
+        return await call_wsgi(scope, receive, send)
+
+    query = urllib.parse.parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+    # Handlers share the Flask view names, so both modes use one class table
+    admission_class = admission.endpoint_class(handler.__name__, _filters(query), _wants_arrow(query, headers))
+    if admission_class is not None and not await _admit(admission_class):
+        payload = admission.overloaded_payload(admission_class)
+        return await _send_response(send, 503, json.dumps(payload).encode('utf-8'), 'application/json',
+                                    [('Retry-After', str(payload['retry_after']))])
+    try:
+        result = await handler(query, headers)
+    except Exception as e:
+        logger.error(f"ASGI request {scope['path']} failed: {e}")
+        if api_utils.is_rate_limit_error(e):
+            retry_after = max(1, int(scheduler.retry_after() + 0.999))
+            payload = {"success": False, "error": "Google Sheets API rate limit exceeded. Please wait a minute and try again.",
+                       "rate_limited": True, "retry_after": retry_after}
+            return await _send_response(send, 429, json.dumps(payload).encode('utf-8'), 'application/json',
+                                        [('Retry-After', str(retry_after))])
+        payload = {"success": False, "error": str(e)}
+        return await _send_response(send, 500, json.dumps(payload).encode('utf-8'), 'application/json')
+    finally:
+        if admission_class is not None:
+            admission.classes[admission_class].release()
+
+    if len(result) == 2:
+        status, payload = result
+        return await _send_response(send, status, json.dumps(payload).encode('utf-8'), 'application/json')
+    status, body, content_type, version = result
+    extra = [('X-Snapshot-Version', str(version)), ('Vary', 'Accept')]
+    return await _send_response(send, status, body, content_type, extra)
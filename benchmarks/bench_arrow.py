@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+JSON vs Arrow IPC encoding benchmark for /api/data
+Compares payload size and encode time for full and filtered responses.
+
+Usage: python benchmarks/bench_arrow.py [n_orders]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_utils
+import arrow_ipc
+from benchmarks.synthetic_data import make_sheets
+
+CASES = [
+    ("all rows", {}),
+    ("one pickup day", {"pickup_dates": "2025-11-25"}),
+    ("pies for pickup", {"order_type": "Pickup", "product": "pie"}),
+]
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    n_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    customer_orders_df, bakery_products_df = make_sheets(n_orders)
+    snapshot = api_utils.publish_snapshot(api_utils.build_order_store(
+        api_utils.parse_dates(customer_orders_df, copy=False),
+        api_utils.parse_dates(bakery_products_df, copy=False),
+        copy=False,
+    ))
+    # First conversion is paid once per refresh, not per request
+    started = time.perf_counter()
+    arrow_ipc.snapshot_columns(snapshot)
+    print(f"Arrow snapshot conversion (once per refresh): {time.perf_counter() - started:.3f}s\n")
+
+    print(f"{'case':18s} {'rows':>8s} {'json MB':>9s} {'json s':>8s} {'arrow MB':>9s} {'arrow s':>8s}")
+    for name, filters in CASES:
+        _, line_mask = api_utils.filter_masks(snapshot, filters)
+        json_time, json_body = best_of(
+            lambda: api_utils.filter_data(snapshot, filters).to_json(orient='records', date_format='iso')
+        )
+        arrow_time, arrow_body = best_of(
+            lambda: arrow_ipc.to_ipc_stream(arrow_ipc.line_items_table(snapshot, None, line_mask))
+        )
+        print(
+            f"{name:18s} {int(line_mask.sum()):>8,} {len(json_body) / 1e6:>9.2f} {json_time:>8.3f} "
+            f"{len(arrow_body) / 1e6:>9.2f} {arrow_time:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Sync workers vs ASGI mode under concurrent dashboard load
+Starts the API on synthetic data with a simulated Sheets latency and a short
+cache lifetime, so refreshes happen during the run. Many keep-alive clients
+then poll /api/summary and /api/product-by-day, and the benchmark reports
+throughput and latency percentiles for each serving mode.
+
+Usage: python benchmarks/bench_asgi.py [clients] [seconds] [n_orders]
+Requires gunicorn and uvicorn.
+"""
+
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SHEETS_LATENCY = float(os.environ.get("BENCH_SHEETS_LATENCY", 2.0))
+CACHE_SECONDS = float(os.environ.get("BENCH_CACHE_SECONDS", 3.0))
+N_ORDERS = int(os.environ.get("BENCH_N_ORDERS", 5000))
+PORT = 8791
+
+MODES = [
+    ("sync x2", ["gunicorn", "benchmarks.bench_asgi:wsgi_app()", "-w", "2", "-k", "sync"]),
+    ("gthread 2x8", ["gunicorn", "benchmarks.bench_asgi:wsgi_app()", "-w", "2", "-k", "gthread", "--threads", "8"]),
+    ("asgi x2", ["gunicorn", "benchmarks.bench_asgi:asgi_app()", "-w", "2", "-k", "uvicorn.workers.UvicornWorker"]),
+]
+PATHS = [
+    "/api/summary",
+    "/api/summary?pickup_dates=2025-11-25",
+    "/api/product-by-day?order_type=Pickup",
+    "/api/health",
+]
+
+
+def _prime():
+    """Publish a synthetic snapshot and return the raw frames for later refreshes."""
+    import api_utils
+    import schema_registry
+    from benchmarks.synthetic_data import make_sheets
+
+    api_utils.CACHE_DURATION = CACHE_SECONDS
+    customer_orders_df, bakery_products_df = make_sheets(N_ORDERS)
+    co, bp = customer_orders_df.copy(), bakery_products_df.copy()
+    schema_registry.prepare_frames(co, bp)
+    api_utils.publish_snapshot(api_utils.build_order_store(co, bp, copy=False))
+    return customer_orders_df, bakery_products_df
+
+
+def wsgi_app():
+    """Flask app whose Sheets fetch sleeps like the real API."""
+    import api_utils
+    import schema_registry
+    customer_orders_df, bakery_products_df = _prime()
+
+    def slow_fetch(priority=None):
+        time.sleep(SHEETS_LATENCY)
+        co, bp = customer_orders_df.copy(), bakery_products_df.copy()
+        schema_registry.prepare_frames(co, bp)
+        return co, bp
+
+    api_utils.fetch_sheets = slow_fetch
+    from app import app
+    return app
+
+
+def asgi_app():
+    """ASGI app whose batchGet awaits the same simulated latency."""
+    import asyncio
+    import asgi
+    customer_orders_df, bakery_products_df = _prime()
+
+    def values(df):
+        return [list(df.columns)] + df.astype(str).values.tolist()
+
+    payload = {"valueRanges": [{"values": values(customer_orders_df)}, {"values": values(bakery_products_df)}]}
+
+    async def slow_batch_get(client, ranges):
+        await asyncio.sleep(SHEETS_LATENCY)
+        return payload
+
+    asgi._batch_get = slow_batch_get
+    return asgi.app
+
+
+def client(deadline, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+    i = 0
+    while time.monotonic() < deadline:
+        path = PATHS[i % len(PATHS)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except Exception as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def wait_until_up(timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=2)
+            conn.request("GET", "/api/health")
+            conn.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.25)
+    return False
+
+
+def run_mode(command, n_clients, seconds):
+    server = subprocess.Popen(
+        command + ["--bind", f"127.0.0.1:{PORT}", "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_up():
+            raise RuntimeError(f"server did not start: {' '.join(command)}")
+        latencies, errors = [], []
+        deadline = time.monotonic() + seconds
+        threads = [threading.Thread(target=client, args=(deadline, latencies, errors)) for _ in range(n_clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return latencies, errors
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float("nan")
+
+
+def main():
+    n_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 15
+    if len(sys.argv) > 3:
+        os.environ["BENCH_N_ORDERS"] = sys.argv[3]
+    print(f"{n_clients} clients, {seconds:.0f}s, Sheets latency {SHEETS_LATENCY}s, cache {CACHE_SECONDS}s\n")
+    print(f"{'mode':12s} {'req/s':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'errors':>7s}")
+    for name, command in MODES:
+        latencies, errors = run_mode(command, n_clients, seconds)
+        print(
+            f"{name:12s} {len(latencies) / seconds:>8.0f} {percentile(latencies, 0.5) * 1000:>8.1f} "
+            f"{percentile(latencies, 0.99) * 1000:>8.1f} {max(latencies or [0]) * 1000:>8.1f} {len(errors):>7d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for snapshot reads
+Runs many threads of filter_data / order_summary against one published
+snapshot and reports peak traced allocations against the result size.
+
+Usage: python benchmarks/bench_concurrency.py [n_orders] [threads]
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_utils
+from benchmarks.synthetic_data import make_sheets
+
+FILTERS = [
+    {},
+    {"pickup_dates": "2025-11-25"},
+    {"order_type": "Pickup", "product": "pie"},
+    {"date_start": "2025-11-01", "date_end": "2025-11-07"},
+]
+
+
+def worker(snapshot, filters, rounds, results):
+    for _ in range(rounds):
+        df = api_utils.filter_data(snapshot, filters, ["OrderID", "Due Pickup Date", "Product Description"])
+        api_utils.order_summary(snapshot, filters)
+    results.append(len(df))
+
+
+def main():
+    n_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    rounds = 5
+
+    customer_orders_df, bakery_products_df = make_sheets(n_orders)
+    customer_orders_df = api_utils.parse_dates(customer_orders_df, copy=False)
+    bakery_products_df = api_utils.parse_dates(bakery_products_df, copy=False)
+    snapshot = api_utils.publish_snapshot(
+        api_utils.build_order_store(customer_orders_df, bakery_products_df, copy=False)
+    )
+    dataset_bytes = (
+        snapshot.orders.memory_usage(deep=True).sum() + snapshot.line_items.memory_usage(deep=True).sum()
+    )
+
+    for filters in FILTERS:
+        results = []
+        threads = [
+            threading.Thread(target=worker, args=(snapshot, filters, rounds, results))
+            for _ in range(n_threads)
+        ]
+        tracemalloc.start()
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{str(filters):60s} rows={results[0]:>7,} threads={n_threads} "
+            f"peak={peak / 1e6:7.1f} MB ({peak / dataset_bytes:5.2f}x dataset) "
+            f"time={elapsed:6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
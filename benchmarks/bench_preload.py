@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Pre-fork warm-up vs per-worker loading
+Starts gunicorn with gunicorn.conf.py, with PRELOAD=1 and then PRELOAD=0,
+on synthetic data behind a simulated Sheets latency. Reports the latency of
+the first data requests after the server answers health checks, the
+steady-state latency, and the memory of master plus workers (sum of PSS,
+which splits shared copy-on-write pages between processes).
+
+Usage: python benchmarks/bench_preload.py [workers] [n_orders]
+Linux only (reads /proc).
+"""
+
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SHEETS_LATENCY = float(os.environ.get("BENCH_SHEETS_LATENCY", 2.0))
+PORT = 8792
+PATH = "/api/product-by-day?order_type=Pickup"
+
+
+def app():
+    """Flask app with nothing cached and a slow synthetic Sheets fetch."""
+    import api_utils
+    import schema_registry
+    from benchmarks.synthetic_data import make_sheets
+
+    customer_orders_df, bakery_products_df = make_sheets(int(os.environ.get("BENCH_N_ORDERS", 20000)))
+
+    def slow_fetch(priority=None, spreadsheet_id=None):
+        time.sleep(SHEETS_LATENCY)
+        co, bp = customer_orders_df.copy(), bakery_products_df.copy()
+        schema_registry.prepare_frames(co, bp)
+        return co, bp
+
+    api_utils.fetch_sheets = slow_fetch
+    from app import app as flask_app
+    return flask_app
+
+
+def get(path):
+    conn = http.client.HTTPConnection("127.0.0.1", PORT, timeout=120)
+    started = time.perf_counter()
+    conn.request("GET", path)
+    conn.getresponse().read()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def pss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def run(preload, n_workers):
+    env = dict(os.environ, PRELOAD="1" if preload else "0", WEB_CONCURRENCY=str(n_workers),
+               PORT=str(PORT), BENCH_SHEETS_LATENCY=str(SHEETS_LATENCY))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        ["gunicorn", "benchmarks.bench_preload:app()", "--config", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            try:
+                get("/api/health")
+                break
+            except OSError:
+                time.sleep(0.1)
+        # One burst of first requests, spread across the workers
+        first = []
+        threads = [threading.Thread(target=lambda: first.append(get(PATH))) for _ in range(n_workers * 4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        steady = sorted(get(PATH) for _ in range(20))[10]
+        pids = [server.pid] + children(server.pid)
+        memory = sum(pss_kb(p) for p in pids) / 1024
+        return max(first), steady, memory
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    if len(sys.argv) > 2:
+        os.environ["BENCH_N_ORDERS"] = sys.argv[2]
+    print(f"{n_workers} workers, Sheets latency {SHEETS_LATENCY}s\n")
+    print(f"{'mode':10s} {'first max ms':>13s} {'steady ms':>10s} {'total PSS MB':>13s}")
+    for preload in (False, True):
+        first, steady, memory = run(preload, n_workers)
+        print(f"{'preload' if preload else 'per-worker':10s} {first * 1000:>13.0f} {steady * 1000:>10.1f} {memory:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Sales report aggregation: single pass vs partitioned process pool
+Runs generate_sales_report on synthetic sheets with 1, 2, 4... workers up
+to the core count, checks that every run produces the same report, and
+prints the time and speedup of each.
+
+Usage: python benchmarks/bench_report.py [n_orders]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import report_engine
+import sales_report
+from benchmarks.synthetic_data import make_sheets
+
+
+def run(customer_orders_df, bakery_products_df, workers):
+    report_engine.REPORT_WORKERS = workers
+    report_engine.PARALLEL_MIN_ROWS = 0
+    started = time.perf_counter()
+    report = sales_report.generate_sales_report(customer_orders_df, bakery_products_df)
+    elapsed = time.perf_counter() - started
+    report.pop("generated_at")
+    return elapsed, json.dumps(report, default=str)
+
+
+def main():
+    n_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    customer_orders_df, bakery_products_df = make_sheets(n_orders)
+    print(f"{len(customer_orders_df):,} orders, {len(bakery_products_df):,} line items, {os.cpu_count()} cores\n")
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+        worker_counts.append(worker_counts[-1] * 2)
+    baseline, expected = run(customer_orders_df, bakery_products_df, 1)
+    print(f"{'workers':>8s} {'seconds':>8s} {'speedup':>8s}  report")
+    print(f"{1:>8d} {baseline:>8.2f} {1.0:>8.2f}  reference")
+    for workers in worker_counts[1:]:
+        elapsed, body = run(customer_orders_df, bakery_products_df, workers)
+        print(f"{workers:>8d} {elapsed:>8.2f} {baseline / elapsed:>8.2f}  "
+              f"{'identical' if body == expected else 'DIFFERENT'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic Customer Orders / Bakery Products sheets for offline benchmarks
+Produces frames shaped like the gspread get_all_records() output.
+"""
+
+import numpy as np
+import pandas as pd
+
+PRODUCTS = [
+    ("Pumpkin Pie", "Pies", 24.0),
+    ("Apple Pie", "Pies", 26.0),
+    ("Pecan Pie", "Pies", 28.0),
+    ("Sweet Potato Pie", "Pies", 25.0),
+    ("Dinner Rolls (Dozen)", "Bread", 12.0),
+    ("Sourdough Loaf", "Bread", 9.0),
+    ("Pumpkin Cheesecake", "Cakes", 42.0),
+    ("Carrot Cake", "Cakes", 38.0),
+    ("Cranberry Scones", "Pastry", 18.0),
+    ("Stuffing Bread", "Bread", 11.0),
+]
+ORDER_TYPES = ["Pickup", "Delivery", "Wholesale", "Catering"]
+FIRST_NAMES = ["Ann", "Bob", "Cara", "Dan", "Eve", "Finn", "Gia", "Hal", "Ivy", "Jon"]
+LAST_NAMES = ["Smith", "Jones", "Olsen", "Nguyen", "Garcia", "Miller", "Khan", "Brown", "Lee", "Wright"]
+
+
+def make_sheets(n_orders=10000, items_per_order=3, seed=0, year=2025):
+    """
+    Build raw (unparsed) Customer Orders and Bakery Products frames.
+
+    Args:
+        n_orders: Number of orders
+        items_per_order: Average line items per order
+        seed: Random seed
+        year: Season year used for order and pickup dates
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df) with text date columns
+    """
+    rng = np.random.default_rng(seed)
+    order_ids = np.array([f"TG{year % 100:02d}-{i:06d}" for i in range(n_orders)])
+    order_dates = pd.Timestamp(f"{year}-10-15") + pd.to_timedelta(rng.integers(0, 40, n_orders), unit="D")
+    pickup_dates = pd.Timestamp(f"{year}-11-22") + pd.to_timedelta(rng.integers(0, 6, n_orders), unit="D")
+    picked_up = rng.random(n_orders) < 0.4
+    pickup_ts = pickup_dates + pd.to_timedelta(rng.integers(8 * 60, 18 * 60, n_orders), unit="min")
+
+    customer_orders_df = pd.DataFrame({
+        "OrderID": order_ids,
+        "Order Date": order_dates.strftime("%m-%d-%Y"),
+        "Due Pickup Date": pickup_dates.strftime("%m/%d/%Y"),
+        "Due Pickup Time": rng.choice(["9:00 AM", "11:00 AM", "1:00 PM", "3:00 PM"], n_orders),
+        "Pickup Timestamp": np.where(picked_up, pickup_ts.strftime("%m/%d/%Y %H:%M:%S"), ""),
+        "Customer First Name": rng.choice(FIRST_NAMES, n_orders),
+        "Customer Last Name": rng.choice(LAST_NAMES, n_orders),
+        "Order Type ": rng.choice(ORDER_TYPES, n_orders),
+        "Total": np.round(rng.uniform(10, 250, n_orders), 2),
+        "Notes": "",
+    })
+
+    counts = rng.poisson(items_per_order - 1, n_orders) + 1
+    item_orders = np.repeat(order_ids, counts)
+    product_idx = rng.integers(0, len(PRODUCTS), len(item_orders))
+    qty = rng.integers(1, 4, len(item_orders))
+    prices = np.array([p[2] for p in PRODUCTS])[product_idx]
+
+    bakery_products_df = pd.DataFrame({
+        "OrderID": item_orders,
+        "Product Description": np.array([p[0] for p in PRODUCTS])[product_idx],
+        "Category": np.array([p[1] for p in PRODUCTS])[product_idx],
+        "Unit Price": prices,
+        "CakeQty": qty,
+        "Subtotal (Calculated)": prices * qty,
+    })
+    return customer_orders_df, bakery_products_df
@@ -0,0 +1,230 @@
+"""
+Customer lookup index for the pickup counter
+Finds orders by OrderID or by customer name without scanning the snapshot:
+a hash lookup on the normalized OrderID, and a sorted token index over the
+first and last names for prefix search ("smi", "ann smi"). The name index
+is keyed by OrderID and updated incrementally from the changed orders on
+each refresh. Line items are found through per-snapshot offset arrays.
+"""
+
+import bisect
+import json
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+
+DEFAULT_LIMIT = 25
+# Above this share of changed orders a full rebuild is cheaper than patching
+INCREMENTAL_MAX_FRACTION = 0.2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens of a name or query."""
+    if text is None or (isinstance(text, float) and np.isnan(text)):
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def normalize_order_id(value):
+    """OrderIDs are stored stripped and upper-cased by build_order_store."""
+    return str(value).strip().upper()
+
+
+class NameIndex:
+    """Sorted name tokens -> OrderIDs, patchable one order at a time."""
+
+    def __init__(self):
+        self.tokens = []       # sorted distinct tokens
+        self.postings = {}     # token -> set of OrderIDs
+        self.names = {}        # OrderID -> tokens it was indexed under
+
+    def add(self, order_id, tokens):
+        tokens = tuple(dict.fromkeys(tokens))
+        self.names[order_id] = tokens
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                self.postings[token] = {order_id}
+                bisect.insort(self.tokens, token)
+            else:
+                ids.add(order_id)
+
+    def remove(self, order_id):
+        for token in self.names.pop(order_id, ()):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(order_id)
+            if not ids:
+                del self.postings[token]
+                pos = bisect.bisect_left(self.tokens, token)
+                if pos < len(self.tokens) and self.tokens[pos] == token:
+                    del self.tokens[pos]
+
+    def bulk_load(self, entries):
+        """Replace the whole index from (order_id, tokens) pairs."""
+        self.postings = {}
+        self.names = {}
+        for order_id, tokens in entries:
+            tokens = tuple(dict.fromkeys(tokens))
+            self.names[order_id] = tokens
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(order_id)
+        self.tokens = sorted(self.postings)
+
+    def prefix(self, prefix):
+        """OrderIDs with any token starting with prefix."""
+        lo = bisect.bisect_left(self.tokens, prefix)
+        hi = bisect.bisect_left(self.tokens, prefix + '\uffff')
+        found = set()
+        for token in self.tokens[lo:hi]:
+            found |= self.postings[token]
+        return found
+
+    def search(self, query):
+        """OrderIDs matching every query token as a prefix of some name token."""
+        result = None
+        for token in tokenize(query):
+            ids = self.prefix(token)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result or set()
+
+
+class CustomerIndex:
+    """Lookup structures for the current snapshot."""
+
+    def __init__(self):
+        self.names = NameIndex()
+        self.store = None
+        self.line_offsets = None
+        self.line_order = None
+        self.name_rank = None
+        self._lock = threading.Lock()
+
+    def _name_tokens(self, orders, order_ids):
+        first_col = self.store.role('first_name')
+        last_col = self.store.role('last_name')
+        first = orders[first_col] if first_col in orders.columns else pd.Series('', index=orders.index)
+        last = orders[last_col] if last_col in orders.columns else pd.Series('', index=orders.index)
+        rows = orders.index.get_indexer(order_ids)
+        first, last = first.to_numpy(), last.to_numpy()
+        return [(order_id, tokenize(first[row]) + tokenize(last[row])) for order_id, row in zip(order_ids, rows)]
+
+    def _name_rank(self, store):
+        """Rank of every order position when sorted by last then first name."""
+        sort_cols = [c for c in (store.role('last_name'), store.role('first_name')) if c in store.orders.columns]
+        keys = [store.orders[c].astype(str).str.lower().to_numpy() for c in reversed(sort_cols)]
+        order = np.lexsort(keys) if keys else np.arange(len(store.orders))
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        return rank
+
+    def update(self, store, changed_order_ids=None):
+        """
+        Point the index at a new snapshot.
+
+        With the list of changed OrderIDs, only those orders are re-indexed;
+        otherwise (first load, or too many changes) it is rebuilt.
+        """
+        # Line items of order i are line_order[line_offsets[i]:line_offsets[i + 1]]
+        line_order = np.argsort(store.line_order_pos, kind='stable')
+        counts = np.bincount(store.line_order_pos, minlength=len(store.orders))
+        line_offsets = np.concatenate([[0], np.cumsum(counts)])
+        name_rank = self._name_rank(store)
+
+        with self._lock:
+            incremental = (
+                self.store is not None
+                and changed_order_ids is not None
+                and len(changed_order_ids) <= INCREMENTAL_MAX_FRACTION * max(len(store.orders), 1)
+            )
+            self.store = store
+            if incremental:
+                present = [i for i in changed_order_ids if i in store.orders.index]
+                for order_id in changed_order_ids:
+                    self.names.remove(order_id)
+                for order_id, tokens in self._name_tokens(store.orders, present):
+                    self.names.add(order_id, tokens)
+            else:
+                self.names.bulk_load(self._name_tokens(store.orders, list(store.orders.index)))
+            self.line_order = line_order
+            self.line_offsets = line_offsets
+            self.name_rank = name_rank
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """
+        Find orders by OrderID or customer name.
+
+        Returns:
+            Tuple (store, positions, total) - the snapshot searched, order
+            positions of up to limit matches sorted by name, and the number
+            of matches
+        """
+        with self._lock:
+            store = self.store
+            if store is None:
+                return None, np.zeros(0, dtype=np.intp), 0
+            order_id = normalize_order_id(query)
+            position = store.orders.index.get_indexer([order_id])[0]
+            if position >= 0:
+                return store, np.array([position]), 1
+            ids = list(self.names.search(query))
+            name_rank = self.name_rank
+        positions = store.orders.index.get_indexer(ids)
+        positions = positions[positions >= 0]
+        total = len(positions)
+        if total > limit:
+            positions = positions[np.argpartition(name_rank[positions], limit)[:limit]]
+        positions = positions[np.argsort(name_rank[positions])]
+        return store, positions, total
+
+    def orders_with_lines(self, store, positions):
+        """JSON-ready orders with their line items nested under 'line_items'."""
+        if self.store is None or self.store.orders is not store.orders:
+            # Snapshot replaced between lookup and rendering; recompute offsets
+            line_order = np.argsort(store.line_order_pos, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(store.line_order_pos, minlength=len(store.orders)))])
+        else:
+            line_order, offsets = self.line_order, self.line_offsets
+        orders = store.orders.iloc[positions].reset_index()
+        records = json.loads(orders.to_json(orient='records', date_format='iso'))
+        line_columns = [c for c in store.line_items.columns if c != 'OrderID']
+        # One take and one serialization for all matched orders' line items
+        slices = [line_order[offsets[p]:offsets[p + 1]] for p in positions]
+        rows = np.concatenate(slices) if slices else np.zeros(0, dtype=np.intp)
+        lines = json.loads(
+            store.line_items.take(rows)[line_columns].to_json(orient='records', date_format='iso')
+        )
+        start = 0
+        for record, chunk in zip(records, slices):
+            record['line_items'] = lines[start:start + len(chunk)]
+            start += len(chunk)
+        return records
+
+
+index = CustomerIndex()
+
+
+def get_index(store):
+    """Return the index, catching up if it lags behind the given snapshot."""
+    if index.store is None or index.store.orders is not store.orders:
+        index.update(store)
+    return index
+
+
+def _on_refresh(old_store, new_store, changed_order_ids):
+    if index.store is None or index.store.orders is not (old_store.orders if old_store else None):
+        index.update(new_store)
+    else:
+        index.update(new_store, changed_order_ids)
+
+
+api_utils.add_refresh_listener(_on_refresh)
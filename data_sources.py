@@ -0,0 +1,361 @@
+"""
+Order data sources, one spreadsheet per store
+DATA_SOURCES lists the stores whose spreadsheets make up the snapshot, as
+JSON text or the path of a JSON file:
+
+    [{"key": "north", "location": "North Side", "spreadsheet_id": "1AbC..."},
+     {"key": "south", "location": "South Loop", "spreadsheet_id": "1XyZ...",
+      "orders_sheet": "Orders", "products_sheet": "Products"}]
+
+Sheet names default to the api_utils names. Without DATA_SOURCES the single
+SPREADSHEET_ID is read exactly as before: no Location column, and the
+OrderIDs are left unchanged.
+
+A source can read exported files instead of a spreadsheet (see
+file_source): "orders_file" and "products_file" name CSV or XLSX exports,
+"workbook" an XLSX file holding both sheets, and "directory" a folder with
+'<sheet name>.csv' or '.xlsx' files. DATA_FILES (a directory or workbook)
+replaces the single spreadsheet the same way, e.g. for offline runs.
+
+All sources are fetched concurrently on a bounded pool and each keeps its
+own last good frames. A refresh waits at most SOURCE_WAIT seconds. A store
+that is slow, failing or rate limited then contributes its previous data,
+and a late result is published as soon as it arrives, so refresh time
+follows the slowest store that answers in time, not the sum of all stores.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+import api_utils
+from request_profiler import stage
+
+SOURCES_ENV = "DATA_SOURCES"
+FILES_ENV = "DATA_FILES"
+LOCATION_COLUMN = "Location"
+SOURCE_WORKERS = int(os.environ.get("SOURCE_WORKERS", 4))
+SOURCE_WAIT = float(os.environ.get("SOURCE_WAIT_SECONDS", 20))
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_sources = None
+_states = {}
+_states_lock = threading.Lock()
+
+
+class DataSource:
+    """One store's spreadsheet (or exported files) and sheet names."""
+
+    def __init__(self, key, spreadsheet_id, location=None, orders_sheet=None, products_sheet=None,
+                 orders_file=None, products_file=None):
+        self.key = key
+        self.spreadsheet_id = spreadsheet_id
+        self.location = location
+        self.orders_sheet = orders_sheet or api_utils.CUSTOMER_ORDERS_SHEET_NAME
+        self.products_sheet = products_sheet or api_utils.BAKERY_PRODUCTS_SHEET_NAME
+        self.orders_file = orders_file
+        self.products_file = products_file
+
+    @property
+    def is_file(self):
+        return self.orders_file is not None
+
+    def describe(self):
+        result = {"key": self.key, "location": self.location, "spreadsheet_id": self.spreadsheet_id,
+                  "orders_sheet": self.orders_sheet, "products_sheet": self.products_sheet}
+        if self.is_file:
+            result.update(orders_file=self.orders_file, products_file=self.products_file)
+        return result
+
+
+class SourceState:
+    """Last good frames and the in-flight fetch for one source."""
+
+    def __init__(self):
+        self.frames = None  # (customer_orders_df, bakery_products_df), tagged
+        self.fetched_at = None
+        self.duration = None
+        self.error = None
+        self.future = None
+        self.waited = False  # True while a refresh is waiting on the future
+
+
+def _slug(text):
+    return re.sub(r'[^A-Z0-9]+', '', str(text).upper())[:8] or 'SRC'
+
+
+def export_files(location, orders_sheet=None, products_sheet=None):
+    """
+    (orders_file, products_file) for a directory of exports or an XLSX workbook.
+    """
+    import file_source
+    if os.path.isdir(location):
+        return (
+            file_source.find_export(location, orders_sheet or api_utils.CUSTOMER_ORDERS_SHEET_NAME),
+            file_source.find_export(location, products_sheet or api_utils.BAKERY_PRODUCTS_SHEET_NAME),
+        )
+    if not os.path.exists(location):
+        raise ValueError(f"Export location {location} does not exist")
+    return location, location
+
+
+def parse_sources(config):
+    """
+    Build DataSources from DATA_SOURCES text (JSON list or path to a JSON file).
+
+    Raises:
+        ValueError: If the configuration is malformed
+    """
+    config = config.strip()
+    if not config.startswith('['):
+        with open(config) as f:
+            config = f.read()
+    entries = json.loads(config)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{SOURCES_ENV} must be a non-empty JSON list")
+    sources, keys = [], set()
+    for entry in entries:
+        orders_file, products_file = entry.get('orders_file'), entry.get('products_file')
+        if entry.get('workbook') or entry.get('directory'):
+            orders_file, products_file = export_files(
+                entry.get('workbook') or entry['directory'], entry.get('orders_sheet'), entry.get('products_sheet')
+            )
+        if bool(orders_file) != bool(products_file):
+            raise ValueError(f"Data source {entry!r} needs both orders_file and products_file")
+        if not entry.get('spreadsheet_id') and not orders_file:
+            raise ValueError(f"Data source {entry!r} has no spreadsheet_id or export files")
+        key = _slug(entry.get('key') or entry.get('location') or entry.get('spreadsheet_id') or orders_file)
+        if key in keys:
+            raise ValueError(f"Duplicate data source key {key!r}")
+        keys.add(key)
+        sources.append(DataSource(
+            key, entry.get('spreadsheet_id'), entry.get('location') or key,
+            entry.get('orders_sheet'), entry.get('products_sheet'), orders_file, products_file,
+        ))
+    return sources
+
+
+def configured_sources():
+    """The configured sources; a single untagged source when DATA_SOURCES is unset."""
+    global _sources
+    if _sources is None:
+        config = os.environ.get(SOURCES_ENV)
+        files = os.environ.get(FILES_ENV)
+        if config:
+            _sources = parse_sources(config)
+        elif files:
+            orders_file, products_file = export_files(files)
+            _sources = [DataSource('default', None, None, orders_file=orders_file, products_file=products_file)]
+        else:
+            _sources = [DataSource('default', api_utils.SPREADSHEET_ID)]
+    return _sources
+
+
+def is_multi_source():
+    return configured_sources()[0].location is not None
+
+
+def tag_frames(source, customer_orders_df, bakery_products_df):
+    """
+    Tag one store's frames in place with its location.
+
+    OrderIDs get a "<KEY>-" prefix so order numbers that several stores use
+    do not collide in the combined snapshot.
+    """
+    if source.location is None:
+        return
+    for df in (customer_orders_df, bakery_products_df):
+        if 'OrderID' in df.columns:
+            df['OrderID'] = source.key + '-' + df['OrderID'].astype(str).str.strip()
+    customer_orders_df[LOCATION_COLUMN] = source.location
+
+
+def fetch_source(source, priority):
+    """Fetch (or read from exports), parse and tag one source's two sheets."""
+    if source.is_file:
+        import file_source
+        with stage('fetch'):
+            customer_orders_df, bakery_products_df = file_source.read_exports(
+                source.orders_file, source.products_file, source.orders_sheet, source.products_sheet
+            )
+    else:
+        customer_orders_df, bakery_products_df = api_utils.fetch_sheets(
+            priority, source.spreadsheet_id, source.orders_sheet, source.products_sheet
+        )
+    tag_frames(source, customer_orders_df, bakery_products_df)
+    return customer_orders_df, bakery_products_df
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(SOURCE_WORKERS, thread_name_prefix="source-fetch")
+        return _executor
+
+
+def after_fork():
+    """
+    Forget the parent's fetch pool in a forked worker.
+
+    Its threads did not survive the fork, so a future still pending there
+    would never complete and would block every later fetch of that source.
+    The last good frames are kept.
+    """
+    global _executor, _executor_lock, _states_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _states_lock = threading.Lock()
+    for state in _states.values():
+        if state.future is not None and not state.future.done():
+            state.future = None
+            state.waited = False
+
+
+def _state(source):
+    with _states_lock:
+        return _states.setdefault(source.key, SourceState())
+
+
+def _start_fetch(source, priority):
+    """Submit a fetch unless one is already running; return its future."""
+    state = _state(source)
+    with _states_lock:
+        if state.future is not None and not state.future.done():
+            return state.future
+        started = time.time()
+        future = _get_executor().submit(fetch_source, source, priority)
+        state.future = future
+    future.add_done_callback(lambda f: _fetch_done(source, f, started))
+    return future
+
+
+def _fetch_done(source, future, started):
+    state = _state(source)
+    with _states_lock:
+        if future.exception() is None:
+            state.frames = future.result()
+            state.fetched_at = time.time()
+            state.error = None
+        else:
+            state.error = str(future.exception())
+        state.duration = time.time() - started
+        late = not state.waited
+    if future.exception() is not None:
+        logger.warning(f"Data source {source.key} failed: {future.exception()}")
+    elif late:
+        # The refresh gave up waiting; publish this store's data now
+        logger.info(f"Data source {source.key} arrived late; republishing")
+        threading.Thread(target=republish, name="source-republish", daemon=True).start()
+
+
+def combined_frames():
+    """
+    Concatenate the last good frames of every source.
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df), or None if no
+        source has delivered data yet
+    """
+    with _states_lock:
+        frames = [_states[s.key].frames for s in configured_sources()
+                  if s.key in _states and _states[s.key].frames is not None]
+    if not frames:
+        return None
+    if len(frames) == 1:
+        # build_order_store is called with copy=False; never hand it the cached frames
+        return frames[0][0].copy(), frames[0][1].copy()
+    return (
+        pd.concat([co for co, _ in frames], ignore_index=True),
+        pd.concat([bp for _, bp in frames], ignore_index=True),
+    )
+
+
+def fetch_all(priority):
+    """
+    Fetch every source concurrently and combine them.
+
+    Waits up to SOURCE_WAIT seconds. Sources that fail or are still running
+    after that contribute their previous frames; only when no source has any
+    data yet does it wait for all of them. A single unconfigured source is
+    fetched directly, as before.
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df)
+    """
+    sources = configured_sources()
+    if not is_multi_source():
+        # One spreadsheet: the published snapshot already is its stale copy
+        state, started = _state(sources[0]), time.time()
+        try:
+            frames = fetch_source(sources[0], priority)
+        except Exception as e:
+            state.error = str(e)
+            raise
+        state.fetched_at, state.duration, state.error = time.time(), time.time() - started, None
+        return frames
+    futures = {}
+    for source in sources:
+        state = _state(source)
+        state.waited = True
+        futures[source.key] = _start_fetch(source, priority)
+
+    _, pending = concurrent.futures.wait(futures.values(), timeout=SOURCE_WAIT)
+    if pending and combined_frames() is None:
+        concurrent.futures.wait(pending)
+    with _states_lock:
+        # Fetches finishing from here on are published by republish()
+        for source in sources:
+            _states[source.key].waited = False
+    combined = combined_frames()
+
+    if combined is None:
+        # Nothing to serve: surface the first failure (e.g. a rate limit)
+        errors = [f.exception() for f in futures.values() if f.exception() is not None]
+        raise errors[0] if errors else Exception("No data source returned data")
+    stale = [key for key, f in futures.items() if not f.done() or f.exception() is not None]
+    if stale:
+        logger.warning(f"Serving previous data for sources: {', '.join(stale)}")
+    return combined
+
+
+def republish():
+    """Rebuild the snapshot from the cached source frames without fetching."""
+    with api_utils._load_lock:
+        combined = combined_frames()
+        if combined is None:
+            return None
+        store = api_utils.build_order_store(*combined, copy=False)
+        import snapshot_sync
+        if snapshot_sync.enabled():
+            return snapshot_sync.share(store)
+        return api_utils.publish_snapshot(store)
+
+
+def status():
+    """Per-source freshness, duration and last error."""
+    now = time.time()
+    result = []
+    for source in configured_sources():
+        state = _state(source)
+        with _states_lock:
+            frames = state.frames
+            result.append({
+                **source.describe(),
+                "orders": int(len(frames[0])) if frames is not None else None,
+                "line_items": int(len(frames[1])) if frames is not None else None,
+                "age_seconds": round(now - state.fetched_at, 1) if state.fetched_at else None,
+                "last_fetch_seconds": round(state.duration, 3) if state.duration is not None else None,
+                "fetching": state.future is not None and not state.future.done(),
+                "last_error": state.error,
+            })
+    return result
@@ -0,0 +1,231 @@
+"""
+Prefix-sum day index over the order snapshot
+For Order Date and Due Pickup Date, keeps dense per-day arrays of revenue,
+quantity, line items and orders, overall and broken down by order type and
+by category, together with their running totals. A date_start/date_end
+total is then two lookups into the cumulative arrays, and the daily trend
+is a slice of the per-day arrays. The index is rebuilt whenever a new
+snapshot is published.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+import schema_registry
+
+METRICS = ('revenue', 'quantity', 'line_items', 'orders')
+AXES = {'order': 'order_date', 'pickup': 'pickup_date'}
+BREAKDOWNS = ('order_type', 'category')
+
+# (orders table, line_items table, DayIndex) for the latest snapshot
+_index_cache = None
+_index_lock = threading.Lock()
+
+
+class DayAxis:
+    """Per-day and cumulative metric arrays for one date column."""
+
+    def __init__(self, first_day, daily, groups):
+        self.first_day = first_day
+        self.n_days = daily['orders'].shape[-1] if first_day is not None else 0
+        # metric -> (n_groups, n_days) per-day values; group 0 is "all"
+        self.daily = daily
+        # metric -> (n_groups, n_days + 1) running totals with a leading zero
+        self.cumulative = {
+            m: np.concatenate([np.zeros((a.shape[0], 1), dtype=a.dtype), np.cumsum(a, axis=1)], axis=1)
+            for m, a in daily.items()
+        }
+        # breakdown -> {value: row}
+        self.groups = groups
+
+    def _bounds(self, start, end):
+        """Positions [lo, hi) covering the requested days, clipped to the index."""
+        if self.first_day is None:
+            return 0, 0
+        lo = 0 if start is None else (pd.Timestamp(start).normalize() - self.first_day).days
+        hi = self.n_days if end is None else (pd.Timestamp(end).normalize() - self.first_day).days + 1
+        lo, hi = min(max(lo, 0), self.n_days), min(hi, self.n_days)
+        return lo, max(lo, hi)
+
+    def _rows(self, by):
+        if by is None:
+            return {'all': 0}
+        return self.groups.get(by, {})
+
+    def totals(self, start=None, end=None, by=None):
+        """
+        Metric totals for an inclusive day range.
+
+        Args:
+            start: First day (None = beginning of the index)
+            end: Last day, inclusive (None = end of the index)
+            by: None, 'order_type' or 'category'
+
+        Returns:
+            Dict of metric totals, or {group value: metric totals} when by is set
+        """
+        lo, hi = self._bounds(start, end)
+        result = {}
+        for name, row in self._rows(by).items():
+            result[name] = {
+                m: _plain(self.cumulative[m][row, hi] - self.cumulative[m][row, lo]) for m in METRICS
+            }
+        return result['all'] if by is None else result
+
+    def trend(self, start=None, end=None, by=None):
+        """
+        Daily values for a day range.
+
+        Returns:
+            DataFrame with a date column, an optional group column and one
+            column per metric
+        """
+        lo, hi = self._bounds(start, end)
+        if hi <= lo:
+            return pd.DataFrame(columns=['date'] + ([by] if by else []) + list(METRICS))
+        days = pd.date_range(self.first_day + pd.Timedelta(days=lo), periods=hi - lo, freq='D')
+        frames = []
+        for name, row in self._rows(by).items():
+            frame = pd.DataFrame({m: self.daily[m][row, lo:hi] for m in METRICS})
+            frame.insert(0, 'date', days)
+            if by:
+                frame.insert(1, by, name)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['date', by] + list(METRICS))
+
+
+def _plain(value):
+    """numpy scalar -> JSON-friendly Python number."""
+    value = value.item()
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def _codes(values):
+    """Factorize a column into (codes, labels) with blanks grouped as 'Unknown'."""
+    labels = values.astype(object).where(values.notna(), 'Unknown').astype(str).str.strip()
+    labels = labels.where(labels != '', 'Unknown')
+    codes, uniques = pd.factorize(labels, sort=True)
+    return codes, list(uniques)
+
+
+def _build_axis(store, date_col, revenue, quantity, order_groups, line_groups):
+    if date_col not in store.orders.columns:
+        return DayAxis(None, {m: np.zeros((1, 0)) for m in METRICS}, {})
+    days = store.orders[date_col].dt.normalize()
+    valid = days.notna().to_numpy()
+    if not valid.any():
+        return DayAxis(None, {m: np.zeros((1, 0)) for m in METRICS}, {})
+    first_day = days[valid].min()
+    n_days = (days[valid].max() - first_day).days + 1
+    order_day = np.full(len(days), -1, dtype=np.int64)
+    order_day[valid] = (days[valid] - first_day).dt.days.to_numpy()
+    line_day = order_day[store.line_order_pos]
+    line_valid = line_day >= 0
+
+    # Row 0 is the overall total; each breakdown value gets its own row
+    groups = {}
+    n_rows = 1
+    order_rows, line_rows = [], []
+    for by, (codes, labels) in order_groups.items():
+        groups[by] = {label: n_rows + i for i, label in enumerate(labels)}
+        order_rows.append(n_rows + codes)
+        line_rows.append(n_rows + codes[store.line_order_pos])
+        n_rows += len(labels)
+    for by, (codes, labels) in line_groups.items():
+        groups[by] = {label: n_rows + i for i, label in enumerate(labels)}
+        line_rows.append(n_rows + codes)
+        # An order counts once per category it has a line in
+        pairs = pd.DataFrame({'order': store.line_order_pos, 'row': n_rows + codes}).drop_duplicates()
+        order_rows.append(pairs)
+        n_rows += len(labels)
+
+    size = n_rows * n_days
+
+    def accumulate(rows, day, valid_mask, weights=None):
+        flat = rows[valid_mask] * n_days + day[valid_mask]
+        w = None if weights is None else weights[valid_mask]
+        return np.bincount(flat, weights=w, minlength=size)
+
+    daily = {m: np.zeros(size) for m in ('revenue', 'quantity')}
+    daily.update({m: np.zeros(size, dtype=np.int64) for m in ('line_items', 'orders')})
+    all_lines = np.zeros(len(line_day), dtype=np.int64)
+    for rows in [all_lines] + line_rows:
+        daily['revenue'] += accumulate(rows, line_day, line_valid, revenue)
+        daily['quantity'] += accumulate(rows, line_day, line_valid, quantity)
+        daily['line_items'] += accumulate(rows, line_day, line_valid).astype(np.int64)
+    daily['orders'] += accumulate(np.zeros(len(order_day), dtype=np.int64), order_day, valid).astype(np.int64)
+    for rows in order_rows:
+        if isinstance(rows, pd.DataFrame):
+            pair_day = order_day[rows['order'].to_numpy()]
+            daily['orders'] += accumulate(rows['row'].to_numpy(), pair_day, pair_day >= 0).astype(np.int64)
+        else:
+            daily['orders'] += accumulate(rows, order_day, valid).astype(np.int64)
+
+    return DayAxis(first_day, {m: a.reshape(n_rows, n_days) for m, a in daily.items()}, groups)
+
+
+class DayIndex:
+    """Day axes for one snapshot, keyed by 'order' and 'pickup'."""
+
+    def __init__(self, store):
+        revenue_col, quantity_col = store.role('revenue'), store.role('quantity')
+        n_lines = len(store.line_items)
+        if revenue_col in store.line_items.columns:
+            revenue = schema_registry.numeric(store.line_items[revenue_col]).fillna(0).to_numpy(dtype=float)
+        else:
+            revenue = np.zeros(n_lines)
+        if quantity_col in store.line_items.columns:
+            quantity = schema_registry.numeric(store.line_items[quantity_col]).fillna(0).to_numpy(dtype=float)
+        else:
+            # Without a quantity column each line item counts as one unit
+            quantity = np.ones(n_lines)
+
+        order_groups, line_groups = {}, {}
+        for by in BREAKDOWNS:
+            col = store.role(by)
+            table = store.owner(col) if col is not None else None
+            if table is store.orders:
+                order_groups[by] = _codes(table[col])
+            elif table is store.line_items:
+                line_groups[by] = _codes(table[col])
+
+        self.version = store.version
+        self.axes = {
+            axis: _build_axis(store, store.role(role), revenue, quantity, order_groups, line_groups)
+            for axis, role in AXES.items()
+        }
+
+    def axis(self, name):
+        if name not in self.axes:
+            raise ValueError(f"Unknown date axis {name!r} (expected one of {', '.join(self.axes)})")
+        return self.axes[name]
+
+
+def get_day_index(store):
+    """Return the DayIndex for a snapshot, building it once per table set."""
+    global _index_cache
+    cached = _index_cache
+    if cached is not None and cached[0] is store.orders and cached[1] is store.line_items:
+        return cached[2]
+    with _index_lock:
+        cached = _index_cache
+        if cached is not None and cached[0] is store.orders and cached[1] is store.line_items:
+            return cached[2]
+        index = DayIndex(store)
+        _index_cache = (store.orders, store.line_items, index)
+        return index
+
+
+def is_date_only(filters):
+    """True if the only active filters are the order date range."""
+    return not any(filters.get(k) for k in filters if k not in ('date_start', 'date_end'))
+
+
+def _rebuild(old_store, new_store, changed_order_ids):
+    get_day_index(new_store)
+
+
+api_utils.add_refresh_listener(_rebuild)
@@ -0,0 +1,244 @@
+"""
+Delta responses for /api/data
+A dashboard that already holds the rows of a filter set sends the
+delta_base of its last response as ?since=. The reply then carries only the
+line items inserted, updated or deleted since that snapshot instead of the
+whole filtered row set.
+
+Each line item is identified by "<OrderID>:<n>", n being its position among
+its order's line items in sheet order. When load_data publishes a new
+snapshot, a refresh listener hashes the joined rows (order and line item
+columns) of the orders that refresh changed, in the old and the new
+snapshot, and records which line keys were inserted, updated or deleted.
+Only the last DELTA_HISTORY diffs, holding at most DELTA_MAX_KEYS keys in
+all, are kept; a since older than that, or from before a column change,
+gets the full row set.
+
+delta_base is the snapshot's token, "<version>.<fingerprint>" where the
+fingerprint hashes the snapshot's content, so a base handed out by another
+worker or host with a different version numbering never matches the wrong
+history.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+from request_profiler import stage
+
+DELTA_HISTORY = int(os.environ.get("DELTA_HISTORY", 50))
+DELTA_MAX_KEYS = int(os.environ.get("DELTA_MAX_KEYS", 500000))
+KEY_COLUMN = '_row'
+
+logger = logging.getLogger(__name__)
+
+_history = collections.deque()  # Diff per refresh, oldest first
+_history_keys = 0
+_history_lock = threading.Lock()
+# (orders table, line_items table, ordinals) for the latest snapshot
+_ordinals_cache = None
+
+
+class Diff:
+    """Line keys changed by one refresh, from the base snapshot to the next."""
+
+    __slots__ = ('base', 'token', 'inserted', 'updated', 'deleted')
+
+    def __init__(self, base, token, inserted, updated, deleted):
+        self.base = base
+        self.token = token
+        self.inserted = inserted
+        self.updated = updated
+        self.deleted = deleted
+
+    def __len__(self):
+        return len(self.inserted) + len(self.updated) + len(self.deleted)
+
+
+def line_ordinals(store):
+    """Position of each line item among its order's line items."""
+    global _ordinals_cache
+    cached = _ordinals_cache
+    if cached is not None and cached[0] is store.orders and cached[1] is store.line_items:
+        return cached[2]
+    pos = store.line_order_pos
+    ordinals = pd.Series(pos).groupby(pos, sort=False).cumcount().to_numpy()
+    ordinals.flags.writeable = False
+    _ordinals_cache = (store.orders, store.line_items, ordinals)
+    return ordinals
+
+
+def line_keys(store, positions):
+    """Index of "<OrderID>:<n>" keys for line item positions."""
+    ids = store.orders.index.take(store.line_order_pos[positions]).astype(str)
+    return ids + ':' + pd.Index(line_ordinals(store)[positions]).astype(str)
+
+
+def order_lines(store, order_ids):
+    """Positions of the line items of some orders (unknown OrderIDs are ignored)."""
+    codes = store.orders.index.get_indexer(pd.Index(order_ids, dtype=object))
+    return np.flatnonzero(np.isin(store.line_order_pos, codes[codes >= 0]))
+
+
+def line_hashes(store, order_ids):
+    """Hash of each joined line item row of some orders, as a Series indexed by line key."""
+    positions = order_lines(store, order_ids)
+    hashes = pd.util.hash_pandas_object(store.join(None, positions), index=False).to_numpy()
+    return pd.Series(hashes, index=line_keys(store, positions))
+
+
+def diff_snapshots(old_store, new_store, changed_order_ids):
+    """
+    Compare the line items of the changed orders between two snapshots.
+
+    Returns:
+        Diff from old_store's token to new_store's
+    """
+    old_hashes = line_hashes(old_store, changed_order_ids)
+    new_hashes = line_hashes(new_store, changed_order_ids)
+    common = new_hashes.index.intersection(old_hashes.index)
+    modified = new_hashes[common].to_numpy() != old_hashes[common].to_numpy()
+    return Diff(
+        old_store.token,
+        new_store.token,
+        inserted=new_hashes.index.difference(old_hashes.index).to_numpy(),
+        updated=common[modified].to_numpy(),
+        deleted=old_hashes.index.difference(new_hashes.index).to_numpy(),
+    )
+
+
+def record(old_store, new_store, changed_order_ids):
+    """Append the diff of a refresh to the history, dropping the oldest beyond the limits."""
+    global _history_keys
+    if old_store is None:
+        return
+    if list(old_store.columns) != list(new_store.columns):
+        # Rows of the two snapshots are not comparable; start over
+        with _history_lock:
+            _history.clear()
+            _history_keys = 0
+        return
+    diff = diff_snapshots(old_store, new_store, changed_order_ids)
+    with _history_lock:
+        if _history and _history[-1].token != diff.base:
+            # A refresh was missed (its listener failed); older diffs no longer chain
+            _history.clear()
+            _history_keys = 0
+        _history.append(diff)
+        _history_keys += len(diff)
+        while _history and (len(_history) > DELTA_HISTORY or _history_keys > DELTA_MAX_KEYS):
+            _history_keys -= len(_history.popleft())
+
+
+def changes_since(since, token):
+    """
+    Combine the recorded diffs from one snapshot up to another.
+
+    Returns:
+        Dict line key -> (first change, last change) since the base, each
+        'inserted', 'updated' or 'deleted'; None if the history does not
+        reach back to since
+    """
+    if since == token:
+        return {}
+    with _history_lock:
+        diffs = list(_history)
+    start = next((i for i, diff in enumerate(diffs) if diff.base == since), None)
+    if start is None or diffs[-1].token != token:
+        return None
+    changes = {}
+    for diff in diffs[start:]:
+        for kind in ('inserted', 'updated', 'deleted'):
+            for key in getattr(diff, kind):
+                first = changes[key][0] if key in changes else kind
+                changes[key] = (first, kind)
+    return changes
+
+
+def keyed_rows(store, columns, positions):
+    """Join line items like filter_data, with their line key as the first column."""
+    df = store.join(columns, positions)
+    df.insert(0, KEY_COLUMN, line_keys(store, positions).to_numpy())
+    return df
+
+
+def data_body(store, filters, columns=None, since=''):
+    """
+    JSON body of /api/data for a client holding the rows of snapshot since.
+
+    Args:
+        store: Current snapshot
+        filters: Dict of filter values, the same the client's rows were built with
+        columns: Optional list of columns to join onto the line items
+        since: delta_base of the client's rows ('' when it holds none)
+
+    Returns:
+        A delta ("inserted", "updated", "deleted") when the history covers
+        since, otherwise the full row set as "data". Rows carry their key
+        in KEY_COLUMN; "deleted" lists keys. Updated rows may be new to the
+        client (they changed into the filter) and replace any row with that key.
+    """
+    token = store.token
+    changes = changes_since(since, token) if since else None
+    with stage('filter'):
+        _, line_mask = api_utils.filter_masks(store, filters)
+
+    if changes is None:
+        with stage('join'):
+            df = keyed_rows(store, columns, np.flatnonzero(line_mask))
+        with stage('serialize'):
+            return (
+                f'{{"success": true, "version": {store.version}, "delta_base": "{token}", "delta": false, "data": '
+                + df.to_json(orient='records', date_format='iso')
+                + '}'
+            )
+
+    live = [key for key, (_, last) in changes.items() if last != 'deleted']
+    positions = order_lines(store, list({key.rsplit(':', 1)[0] for key in live}))
+    keys = line_keys(store, positions)
+    present = keys.isin(live)
+    positions, keys = positions[present], keys[present]
+    new = np.array([changes[key][0] == 'inserted' for key in keys], dtype=bool)
+    passes = line_mask[positions]
+    # Rows that left the filter or the sheet; ones the client never had are skipped
+    deleted = [key for key, (first, last) in changes.items() if last == 'deleted' and first != 'inserted']
+    deleted += list(keys[~passes & ~new])
+    with stage('join'):
+        inserted = keyed_rows(store, columns, positions[passes & new])
+        updated = keyed_rows(store, columns, positions[passes & ~new])
+    with stage('serialize'):
+        return (
+            f'{{"success": true, "version": {store.version}, "delta_base": "{token}", "delta": true, '
+            f'"since": {json.dumps(since)}, "inserted": '
+            + inserted.to_json(orient='records', date_format='iso')
+            + ', "updated": '
+            + updated.to_json(orient='records', date_format='iso')
+            + ', "deleted": '
+            + json.dumps(deleted)
+            + '}'
+        )
+
+
+def stats():
+    """How many refreshes the history covers and how many line keys it holds."""
+    with _history_lock:
+        return {
+            "diffs": len(_history),
+            "keys": _history_keys,
+            "oldest_base": _history[0].base if _history else None,
+            "latest": _history[-1].token if _history else None,
+        }
+
+
+def _on_refresh(old_store, new_store, changed_order_ids):
+    with stage('delta'):
+        record(old_store, new_store, changed_order_ids)
+
+
+api_utils.add_refresh_listener(_on_refresh)
@@ -0,0 +1,212 @@
+"""
+Content-addressed Parquet export archive
+Stores each exported frame once as compressed, typed Parquet named by the
+hash of its content, and records every export run in a manifest with the
+date range it covers. A run whose data is identical to an archived one
+writes nothing, and analysts load history with load_range() instead of
+re-parsing CSV text and dates; it merges every run overlapping the
+requested range, newest run first.
+
+Layout:
+    reports/archive/customer_orders-<hash>.parquet
+    reports/archive/bakery_products-<hash>.parquet
+    reports/archive/manifest.json
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+EXPORT_DIR = os.path.join("reports", "archive")
+MANIFEST_NAME = "manifest.json"
+COMPRESSION = "zstd"
+HASH_LENGTH = 16
+
+
+def frame_hash(df):
+    """Hash of a frame's header, dtypes and values (row order included)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def read_manifest(output_dir=EXPORT_DIR):
+    """Return the list of export runs, oldest first."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_manifest(entries, output_dir):
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+
+def _date_range(df, date_column):
+    if date_column is None or date_column not in df.columns:
+        return None, None
+    values = df[date_column]
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        return None, None
+    values = values.dropna()
+    if values.empty:
+        return None, None
+    return values.min().date().isoformat(), values.max().date().isoformat()
+
+
+def export_frames(frames, date_column=None, start_date=None, end_date=None, output_dir=EXPORT_DIR):
+    """
+    Archive a set of frames, skipping the run if identical data is archived.
+
+    Args:
+        frames: Dict of name -> DataFrame (e.g. customer_orders, bakery_products)
+        date_column: Column of the first frame whose min/max is recorded
+        start_date, end_date: The filter range the run was made for
+        output_dir: Archive directory
+
+    Returns:
+        Tuple (manifest entry, written) where written is False when the
+        same content was already archived
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    hashes = {name: frame_hash(df) for name, df in frames.items()}
+    run_hash = hashlib.sha256(json.dumps(sorted(hashes.items())).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+
+    manifest = read_manifest(output_dir)
+    for entry in manifest:
+        if entry["hash"] == run_hash:
+            return entry, False
+
+    import pyarrow.parquet as pq
+    import arrow_ipc
+
+    files = {}
+    for name, df in frames.items():
+        filename = f"{name}-{hashes[name]}.parquet"
+        path = os.path.join(output_dir, filename)
+        # A frame unchanged since an earlier run is shared, not rewritten
+        if not os.path.exists(path):
+            tmp_path = path + ".tmp"
+            pq.write_table(arrow_ipc.frame_to_table(df.reset_index(drop=True)), tmp_path, compression=COMPRESSION)
+            os.replace(tmp_path, path)
+        files[name] = filename
+
+    first = next(iter(frames.values()))
+    data_min, data_max = _date_range(first, date_column)
+    entry = {
+        "hash": run_hash,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "files": files,
+        "rows": {name: int(len(df)) for name, df in frames.items()},
+        "date_column": date_column,
+        "data_start": data_min,
+        "data_end": data_max,
+        "filter_start": str(start_date) if start_date is not None else None,
+        "filter_end": str(end_date) if end_date is not None else None,
+    }
+    manifest.append(entry)
+    _write_manifest(manifest, output_dir)
+    return entry, True
+
+
+def find_exports(start_date=None, end_date=None, output_dir=EXPORT_DIR):
+    """Export runs whose data overlaps [start_date, end_date], newest first."""
+    start = str(start_date) if start_date is not None else None
+    end = str(end_date) if end_date is not None else None
+    matches = []
+    for entry in read_manifest(output_dir):
+        low, high = entry.get("data_start"), entry.get("data_end")
+        if low is not None and high is not None:
+            if (start is not None and high < start) or (end is not None and low > end):
+                continue
+        matches.append(entry)
+    return list(reversed(matches))
+
+
+def load_export(entry, output_dir=EXPORT_DIR):
+    """Load an export run's frames with their archived types."""
+    import pyarrow.parquet as pq
+    frames = {}
+    for name, filename in entry["files"].items():
+        df = pq.read_table(os.path.join(output_dir, filename)).to_pandas()
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+        frames[name] = df
+    return frames
+
+
+def load_range(start_date=None, end_date=None, output_dir=EXPORT_DIR):
+    """
+    Combine every export run overlapping a date range.
+
+    Runs are layered newest first: an order archived by several runs is
+    taken from the newest one, together with that run's line items, so
+    corrections made between runs win over the older copy. Rows are
+    then clipped to [start_date, end_date] on the runs' date column;
+    undated orders are dropped when a bound is given.
+
+    Args:
+        start_date, end_date: Inclusive date range (None = unbounded)
+        output_dir: Archive directory
+
+    Returns:
+        Dict of name -> DataFrame, or None if no run overlaps the range
+    """
+    matches = find_exports(start_date, end_date, output_dir)
+    if not matches:
+        return None
+    runs = [load_export(entry, output_dir) for entry in matches]
+    names = list(dict.fromkeys(name for frames in runs for name in frames))
+
+    # OrderID -> newest run holding it, decided by the first (orders) frame
+    owner = {}
+    for rank, frames in enumerate(runs):
+        first = frames.get(names[0])
+        if first is not None and 'OrderID' in first.columns:
+            for order_id in first['OrderID'].astype(str):
+                owner.setdefault(order_id, rank)
+
+    combined = {}
+    for name in names:
+        parts = []
+        for rank, frames in enumerate(runs):
+            df = frames.get(name)
+            if df is None:
+                continue
+            if 'OrderID' in df.columns:
+                ids = df['OrderID'].astype(str)
+                df = df[ids.map(owner).fillna(rank).to_numpy() == rank]
+                # Orders missing from every orders frame: the newest run's line items win
+                owner.update({i: rank for i in ids.unique() if i not in owner})
+            parts.append(df)
+        df = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+        if 'OrderID' not in df.columns:
+            df = df.drop_duplicates(ignore_index=True)
+        combined[name] = df
+
+    date_column = matches[0].get("date_column")
+    first = combined[names[0]]
+    if (start_date is not None or end_date is not None) and date_column in first.columns:
+        dates = pd.to_datetime(first[date_column], errors='coerce')
+        keep = dates.notna()
+        if start_date is not None:
+            keep &= dates >= pd.Timestamp(start_date).normalize()
+        if end_date is not None:
+            keep &= dates < pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+        combined[names[0]] = first = first[keep.to_numpy()].reset_index(drop=True)
+        if 'OrderID' in first.columns:
+            kept = set(first['OrderID'].astype(str))
+            for name in names[1:]:
+                df = combined[name]
+                if 'OrderID' in df.columns:
+                    combined[name] = df[df['OrderID'].astype(str).isin(kept).to_numpy()].reset_index(drop=True)
+    return combined
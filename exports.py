@@ -0,0 +1,143 @@
+"""
+PDF and Excel exports of the filtered order data
+Renders the dashboard's current selection (one row per line item) for the
+/api/export/pdf and /api/export/xls endpoints.
+"""
+
+import io
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+import api_utils
+
+# Roles shown in the exports, in column order
+EXPORT_ROLES = ['pickup_date', 'pickup_time', 'first_name', 'last_name', 'order_type', 'product', 'quantity']
+MAX_PDF_ROWS = 5000
+
+
+def export_columns(store):
+    """OrderID followed by the export roles present in this snapshot."""
+    columns = ['OrderID']
+    for role in EXPORT_ROLES:
+        col = store.role(role)
+        if col is not None and store.owner(col) is not None:
+            columns.append(col)
+    return columns
+
+
+def export_frame(store, filters):
+    """Filtered line items with the export columns, sorted by pickup day and customer."""
+    df = api_utils.filter_data(store, filters, export_columns(store))
+    sort_cols = [c for c in (store.role('pickup_date'), store.role('last_name'), 'OrderID') if c in df.columns]
+    return df.sort_values(sort_cols, kind='stable').reset_index(drop=True) if sort_cols else df
+
+
+def _cell(value):
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%m/%d/%Y')
+    return str(value)
+
+
+def describe_filters(filters):
+    """One-line description of the active filters for report headers."""
+    parts = [f"{key.replace('_', ' ')}: {value}" for key, value in filters.items() if value]
+    return '; '.join(parts) if parts else 'All orders'
+
+
+def report_header(title, filters, version):
+    """
+    Title, filter and generation-time paragraphs opening a PDF report.
+
+    The filter text comes from the request, so it is escaped before it
+    reaches ReportLab's paragraph markup ("pie<b" or "&" would not parse).
+    """
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph
+
+    styles = getSampleStyleSheet()
+    return [
+        Paragraph(escape(title), styles['Heading1']),
+        Paragraph(f"<b>Filters:</b> {escape(describe_filters(filters))}", styles['Normal']),
+        Paragraph(f"<b>Generated:</b> {datetime.now().strftime('%B %d, %Y %I:%M %p')} "
+                  f"(data version {version})", styles['Normal']),
+    ]
+
+
+def orders_pdf(store, filters):
+    """
+    Render the filtered line items as a PDF table.
+
+    Returns:
+        PDF bytes
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    df = export_frame(store, filters)
+    truncated = len(df) > MAX_PDF_ROWS
+    rows = df.head(MAX_PDF_ROWS)
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter), topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+    styles = getSampleStyleSheet()
+    story = report_header("Orders Report", filters, store.version) + [Spacer(1, 0.2 * inch)]
+    if truncated:
+        story.append(Paragraph(f"Showing the first {MAX_PDF_ROWS:,} of {len(df):,} line items.", styles['Normal']))
+
+    data = [list(rows.columns)] + [[_cell(v) for v in row] for row in rows.itertuples(index=False)]
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+    ]))
+    story.append(table)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def orders_xlsx(store, filters):
+    """
+    Write the filtered line items to an Excel workbook.
+
+    Returns:
+        XLSX bytes
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+
+    df = export_frame(store, filters)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Orders")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill("solid", fgColor="34495E")
+
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(sheet, value=col)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal="center")
+        header.append(cell)
+    sheet.append(header)
+    for row in df.itertuples(index=False):
+        sheet.append([
+            None if v is None or (not isinstance(v, str) and pd.isna(v))
+            else v.to_pydatetime() if isinstance(v, pd.Timestamp) else v
+            for v in row
+        ])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
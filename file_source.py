@@ -0,0 +1,149 @@
+"""
+Bulk file reader for exported order sheets
+Reads CSV or XLSX exports of Customer Orders and Bakery Products so the
+snapshot can be built without the Sheets API: during a quota outage, for a
+large backfill, or for offline runs and benchmarks.
+
+CSV files are parsed by pyarrow in BLOCK_SIZE blocks on all cores, with
+every column typed as text up front; no per-chunk type inference, so a
+column whose early rows look numeric cannot change type halfway through.
+The schema registry's plan then converts the date columns with their
+explicit formats and the money and quantity columns to numbers, exactly as
+for rows read from the sheets. XLSX files are streamed with openpyxl in
+read-only mode. Both files of a source are read concurrently. Without
+pyarrow (it is optional), CSV files are read by pandas, more slowly.
+"""
+
+import concurrent.futures
+import csv
+import datetime
+import os
+
+import pandas as pd
+
+import schema_registry
+
+FILE_TYPES = ('.csv', '.xlsx')
+BLOCK_SIZE = int(os.environ.get("FILE_BLOCK_MB", 4)) * 1024 * 1024
+
+
+def find_export(directory, sheet_name):
+    """Path of the export of a sheet in a directory ('<sheet name>.csv' or '.xlsx')."""
+    for extension in FILE_TYPES:
+        path = os.path.join(directory, sheet_name.strip() + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No export of '{sheet_name.strip()}' ({' or '.join(FILE_TYPES)}) in {directory}")
+
+
+def _csv_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+
+def read_csv(path):
+    """Read a CSV export with every column as text ('' for blank cells)."""
+    header = _csv_header(path)
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        # pyarrow is optional; pandas' single-threaded reader gives the same frame
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        df.columns = header
+        return df
+    table = pacsv.read_csv(
+        path,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE, encoding='utf-8'),
+        convert_options=pacsv.ConvertOptions(
+            column_types={col: pa.string() for col in header},
+            strings_can_be_null=False,
+        ),
+    )
+    df = table.to_pandas()
+    # A byte-order mark ends up in the first header; use the cleaned names
+    df.columns = header
+    return df
+
+
+def read_xlsx(path, sheet_name=None):
+    """
+    Read one worksheet of an XLSX export.
+
+    Args:
+        sheet_name: Worksheet to read; defaults to the first one. A name
+            with stray spaces (e.g. "Bakery Products Ordered ") still matches.
+
+    Returns:
+        DataFrame with one column per header cell; date cells keep their
+        datetime values
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[0]
+        if sheet_name is not None:
+            names = {name.strip(): name for name in workbook.sheetnames}
+            if sheet_name.strip() in names:
+                worksheet = workbook[names[sheet_name.strip()]]
+            elif len(workbook.sheetnames) > 1:
+                raise ValueError(f"Worksheet '{sheet_name.strip()}' not found in {path}")
+        rows = worksheet.iter_rows(values_only=True)
+        # Header text is kept as is: roles match names like "Order Type "
+        header = [str(h) if h is not None else '' for h in next(rows, ())]
+        while header and header[-1] == '':
+            header.pop()
+        width = len(header)
+        columns = [[] for _ in range(width)]
+        for row in rows:
+            if not any(v is not None for v in row[:width]):
+                continue
+            for i in range(width):
+                value = row[i] if i < len(row) else None
+                columns[i].append('' if value is None else value)
+    finally:
+        workbook.close()
+    return pd.DataFrame({name: values for name, values in zip(header, columns)})
+
+
+def read_table(path, sheet_name=None):
+    """Read a CSV or XLSX export, choosing the reader from the extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv(path)
+    if extension in ('.xlsx', '.xlsm'):
+        return read_xlsx(path, sheet_name)
+    raise ValueError(f"Unsupported export file {path} (expected {' or '.join(FILE_TYPES)})")
+
+
+def _convert_excel_dates(df):
+    """Turn date cells Excel already typed into timestamps; leave text for the plan."""
+    for col in schema_registry.table_plan(df.columns).date_columns:
+        values = df[col]
+        if values.dtype != object:
+            continue
+        typed = values.map(lambda v: isinstance(v, (datetime.date, datetime.datetime)))
+        if not typed.any():
+            continue
+        rule = schema_registry.DATE_RULES.get(col, schema_registry.DEFAULT_DATE_RULE)
+        parsed = schema_registry.parse_date_text(values.where(~typed, ''), *rule)
+        parsed[typed] = pd.to_datetime(values[typed])
+        df[col] = parsed
+
+
+def read_exports(orders_path, products_path, orders_sheet=None, products_sheet=None):
+    """
+    Read both exports concurrently and convert them with the schema plan.
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df), ready for
+        build_order_store like frames fetched from the sheets
+    """
+    with concurrent.futures.ThreadPoolExecutor(2, thread_name_prefix="file-read") as pool:
+        orders_future = pool.submit(read_table, orders_path, orders_sheet)
+        products_future = pool.submit(read_table, products_path, products_sheet)
+        customer_orders_df, bakery_products_df = orders_future.result(), products_future.result()
+    _convert_excel_dates(customer_orders_df)
+    _convert_excel_dates(bakery_products_df)
+    schema_registry.prepare_frames(customer_orders_df, bakery_products_df, os.path.abspath(orders_path))
+    return customer_orders_df, bakery_products_df
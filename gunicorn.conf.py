@@ -0,0 +1,33 @@
+"""
+gunicorn settings for the dashboard API
+PRELOAD=1 (the default) imports the app in the master and runs the warm-up
+before forking, so every worker starts with the snapshot and its indexes
+already built and shared copy-on-write. Set PRELOAD=0 to load per worker.
+"""
+
+import os
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('THREADS', 8))
+preload_app = os.environ.get('PRELOAD', '1') == '1'
+
+# One file per server through which workers pass /api/invalidate to each other
+# (read by live_updates, which this module runs before)
+os.environ.setdefault('INVALIDATE_FILE', os.path.join(tempfile.gettempdir(), f"dashboard-invalidate-{os.getpid()}"))
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before any worker forks."""
+    if preload_app:
+        import warmup
+        timings = warmup.warm()
+        server.log.info(f"Pre-fork warm-up: {timings}")
+
+
+def post_fork(server, worker):
+    """Runs in each new worker."""
+    import warmup
+    warmup.after_fork()
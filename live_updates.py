@@ -0,0 +1,226 @@
+"""
+Live dashboard updates
+Fans out snapshot change notifications to Server-Sent Events subscribers and
+provides a command-line stand-in for the Sheets Apps Script trigger.
+
+Each gunicorn worker holds its own snapshot and event streams. An
+invalidation received by one worker is passed to the others by touching
+INVALIDATE_FILE (gunicorn.conf.py sets one per server); every worker polls
+its modification time and refreshes when it changes, so each worker's own
+subscribers hear about the new snapshot. Events carry the snapshot token
+("<version>.<fingerprint>"): version counters differ between workers, the
+content fingerprint does not.
+"""
+
+import hmac
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+import api_utils
+
+# Invalidation requests must carry this token (header or JSON body)
+INVALIDATE_TOKEN_ENV = "INVALIDATE_TOKEN"
+
+# Seconds between keep-alive comments on idle event streams
+KEEPALIVE_INTERVAL = 15
+
+# Events kept per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 16
+
+# Changed OrderIDs sent per event; larger changes are flagged as truncated
+MAX_CHANGED_IDS = 500
+
+# File touched to pass invalidations to the other worker processes (unset: one process)
+INVALIDATE_FILE = os.environ.get("INVALIDATE_FILE")
+INVALIDATE_POLL_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+_watcher_pid = None
+_seen_mtime = None
+_seen_lock = threading.Lock()
+
+
+class UpdateBroker:
+    """Publish snapshot events to every connected event stream."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        """Register a new subscriber and return its event queue."""
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        """Remove a subscriber queue."""
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def subscriber_count(self):
+        """Number of open event streams."""
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event):
+        """Queue an event for every subscriber, dropping the oldest event of slow ones."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            while True:
+                try:
+                    q.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+broker = UpdateBroker()
+
+
+def snapshot_event(store, changed_order_ids=None):
+    """Build the event payload announcing a snapshot version."""
+    changed = list(changed_order_ids or [])
+    return {
+        "version": store.version,
+        "snapshot": store.token,
+        "changed_order_ids": changed[:MAX_CHANGED_IDS],
+        "changed_count": len(changed),
+        "truncated": len(changed) > MAX_CHANGED_IDS,
+    }
+
+
+def _on_refresh(old_store, new_store, changed_order_ids):
+    """Refresh listener that pushes the new version to open dashboards."""
+    broker.publish(snapshot_event(new_store, changed_order_ids))
+
+
+api_utils.add_refresh_listener(_on_refresh)
+
+
+def format_sse(data, event=None):
+    """Encode one Server-Sent Events message."""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    message += f"data: {json.dumps(data)}\n\n"
+    return message
+
+
+def event_stream(current_store=None):
+    """
+    Generate the SSE stream for one dashboard.
+
+    The first message carries the current version so a reconnecting client
+    can tell at once whether it missed a refresh.
+    """
+    q = broker.subscribe()
+    try:
+        if current_store is not None:
+            yield format_sse(snapshot_event(current_store), event="snapshot")
+        while True:
+            try:
+                event = q.get(timeout=KEEPALIVE_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event, event="snapshot")
+    finally:
+        broker.unsubscribe(q)
+
+
+def _invalidate_mtime():
+    try:
+        return os.stat(INVALIDATE_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+
+def broadcast_invalidation():
+    """Ask the other worker processes to refresh too (no-op without INVALIDATE_FILE)."""
+    global _seen_mtime
+    if not INVALIDATE_FILE:
+        return False
+    with _seen_lock:
+        with open(INVALIDATE_FILE, 'a'):
+            pass
+        os.utime(INVALIDATE_FILE, ns=(time.time_ns(), time.time_ns()))
+        # This process is already refreshing; its watcher skips its own touch
+        _seen_mtime = _invalidate_mtime()
+    return True
+
+
+def _watch_invalidations():
+    global _seen_mtime
+    while True:
+        time.sleep(INVALIDATE_POLL_SECONDS)
+        with _seen_lock:
+            mtime = _invalidate_mtime()
+            changed = mtime is not None and mtime != _seen_mtime
+            _seen_mtime = mtime
+        if changed:
+            logger.info("Invalidation broadcast by another worker")
+            api_utils.request_refresh()
+
+
+def ensure_watching():
+    """
+    Start this process's invalidation watcher once. Called in each forked
+    worker; a thread started in the gunicorn master would not survive the fork.
+    """
+    global _watcher_pid, _seen_mtime
+    if not INVALIDATE_FILE or _watcher_pid == os.getpid():
+        return False
+    _watcher_pid = os.getpid()
+    with _seen_lock:
+        _seen_mtime = _invalidate_mtime()
+    threading.Thread(target=_watch_invalidations, name="invalidate-watch", daemon=True).start()
+    return True
+
+
+def check_invalidate_token(supplied):
+    """Return True if the supplied token matches the configured one."""
+    expected = os.environ.get(INVALIDATE_TOKEN_ENV)
+    if not expected:
+        return False
+    return hmac.compare_digest(str(supplied or ""), expected)
+
+
+def main():
+    """
+    Local stand-in for the Apps Script onChange trigger.
+
+    Usage: python live_updates.py [API_URL]
+    Posts an invalidation to API_URL (default http://localhost:5001) using
+    the INVALIDATE_TOKEN environment variable.
+    """
+    import urllib.request
+
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:5001"
+    body = json.dumps({"source": "local-trigger", "sent_at": time.time()}).encode()
+    req = urllib.request.Request(
+        f"{base_url.rstrip('/')}/api/invalidate",
+        data=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-Invalidate-Token": os.environ.get(INVALIDATE_TOKEN_ENV, ""),
+        },
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        print(f"✓ {resp.status} {resp.read().decode()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Outstanding-orders queue per pickup day
+Keeps, for every Due Pickup Date, the set of orders still waiting to be
+picked up and the orders already collected, with per-hour completion
+counts. A refresh only moves the orders whose content changed (typically a
+Pickup Timestamp being filled in), so the counter screens that poll every
+few seconds read ready-made counts instead of filtering the snapshot.
+"""
+
+import functools
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+
+UNSCHEDULED = 'unscheduled'
+# Above this share of changed orders the queue is rebuilt instead of patched
+INCREMENTAL_MAX_FRACTION = 0.2
+
+
+@functools.lru_cache(maxsize=1024)
+def _minutes(value):
+    """Due pickup time ('3:00 PM', '15:00') as minutes after midnight, or None."""
+    value = value.strip()
+    if value in ('', 'nan', 'None'):
+        return None
+    parsed = pd.to_datetime(value, errors='coerce', format='mixed')
+    if pd.isna(parsed):
+        return None
+    return parsed.hour * 60 + parsed.minute
+
+
+def day_key(value=None):
+    """
+    Normalize a requested day to the queue's day key.
+
+    Args:
+        value: Any date pandas can parse (e.g. '2025-11-26', '11/26/2025',
+            '2025-11-26T09:30'), 'unscheduled', or empty for today
+
+    Returns:
+        'YYYY-MM-DD' or UNSCHEDULED; ValueError if the date cannot be parsed
+    """
+    if not value:
+        return pd.Timestamp.today().strftime('%Y-%m-%d')
+    if value.strip().lower() == UNSCHEDULED:
+        return UNSCHEDULED
+    try:
+        day = pd.Timestamp(value.strip())
+    except (TypeError, ValueError):
+        day = pd.NaT
+    if pd.isna(day):
+        raise ValueError(f"Unrecognized day {value!r}")
+    return day.normalize().strftime('%Y-%m-%d')
+
+
+class DayQueue:
+    """Pending and completed orders for one pickup day."""
+
+    def __init__(self):
+        self.pending = {}      # OrderID -> due minutes (None if unknown)
+        self.completed = {}    # OrderID -> pickup Timestamp
+        self.hourly = np.zeros(24, dtype=np.int64)
+
+    def stats(self):
+        total = len(self.pending) + len(self.completed)
+        return {
+            "total": total,
+            "pending": len(self.pending),
+            "completed": len(self.completed),
+            "percent_complete": round(100.0 * len(self.completed) / total, 1) if total else 0.0,
+        }
+
+
+class PickupQueue:
+    """Day-partitioned pickup state for the current snapshot."""
+
+    def __init__(self):
+        self.days = {}
+        self.entries = {}      # OrderID -> (day key, pickup Timestamp or None)
+        self.store = None
+        self._lock = threading.Lock()
+
+    def _columns(self, store):
+        return store.role('pickup_date'), store.role('pickup_timestamp'), store.role('pickup_time')
+
+    def _add(self, order_id, day, due, picked_at):
+        queue = self.days.setdefault(day, DayQueue())
+        if picked_at is None:
+            queue.pending[order_id] = due
+        else:
+            queue.completed[order_id] = picked_at
+            queue.hourly[picked_at.hour] += 1
+        self.entries[order_id] = (day, picked_at)
+
+    def _remove(self, order_id):
+        entry = self.entries.pop(order_id, None)
+        if entry is None:
+            return
+        day, picked_at = entry
+        queue = self.days[day]
+        if picked_at is None:
+            queue.pending.pop(order_id, None)
+        else:
+            queue.completed.pop(order_id, None)
+            queue.hourly[picked_at.hour] -= 1
+        if not queue.pending and not queue.completed:
+            del self.days[day]
+
+    def _index_orders(self, store, order_ids):
+        day_col, ts_col, time_col = self._columns(store)
+        orders = store.orders
+        rows = orders.index.get_indexer(order_ids)
+        keep = rows >= 0
+        order_ids = [i for i, k in zip(order_ids, keep) if k]
+        rows = rows[keep]
+
+        if day_col in orders.columns:
+            keys = orders[day_col].take(rows).dt.strftime('%Y-%m-%d').fillna(UNSCHEDULED).tolist()
+        else:
+            keys = [UNSCHEDULED] * len(rows)
+        if ts_col in orders.columns:
+            stamps = [None if pd.isna(v) else v for v in orders[ts_col].take(rows).tolist()]
+        else:
+            stamps = [None] * len(rows)
+        if time_col in orders.columns:
+            dues = [_minutes(str(v)) for v in orders[time_col].take(rows).tolist()]
+        else:
+            dues = [None] * len(rows)
+
+        for order_id, key, due, stamp in zip(order_ids, keys, dues, stamps):
+            self._add(order_id, key, due, stamp)
+
+    def update(self, store, changed_order_ids=None):
+        """
+        Move the queue to a new snapshot.
+
+        With the list of changed OrderIDs only those orders are moved between
+        days and states; otherwise the queue is rebuilt from the snapshot.
+        """
+        with self._lock:
+            incremental = (
+                self.store is not None
+                and changed_order_ids is not None
+                and len(changed_order_ids) <= INCREMENTAL_MAX_FRACTION * max(len(store.orders), 1)
+            )
+            if incremental:
+                for order_id in changed_order_ids:
+                    self._remove(order_id)
+                self._index_orders(store, list(changed_order_ids))
+            else:
+                self.days, self.entries = {}, {}
+                self._index_orders(store, list(store.orders.index))
+            self.store = store
+
+    def day_summary(self, day):
+        """
+        Counts and hourly throughput for one pickup day.
+
+        Returns:
+            Dict with total, pending, completed, percent_complete and
+            completed_by_hour (24 counts)
+        """
+        with self._lock:
+            queue = self.days.get(day)
+            if queue is None:
+                return {**DayQueue().stats(), "completed_by_hour": [0] * 24}
+            return {**queue.stats(), "completed_by_hour": queue.hourly.tolist()}
+
+    def pending_orders(self, day, limit=None):
+        """OrderIDs still outstanding for a day, earliest due time first."""
+        with self._lock:
+            queue = self.days.get(day)
+            pending = list(queue.pending.items()) if queue is not None else []
+        pending.sort(key=lambda item: (item[1] is None, item[1] or 0, item[0]))
+        ids = [order_id for order_id, _ in pending]
+        return ids if limit is None else ids[:limit]
+
+    def all_days(self):
+        """Per-day counts for every pickup day, in date order."""
+        with self._lock:
+            return {day: self.days[day].stats() for day in sorted(self.days)}
+
+
+queue = PickupQueue()
+
+
+def get_queue(store):
+    """Return the queue, catching up if it lags behind the given snapshot."""
+    if queue.store is None or queue.store.orders is not store.orders:
+        queue.update(store)
+    return queue
+
+
+def pending_records(store, order_ids):
+    """Counter-screen columns for a list of pending orders, JSON-ready."""
+    wanted = [store.role(r) for r in ('first_name', 'last_name', 'pickup_date', 'pickup_time', 'order_type')]
+    columns = [c for c in wanted if c in store.orders.columns]
+    rows = store.orders.index.get_indexer(order_ids)
+    frame = store.orders.take(rows[rows >= 0])[columns].reset_index()
+    return json.loads(frame.to_json(orient='records', date_format='iso'))
+
+
+def _on_refresh(old_store, new_store, changed_order_ids):
+    if queue.store is None or old_store is None or queue.store.orders is not old_store.orders:
+        queue.update(new_store)
+    else:
+        queue.update(new_store, changed_order_ids)
+
+
+api_utils.add_refresh_listener(_on_refresh)
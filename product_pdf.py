@@ -0,0 +1,267 @@
+"""
+Product-by-day PDF assembled from cached per-day sections
+The kitchen downloads this report many times a week while orders keep
+arriving, and most pickup days do not change between downloads. Each
+pickup day is rendered as its own PDF section and cached under a hash of
+that day's aggregated rows (product, quantity). A download renders only
+the days whose rows changed, in a process pool when there are many rows,
+then concatenates the cover page and the sections. A new Wednesday order
+re-renders Wednesday's pages only.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import threading
+
+import pandas as pd
+
+import api_utils
+from exports import report_header
+from request_profiler import stage
+
+NO_DAY_LABEL = "No pickup date"
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+# Below this many table rows to render, the process pool costs more than it saves
+PARALLEL_MIN_ROWS = int(os.environ.get("PDF_PARALLEL_MIN_ROWS", 1000))
+# pypdf is optional: it only concatenates the cached sections
+PYPDF_AVAILABLE = importlib.util.find_spec('pypdf') is not None
+SECTION_CACHE_BYTES = int(float(os.environ.get("PDF_SECTION_CACHE_MB", 32)) * 1024 * 1024)
+
+_sections = collections.OrderedDict()  # section hash -> PDF bytes, least recently used first
+_sections_bytes = 0
+_sections_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+_stats = {"rendered": 0, "reused": 0}
+
+
+def day_sections(pivot):
+    """
+    Split the product-by-day pivot into one section per pickup day.
+
+    Returns:
+        List of (day label, [(product, quantity), ...]) in day order,
+        days without a date last
+    """
+    sections = []
+    for day, rows in pivot.groupby('Due Pickup Date', dropna=False, sort=True):
+        label = NO_DAY_LABEL if pd.isna(day) else pd.Timestamp(day).strftime('%A, %B %d, %Y')
+        items = [(str(p), int(q)) for p, q in zip(rows['Product Description'], rows['Quantity'])]
+        sections.append((label, items))
+    return sections
+
+
+def section_key(label, items):
+    payload = json.dumps([label, items], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -2), [colors.white, colors.HexColor('#f8f9fa')]),
+    ])
+
+
+def render_section(label, items):
+    """
+    Render one pickup day as a standalone PDF (module level, so it can run
+    in a worker process).
+
+    Returns:
+        PDF bytes
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate
+
+    def page_header(canvas, doc):
+        # Continuation pages still say which day they belong to
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawRightString(letter[0] - 0.5 * inch, letter[1] - 0.35 * inch, label)
+        canvas.restoreState()
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+    doc.build(_section_story(label, items), onFirstPage=page_header, onLaterPages=page_header)
+    return buffer.getvalue()
+
+
+def _section_story(label, items):
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Table, Paragraph, Spacer
+
+    styles = getSampleStyleSheet()
+    total = sum(q for _, q in items)
+    data = [['Product', 'Quantity']] + [[p, f"{q:,}"] for p, q in items] + [['Total', f"{total:,}"]]
+    table = Table(data, colWidths=[5.5 * inch, 1.2 * inch], repeatRows=1)
+    table.setStyle(_table_style())
+    return [
+        Paragraph(label, styles['Heading2']),
+        Paragraph(f"{len(items)} products, {total:,} items", styles['Normal']),
+        Spacer(1, 0.15 * inch),
+        table,
+    ]
+
+
+def render_cover(store, filters, sections):
+    """Title page with the filters, the data version and a per-day summary (never cached)."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+    doc.build(_cover_story(store, filters, sections))
+    return buffer.getvalue()
+
+
+def _cover_story(store, filters, sections):
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Table, Spacer
+
+    data = [['Pickup day', 'Items']] + [[label, f"{sum(q for _, q in items):,}"] for label, items in sections]
+    data.append(['Total', f"{sum(sum(q for _, q in items) for _, items in sections):,}"])
+    table = Table(data, colWidths=[5.5 * inch, 1.2 * inch], repeatRows=1)
+    table.setStyle(_table_style())
+    header = report_header("Product Quantities by Pickup Day", filters, store.version)
+    return header + [Spacer(1, 0.2 * inch), table]
+
+
+def render_document(store, filters, sections):
+    """
+    Render the cover and every section as one PDF, without the section
+    cache. Used when pypdf is not installed to concatenate cached sections.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import BaseDocTemplate, Flowable, Frame, PageBreak, PageTemplate
+
+    class DayMark(Flowable):
+        # Zero-size marker telling the page hook which day the page belongs to
+        def __init__(self, label):
+            super().__init__()
+            self.label = label
+
+        def wrap(self, available_width, available_height):
+            return 0, 0
+
+        def draw(self):
+            self.canv.day_label = self.label
+
+    def page_header(canvas, doc):
+        label = getattr(canvas, 'day_label', None)
+        if label:
+            canvas.saveState()
+            canvas.setFont('Helvetica', 8)
+            canvas.drawRightString(letter[0] - 0.5 * inch, letter[1] - 0.35 * inch, label)
+            canvas.restoreState()
+
+    story = _cover_story(store, filters, sections)
+    for label, items in sections:
+        story += [PageBreak(), DayMark(label)] + _section_story(label, items)
+    buffer = io.BytesIO()
+    doc = BaseDocTemplate(buffer, pagesize=letter, topMargin=0.5 * inch, bottomMargin=0.5 * inch)
+    frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height)
+    # Drawn at the end of each page, once the page's day marker has been seen
+    doc.addPageTemplates([PageTemplate(frames=[frame], onPageEnd=page_header)])
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is not safe
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                PDF_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _cache_get(key):
+    with _sections_lock:
+        body = _sections.get(key)
+        if body is not None:
+            _sections.move_to_end(key)
+        return body
+
+
+def _cache_put(key, body):
+    global _sections_bytes
+    with _sections_lock:
+        if key in _sections:
+            return
+        _sections[key] = body
+        _sections_bytes += len(body)
+        while _sections_bytes > SECTION_CACHE_BYTES and len(_sections) > 1:
+            _, evicted = _sections.popitem(last=False)
+            _sections_bytes -= len(evicted)
+
+
+def product_by_day_pdf(store, filters):
+    """
+    Build the product-by-day PDF, re-rendering only the changed days.
+
+    Without pypdf (requirements-optional.txt) the whole report is rendered
+    in one pass instead.
+
+    Returns:
+        Tuple (PDF bytes, number of sections rendered, number reused)
+    """
+    sections = day_sections(api_utils.product_by_day(store, filters))
+    if not PYPDF_AVAILABLE:
+        with stage('render'):
+            body = render_document(store, filters, sections)
+        _stats["rendered"] += len(sections)
+        return body, len(sections), 0
+    from pypdf import PdfWriter
+
+    keys = [section_key(label, items) for label, items in sections]
+    bodies = {key: _cache_get(key) for key in keys}
+    stale = [(key, section) for key, section in zip(keys, sections) if bodies[key] is None]
+
+    with stage('render'):
+        if len(stale) > 1 and PDF_WORKERS > 1 and sum(len(items) for _, (_, items) in stale) >= PARALLEL_MIN_ROWS:
+            futures = [_get_pool().submit(render_section, *section) for _, section in stale]
+            rendered = [f.result() for f in futures]
+        else:
+            rendered = [render_section(*section) for _, section in stale]
+        for (key, _), body in zip(stale, rendered):
+            bodies[key] = body
+            _cache_put(key, body)
+        cover = render_cover(store, filters, sections)
+
+    with stage('merge'):
+        writer = PdfWriter()
+        for body in [cover] + [bodies[key] for key in keys]:
+            writer.append(io.BytesIO(body))
+        output = io.BytesIO()
+        writer.write(output)
+
+    _stats["rendered"] += len(stale)
+    _stats["reused"] += len(keys) - len(stale)
+    return output.getvalue(), len(stale), len(keys) - len(stale)
+
+
+def stats():
+    """Section cache size and how many sections were rendered or reused."""
+    with _sections_lock:
+        return {"sections": len(_sections), "bytes": _sections_bytes, **_stats}
@@ -0,0 +1,239 @@
+"""
+Predictive warming of hot dashboard queries
+After each refresh a background thread precomputes the JSON payloads of
+/api/summary, /api/data and /api/product-by-day for the filter sets users
+are about to ask for, so the first of them no longer pays for the filter
+and the aggregation:
+
+    today, tomorrow     pickup_dates of the current and the next day
+    week                each pickup day of the current week
+    order_types         each order type in the snapshot
+    learned             the most frequent filter sets in recent traffic
+
+WARM_PRESETS picks the presets (comma list, default all four). Warming
+stops after WARM_SECONDS or once WARM_MAX_MB of payloads are cached, in the
+order above. Only payloads are cached; the version envelope is added when
+serving, so entries survive a restamp of unchanged data. stats() reports
+how often the warmed entries are hit.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+import api_utils
+from slow_requests import canonical_filters
+
+PRESETS = ('today', 'tomorrow', 'week', 'order_types', 'learned')
+WARM_PRESETS = [p.strip() for p in os.environ.get("WARM_PRESETS", ','.join(PRESETS)).split(',') if p.strip()]
+WARM_SECONDS = float(os.environ.get("WARM_SECONDS", 10))
+WARM_MAX_BYTES = int(float(os.environ.get("WARM_MAX_MB", 64)) * 1024 * 1024)
+# Learned filter sets: the top LEARNED_QUERIES seen at least LEARNED_MIN_HITS
+# times within the last TRAFFIC_WINDOW seconds
+LEARNED_QUERIES = int(os.environ.get("WARM_LEARNED", 10))
+LEARNED_MIN_HITS = 2
+TRAFFIC_WINDOW = 3600
+TRAFFIC_MAX = 5000
+# Endpoints warmed per filter set, cheapest first
+ENDPOINTS = ('summary', 'product_by_day', 'data')
+
+logger = logging.getLogger(__name__)
+
+# (orders table, line_items table, {key: Entry}) for the latest snapshot
+_cache = None
+_traffic = collections.deque(maxlen=TRAFFIC_MAX)  # (time, key) per lookup
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "warm_runs": 0}
+_last_warm = {}
+
+
+class Entry:
+    """One precomputed payload and why it was warmed."""
+
+    __slots__ = ('payload', 'source', 'hits')
+
+    def __init__(self, payload, source):
+        self.payload = payload
+        self.source = source
+        self.hits = 0
+
+
+def query_key(endpoint, filters, columns=None):
+    """Cache key for a request: endpoint, canonical filters and requested columns."""
+    return endpoint, tuple(sorted(canonical_filters(filters).items())), tuple(columns or ())
+
+
+def render(store, endpoint, filters, columns=None):
+    """
+    Compute the payload a JSON endpoint would send for a query.
+
+    Returns:
+        JSON text of the "summary" object or of the "data" records
+    """
+    if endpoint == 'summary':
+        return json.dumps(api_utils.order_summary(store, filters))
+    if endpoint == 'product_by_day':
+        return api_utils.product_by_day(store, filters).to_json(orient='records', date_format='iso')
+    if endpoint == 'data':
+        return api_utils.filter_data(store, filters, columns).to_json(orient='records', date_format='iso')
+    raise ValueError(f"Cannot cache endpoint {endpoint!r}")
+
+
+def envelope(version, field, payload, snapshot=None):
+    """Wrap a cached payload in the {"success", "version"[, "snapshot"], field} response envelope."""
+    if snapshot is not None:
+        return f'{{"success": true, "version": {version}, "snapshot": "{snapshot}", "{field}": {payload}}}'
+    return f'{{"success": true, "version": {version}, "{field}": {payload}}}'
+
+
+def lookup(store, endpoint, filters, columns=None):
+    """
+    Return the warmed payload for a query, or None on a miss.
+
+    Every lookup is also counted as traffic for the learned preset.
+    """
+    key = query_key(endpoint, filters, columns)
+    _traffic.append((time.time(), key))
+    cached = _cache
+    entry = None
+    if cached is not None and cached[0] is store.orders and cached[1] is store.line_items:
+        entry = cached[2].get(key)
+    with _stats_lock:
+        _stats["lookups"] += 1
+        if entry is not None:
+            _stats["hits"] += 1
+            entry.hits += 1
+    return entry.payload if entry is not None else None
+
+
+def _day(offset=0):
+    return (pd.Timestamp.now().normalize() + pd.Timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def learned_queries(now=None):
+    """Most frequent (endpoint, filters, columns) keys within TRAFFIC_WINDOW, busiest first."""
+    now = time.time() if now is None else now
+    counts = collections.Counter(key for seen, key in list(_traffic) if now - seen <= TRAFFIC_WINDOW)
+    return [key for key, n in counts.most_common(LEARNED_QUERIES) if n >= LEARNED_MIN_HITS]
+
+
+def hot_queries(store, presets=None):
+    """
+    Keys to warm for a snapshot, in priority order and without duplicates.
+
+    Returns:
+        List of (key, filters, source)
+    """
+    presets = WARM_PRESETS if presets is None else presets
+    filter_sets = []
+    if 'today' in presets:
+        filter_sets.append(({'pickup_dates': _day(0)}, 'today'))
+    if 'tomorrow' in presets:
+        filter_sets.append(({'pickup_dates': _day(1)}, 'tomorrow'))
+    if 'week' in presets:
+        monday = -pd.Timestamp.now().weekday()
+        filter_sets += [({'pickup_dates': _day(monday + i)}, 'week') for i in range(7)]
+    if 'order_types' in presets:
+        col = store.role('order_type')
+        if col in store.orders.columns:
+            types = sorted({str(t).strip() for t in store.orders[col].dropna() if str(t).strip()})
+            filter_sets += [({'order_type': t}, 'order_types') for t in types]
+
+    queries, seen = [], set()
+    for filters, source in filter_sets:
+        for endpoint in ENDPOINTS:
+            key = query_key(endpoint, filters)
+            if key not in seen:
+                seen.add(key)
+                queries.append((key, filters, source))
+    if 'learned' in presets:
+        for key in learned_queries():
+            if key not in seen:
+                seen.add(key)
+                queries.append((key, dict(key[1]), 'learned'))
+    return queries
+
+
+def warm(store, presets=None):
+    """
+    Precompute the hot queries of a snapshot within the time and memory budget.
+
+    Stops early if a newer snapshot is published meanwhile.
+
+    Returns:
+        Dict with the number of entries, their bytes and the seconds spent
+    """
+    global _cache
+    entries = {}
+    _cache = (store.orders, store.line_items, entries)
+    started = time.perf_counter()
+    size, skipped = 0, 0
+    for key, filters, source in hot_queries(store, presets):
+        if _cache is None or _cache[2] is not entries:
+            break
+        if time.perf_counter() - started > WARM_SECONDS or size >= WARM_MAX_BYTES:
+            skipped += 1
+            continue
+        endpoint, _, columns = key
+        try:
+            payload = render(store, endpoint, filters, list(columns) or None)
+        except Exception as e:
+            logger.warning(f"Warming {endpoint} {filters} failed: {e}")
+            continue
+        if size + len(payload) > WARM_MAX_BYTES:
+            skipped += 1
+            continue
+        entries[key] = Entry(payload, source)
+        size += len(payload)
+    result = {
+        "version": store.version,
+        "entries": len(entries),
+        "bytes": size,
+        "skipped": skipped,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with _stats_lock:
+        _stats["warm_runs"] += 1
+        _last_warm.clear()
+        _last_warm.update(result)
+    logger.info(f"Warmed {len(entries)} queries ({size / 1024:,.0f} KB) in {result['seconds']}s, {skipped} over budget")
+    return result
+
+
+def stats():
+    """Lookup hit rate and how often the warmed entries of the current snapshot were used."""
+    cached = _cache
+    entries = list(cached[2].values()) if cached is not None else []
+    by_source = {}
+    for entry in entries:
+        s = by_source.setdefault(entry.source, {"entries": 0, "used": 0, "hits": 0})
+        s["entries"] += 1
+        s["used"] += entry.hits > 0
+        s["hits"] += entry.hits
+    with _stats_lock:
+        lookups, hits = _stats["lookups"], _stats["hits"]
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "warm_runs": _stats["warm_runs"],
+            "last_warm": dict(_last_warm),
+            "entries": len(entries),
+            "used_entries": sum(e.hits > 0 for e in entries),
+            "bytes": sum(len(e.payload) for e in entries),
+            "by_source": by_source,
+            "learned": [{"endpoint": k[0], "filters": dict(k[1])} for k in learned_queries()],
+        }
+
+
+def _on_refresh(old_store, new_store, changed_order_ids):
+    # Warm off the refresh path; listeners run on the thread that loaded
+    threading.Thread(target=warm, args=(new_store,), name="cache-warm", daemon=True).start()
+
+
+api_utils.add_refresh_listener(_on_refresh)
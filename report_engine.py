@@ -0,0 +1,143 @@
+"""
+Partitioned aggregation for the sales report
+Computes the merged-data metrics of generate_sales_report (matched orders,
+sales by category, top products, sales by order type) as map-reduce over
+partitions of the two frames, in a process pool for large inputs.
+
+Both frames are split by a hash of the normalized OrderID, so every order
+and all of its line items land in the same partition. Each worker merges
+its own partition and returns partial group sums; the reduce step adds
+them per group. Because an order never spans two partitions, the distinct
+order counts (matched orders, OrderID nunique per order type) are exact
+sums of the partial counts, and the product totals are complete before
+the top 10 are picked. Inputs below PARALLEL_MIN_ROWS line items run as a
+single partition in process, i.e. exactly the old single-pass code.
+"""
+
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+
+import schema_registry
+
+PARALLEL_MIN_ROWS = int(os.environ.get("REPORT_PARALLEL_MIN_ROWS", 200000))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", os.cpu_count() or 1))
+# Partitions per worker, so one slow partition does not idle the others
+PARTITIONS_PER_WORKER = 2
+TOP_PRODUCTS = 10
+
+# Blank money/quantity cells count as zero in the breakdowns
+NUMERIC_COLUMNS = ['Subtotal (Calculated)', 'Unit Price', 'CakeQty', 'Total', 'Tax Subtotal', 'AddOnCost']
+
+# Report key -> (group column, aggregations); every aggregation must be
+# additive across OrderID partitions
+BREAKDOWNS = {
+    'sales_by_category': ('Category', {'Subtotal (Calculated)': 'sum', 'Unit Price': 'sum', 'CakeQty': 'sum'}),
+    'top_10_products': ('Product Description', {'Subtotal (Calculated)': 'sum', 'CakeQty': 'sum'}),
+    'sales_by_order_type': ('Order Type ', {'Total': 'sum', 'OrderID': 'nunique'}),
+}
+
+
+def map_partition(customer_orders_df, bakery_products_df, order_id_col):
+    """
+    Merge one partition and compute its partial aggregates.
+
+    Returns:
+        Dict with matched_orders, matched_line_items and, per breakdown,
+        the unrounded group sums, None (group column missing) or the
+        exception raised
+    """
+    merged_df = pd.merge(
+        customer_orders_df,
+        bakery_products_df,
+        on=order_id_col,
+        how='inner',
+        suffixes=('_order', '_item')
+    )
+    partial = {
+        "matched_orders": len(merged_df.groupby(order_id_col)),
+        "matched_line_items": len(merged_df),
+        "breakdowns": {},
+    }
+    for col in NUMERIC_COLUMNS:
+        if col in merged_df.columns:
+            merged_df[col] = schema_registry.numeric(merged_df[col]).fillna(0)
+    for name, (group_col, aggregations) in BREAKDOWNS.items():
+        if group_col not in merged_df.columns:
+            partial["breakdowns"][name] = None
+            continue
+        try:
+            partial["breakdowns"][name] = merged_df.groupby(group_col).agg(aggregations)
+        except Exception as e:
+            partial["breakdowns"][name] = e
+    return partial
+
+
+def _map_task(args):
+    return map_partition(*args)
+
+
+def reduce_partials(partials):
+    """
+    Combine partial aggregates into the report's final frames.
+
+    Returns:
+        Dict with matched_orders, matched_line_items and breakdowns (name ->
+        rounded DataFrame, None or exception)
+    """
+    result = {
+        "matched_orders": sum(p["matched_orders"] for p in partials),
+        "matched_line_items": sum(p["matched_line_items"] for p in partials),
+        "breakdowns": {},
+    }
+    for name in BREAKDOWNS:
+        parts = [p["breakdowns"][name] for p in partials]
+        failed = [part for part in parts if isinstance(part, Exception)]
+        if failed:
+            result["breakdowns"][name] = failed[0]
+            continue
+        if any(part is None for part in parts):
+            result["breakdowns"][name] = None
+            continue
+        non_empty = [part for part in parts if len(part)] or parts[:1]
+        combined = non_empty[0] if len(non_empty) == 1 else pd.concat(non_empty).groupby(level=0, sort=True).sum()
+        if name == 'top_10_products':
+            combined = combined.sort_values('Subtotal (Calculated)', ascending=False).head(TOP_PRODUCTS)
+        result["breakdowns"][name] = combined.round(2)
+    return result
+
+
+def partition_frames(customer_orders_df, bakery_products_df, order_id_col, n_partitions):
+    """Split both frames by a hash of the (already normalized) OrderID."""
+    def buckets(df):
+        return pd.util.hash_array(df[order_id_col].to_numpy(dtype=object)) % np.uint64(n_partitions)
+    order_buckets, line_buckets = buckets(customer_orders_df), buckets(bakery_products_df)
+    return [
+        (customer_orders_df[order_buckets == i], bakery_products_df[line_buckets == i])
+        for i in range(n_partitions)
+    ]
+
+
+def aggregate_orders(customer_orders_df, bakery_products_df, order_id_col, workers=None):
+    """
+    Merged-data report metrics, in parallel for large inputs.
+
+    Args:
+        customer_orders_df, bakery_products_df: Converted frames whose
+            order_id_col holds normalized (stripped, upper-case) text
+        order_id_col: Join column
+        workers: Process count (default REPORT_WORKERS)
+
+    Returns:
+        The reduce_partials result
+    """
+    workers = REPORT_WORKERS if workers is None else workers
+    if workers <= 1 or len(bakery_products_df) < PARALLEL_MIN_ROWS:
+        return reduce_partials([map_partition(customer_orders_df, bakery_products_df, order_id_col)])
+    partitions = partition_frames(customer_orders_df, bakery_products_df, order_id_col,
+                                  workers * PARTITIONS_PER_WORKER)
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        partials = list(pool.map(_map_task, [(co, bp, order_id_col) for co, bp in partitions]))
+    return reduce_partials(partials)
@@ -0,0 +1,291 @@
+"""
+On-demand profiling of live API requests
+A request carrying the profiling token (X-Profile-Token header or _profile
+query parameter) runs under a sampling profiler, or cProfile with
+_profile_mode=cprofile, and optionally tracemalloc (_profile_mem=1). The
+collapsed-stack flamegraph file and top allocation sites are stored under
+PROFILE_DIR and named in the X-Profile-Id response header. Without a
+configured PROFILE_TOKEN none of this is installed.
+"""
+
+import collections
+import contextlib
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_TOKEN_ENV = "PROFILE_TOKEN"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"))
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_ALLOCATIONS = 25
+MAX_STACK_DEPTH = 128
+
+_local = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+class StageTimer:
+    """Wall-clock time per named stage (load, parse, filter, serialize...)."""
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def as_dict(self):
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+
+_NO_STAGE = contextlib.nullcontext()
+
+
+def stage(name):
+    """
+    Time a stage of the current request if a timer is active on this thread.
+
+    Returns a shared no-op context manager otherwise, so instrumented code
+    pays one attribute lookup when profiling is off.
+    """
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        return _NO_STAGE
+    return timer.stage(name)
+
+
+def start_stage_timer():
+    """Install a StageTimer for the current thread and return it."""
+    _local.timer = StageTimer()
+    return _local.timer
+
+
+def current_stage_timer():
+    """Return the current thread's StageTimer, or None."""
+    return getattr(_local, 'timer', None)
+
+
+def stop_stage_timer():
+    """Remove and return the current thread's StageTimer (or None)."""
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    return timer
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into collapsed stacks."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Brendan Gregg collapsed-stack format, ready for flamegraph.pl / speedscope."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common()) + "\n"
+
+
+def check_token(supplied):
+    """Return True if supplied matches PROFILE_TOKEN (always False when unset)."""
+    expected = os.environ.get(PROFILE_TOKEN_ENV)
+    if not expected or not supplied:
+        return False
+    return hmac.compare_digest(str(supplied), expected)
+
+
+class RequestProfile:
+    """Profiler state for one request, from before_request to after_request (or teardown)."""
+
+    def __init__(self, name, mode='sample', memory=False):
+        self.name = name
+        self.mode = mode
+        self.memory = memory
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.timer = start_stage_timer()
+        self.sampler = None
+        self.profiler = None
+        self.memory_snapshot = None
+        self.traced_memory = None
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(16)
+            self._owns_tracemalloc = True
+        else:
+            self._owns_tracemalloc = False
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.sampler = StackSampler(threading.get_ident())
+            self.sampler.start()
+
+    def stop(self):
+        """
+        Stop the profiler or sampler thread, the stage timer and tracemalloc.
+
+        Safe to call more than once; finish() calls it first.
+        """
+        if self.elapsed is not None:
+            return
+        self.elapsed = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if _local.__dict__.get('timer') is self.timer:
+            stop_stage_timer()
+        if self.memory:
+            self.memory_snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            self.traced_memory = tracemalloc.get_traced_memory()
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+    def finish(self, response_bytes=None):
+        """
+        Stop profiling and write the result files.
+
+        Returns:
+            The profile id (file name prefix under PROFILE_DIR)
+        """
+        self.stop()
+        elapsed, timer = self.elapsed, self.timer
+
+        profile_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{self.name}_{os.getpid()}_{threading.get_ident() % 10000}"
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, profile_id)
+        meta = {
+            "id": profile_id,
+            "endpoint": self.name,
+            "mode": self.mode,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "stages_ms": timer.as_dict() if timer else {},
+            "response_bytes": response_bytes,
+            "files": [],
+        }
+
+        if self.sampler is not None:
+            with open(base + ".folded", "w") as f:
+                f.write(self.sampler.collapsed())
+            meta["files"].append(profile_id + ".folded")
+            meta["samples"] = sum(self.sampler.counts.values())
+        if self.profiler is not None:
+            self.profiler.dump_stats(base + ".prof")
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            with open(base + ".txt", "w") as f:
+                f.write(out.getvalue())
+            meta["files"] += [profile_id + ".prof", profile_id + ".txt"]
+        if self.memory:
+            current, peak = self.traced_memory
+            meta["memory"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [
+                    {"site": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                    for stat in self.memory_snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+                ] if self.memory_snapshot is not None else [],
+            }
+
+        with open(base + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+        meta["files"].append(profile_id + ".json")
+        return profile_id
+
+
+def install(app):
+    """
+    Register the profiling hooks on a Flask app.
+
+    Nothing is registered unless PROFILE_TOKEN is set, so unprofiled
+    deployments run exactly the code they ran before.
+    """
+    if not os.environ.get(PROFILE_TOKEN_ENV):
+        return False
+
+    from flask import g, request, send_from_directory, jsonify, abort
+
+    @app.before_request
+    def _start_profile():
+        token = request.headers.get('X-Profile-Token') or request.args.get('_profile')
+        if not token or not check_token(token):
+            return None
+        mode = request.args.get('_profile_mode', request.headers.get('X-Profile-Mode', 'sample'))
+        memory = (request.args.get('_profile_mem') or request.headers.get('X-Profile-Mem')) in ('1', 'true')
+        g.request_profile = RequestProfile(request.endpoint or 'unknown', mode=mode, memory=memory)
+        return None
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            size = None if response.is_streamed else response.calculate_content_length()
+            response.headers['X-Profile-Id'] = profile.finish(size)
+        return response
+
+    @app.teardown_request
+    def _stop_profile(exc):
+        # after_request is skipped when a view raises; never leak the sampler
+        # thread, tracemalloc or the stage timer into the next request
+        profile = g.pop('request_profile', None)
+        if profile is None:
+            return
+        try:
+            profile.finish()
+        except Exception as e:
+            profile.stop()
+            logger.warning(f"Could not write the profile of a failed request: {e}")
+
+    @app.route('/api/profiles/<path:filename>', methods=['GET'])
+    def profile_file(filename):
+        """Download a stored profile file (token required)."""
+        token = request.headers.get('X-Profile-Token') or request.args.get('_profile')
+        if not check_token(token):
+            abort(403)
+        return send_from_directory(PROFILE_DIR, filename)
+
+    @app.route('/api/profiles', methods=['GET'])
+    def profile_list():
+        """List stored profiles, newest first (token required)."""
+        token = request.headers.get('X-Profile-Token') or request.args.get('_profile')
+        if not check_token(token):
+            abort(403)
+        names = sorted(
+            (n[:-5] for n in os.listdir(PROFILE_DIR) if n.endswith('.json')), reverse=True
+        ) if os.path.isdir(PROFILE_DIR) else []
+        return jsonify({"success": True, "profiles": names})
+
+    return True
@@ -4,6 +4,8 @@ Sales Report Generator from Google Sheets
 Reads Customer Orders and Bakery Products Ordered sheets and generates a sales report.
 """
 
+import concurrent.futures
+import importlib.util
 import gspread
 from google.oauth2.service_account import Credentials
 import pandas as pd
@@ -16,6 +18,11 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 
+import data_sources
+import report_engine
+import schema_registry
+from sheets_scheduler import scheduler, PRIORITY_BATCH
+
 # Google Sheets configuration
 SPREADSHEET_ID = "1YAHO5rHhFVEReyAuxa7r2SDnoH7BnDfsmSEZ1LyjB8A"
 CUSTOMER_ORDERS_SHEET_NAME = "Customer Orders"
@@ -52,32 +59,32 @@ def authenticate_google_sheets(credentials_path=None):
     return client
 
 
-def read_sheet_data(client, sheet_name):
+def read_sheet_data(client, sheet_name, spreadsheet_id=SPREADSHEET_ID):
     """
     Read data from a specific sheet in the spreadsheet.
     
     Args:
         client: gspread Client object
         sheet_name: Name of the sheet to read
+        spreadsheet_id: Spreadsheet holding the sheet (default SPREADSHEET_ID)
     
     Returns:
         pandas DataFrame with the sheet data (date columns as text)
     """
     try:
-        spreadsheet = client.open_by_key(SPREADSHEET_ID)
-        sheet = spreadsheet.worksheet(sheet_name)
+        # Batch priority: report runs yield the Sheets quota to the dashboard
+        spreadsheet = scheduler.call(client.open_by_key, spreadsheet_id, priority=PRIORITY_BATCH)
+        sheet = scheduler.call(spreadsheet.worksheet, sheet_name, priority=PRIORITY_BATCH)
         
         # Get all values
-        data = sheet.get_all_records()
+        data = scheduler.call(sheet.get_all_records, priority=PRIORITY_BATCH)
         
         # Convert to DataFrame
         df = pd.DataFrame(data)
         
         # Ensure date columns are read as strings/text
-        date_columns = ['Order Date', 'Due Pickup Date', 'Pickup Timestamp', 'Due Date']
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str).replace('nan', '')
+        for col in schema_registry.table_plan(df.columns).date_columns:
+            df[col] = df[col].astype(str).replace('nan', '')
         
         print(f"✓ Successfully read {len(df)} rows from '{sheet_name}'")
         return df
@@ -90,6 +97,60 @@ def read_sheet_data(client, sheet_name):
         return pd.DataFrame()
 
 
+def read_export_data(path, sheet_name):
+    """
+    Read one sheet from an exported CSV or XLSX file (see file_source).
+
+    Returns:
+        pandas DataFrame with the sheet data (date columns as text)
+    """
+    import file_source
+    df = file_source.read_table(path, sheet_name)
+    # XLSX cells arrive as datetimes: write them back in the column's own sheet
+    # format, so e.g. Pickup Timestamp keeps its time of day
+    for col, (formats, _) in schema_registry.table_plan(df.columns).date_rules.items():
+        df[col] = df[col].map(
+            lambda v, fmt=formats[0]: v.strftime(fmt) if hasattr(v, 'strftime') and not pd.isna(v) else str(v)
+        ).replace(['nan', 'NaT'], '')
+    print(f"✓ Successfully read {len(df)} rows from '{sheet_name.strip()}' ({path})")
+    return df
+
+
+def read_all_sources(client):
+    """
+    Read both sheets of every configured store concurrently.
+
+    Each store's rows are tagged with its location (see data_sources) and
+    the stores are combined into one pair of frames.
+
+    Returns:
+        Tuple (customer_orders_df, bakery_products_df)
+    """
+    sources = data_sources.configured_sources()
+
+    def read_source(source):
+        if source.is_file:
+            customer_orders_df = read_export_data(source.orders_file, source.orders_sheet)
+            bakery_products_df = read_export_data(source.products_file, source.products_sheet)
+        else:
+            customer_orders_df = read_sheet_data(client, source.orders_sheet, source.spreadsheet_id)
+            bakery_products_df = read_sheet_data(client, source.products_sheet, source.spreadsheet_id)
+        data_sources.tag_frames(source, customer_orders_df, bakery_products_df)
+        return customer_orders_df, bakery_products_df
+
+    with concurrent.futures.ThreadPoolExecutor(data_sources.SOURCE_WORKERS) as pool:
+        frames = list(pool.map(read_source, sources))
+    if len(frames) == 1:
+        return frames[0]
+
+    def combine(parts):
+        # Stores whose sheets failed contribute empty frames; all of them may have
+        parts = [df for df in parts if not df.empty]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    return combine([co for co, _ in frames]), combine([bp for _, bp in frames])
+
+
 def generate_sales_report(customer_orders_df, bakery_products_df):
     """
     Generate a comprehensive sales report from the two dataframes.
@@ -111,119 +172,69 @@ def generate_sales_report(customer_orders_df, bakery_products_df):
     report["summary"]["total_customer_orders"] = len(customer_orders_df)
     report["summary"]["total_line_items"] = len(bakery_products_df)
     
-    # Try to identify common column names for order ID/key
-    order_id_col = None
-    for col in customer_orders_df.columns:
-        if col.lower() == 'orderid':
-            order_id_col = col
-            break
-    
-    # If not found, try broader search
-    if not order_id_col:
-        for col in customer_orders_df.columns:
-            if any(keyword in col.lower() for keyword in ['order', 'id', 'key', 'number']):
-                order_id_col = col
-                break
-    
-    # Merge data if we can find a common key
-    merged_df = None
+    # Column roles come from the schema registry, resolved once per header layout
+    schema = schema_registry.schema_for(customer_orders_df.columns, bakery_products_df.columns)
+    order_id_col = schema.order_id_col
+    
+    # Convert dates and numbers once; merged columns inherit the types
+    customer_orders_df = schema.orders.convert(customer_orders_df.copy())
+    bakery_products_df = schema.products.convert(bakery_products_df.copy())
+    
+    # Merge data if we can find a common key; the merge and the breakdowns
+    # run as partitioned map-reduce (parallel for large inputs)
+    aggregates = None
     if order_id_col and order_id_col in bakery_products_df.columns:
         try:
             # Convert OrderID to string for both dataframes to ensure matching
-            customer_orders_df = customer_orders_df.copy()
-            bakery_products_df = bakery_products_df.copy()
             customer_orders_df[order_id_col] = customer_orders_df[order_id_col].astype(str).str.strip().str.upper()
             bakery_products_df[order_id_col] = bakery_products_df[order_id_col].astype(str).str.strip().str.upper()
             
-            merged_df = pd.merge(
-                customer_orders_df,
-                bakery_products_df,
-                on=order_id_col,
-                how='inner',
-                suffixes=('_order', '_item')
-            )
-            report["summary"]["matched_orders"] = len(merged_df.groupby(order_id_col))
-            report["summary"]["matched_line_items"] = len(merged_df)
+            aggregates = report_engine.aggregate_orders(customer_orders_df, bakery_products_df, order_id_col)
+            report["summary"]["matched_orders"] = aggregates["matched_orders"]
+            report["summary"]["matched_line_items"] = aggregates["matched_line_items"]
         except Exception as e:
-            merged_df = None
+            aggregates = None
             report["summary"]["matched_orders"] = f"Error matching: {str(e)}"
     else:
         report["summary"]["matched_orders"] = "Unable to match (no common order ID found)"
     
-    # Try to find amount/price columns
-    amount_cols = []
-    for col in bakery_products_df.columns:
-        if any(keyword in col.lower() for keyword in ['amount', 'price', 'cost', 'total', 'value']):
-            amount_cols.append(col)
+    # Totals for amount/price columns
+    amount_cols = schema.products.money_columns
     
     if amount_cols:
         for col in amount_cols:
             try:
-                # Convert to numeric, handling any string values
-                numeric_values = pd.to_numeric(bakery_products_df[col], errors='coerce')
-                total = numeric_values.sum()
+                total = schema_registry.numeric(bakery_products_df[col]).sum()
                 if pd.notna(total):
                     report["summary"][f"total_{col.lower().replace(' ', '_')}"] = float(total)
             except:
                 pass
     
-    # Try to find quantity columns
-    qty_cols = []
-    for col in bakery_products_df.columns:
-        if any(keyword in col.lower() for keyword in ['quantity', 'qty', 'amount', 'count']):
-            qty_cols.append(col)
+    # Totals for quantity columns
+    qty_cols = schema.products.quantity_columns
     
     if qty_cols:
         for col in qty_cols:
             try:
-                numeric_values = pd.to_numeric(bakery_products_df[col], errors='coerce')
-                total_qty = numeric_values.sum()
+                total_qty = schema_registry.numeric(bakery_products_df[col]).sum()
                 if pd.notna(total_qty):
                     report["summary"][f"total_{col.lower().replace(' ', '_')}"] = float(total_qty)
             except:
                 pass
     
-    # Additional analysis if merged data is available
-    if merged_df is not None and len(merged_df) > 0:
-        # Convert numeric columns to proper types
-        numeric_cols = ['Subtotal (Calculated)', 'Unit Price', 'CakeQty', 'Total', 'Tax Subtotal', 'AddOnCost']
-        for col in numeric_cols:
-            if col in merged_df.columns:
-                merged_df[col] = pd.to_numeric(merged_df[col], errors='coerce').fillna(0)
-        
-        # Sales by category
-        if 'Category' in merged_df.columns:
-            try:
-                category_sales = merged_df.groupby('Category').agg({
-                    'Subtotal (Calculated)': 'sum',
-                    'Unit Price': 'sum',
-                    'CakeQty': 'sum'
-                }).round(2)
-                report["details"]["sales_by_category"] = category_sales.to_dict('index')
-            except Exception as e:
-                print(f"  Warning: Could not calculate sales by category: {e}")
-        
-        # Top products by revenue
-        if 'Product Description' in merged_df.columns:
-            try:
-                top_products = merged_df.groupby('Product Description').agg({
-                    'Subtotal (Calculated)': 'sum',
-                    'CakeQty': 'sum'
-                }).sort_values('Subtotal (Calculated)', ascending=False).head(10).round(2)
-                report["details"]["top_10_products"] = top_products.to_dict('index')
-            except Exception as e:
-                print(f"  Warning: Could not calculate top products: {e}")
-        
-        # Sales by order type
-        if 'Order Type ' in merged_df.columns:
-            try:
-                order_type_sales = merged_df.groupby('Order Type ').agg({
-                    'Total': 'sum',
-                    'OrderID': 'nunique'
-                }).round(2)
-                report["details"]["sales_by_order_type"] = order_type_sales.to_dict('index')
-            except Exception as e:
-                print(f"  Warning: Could not calculate sales by order type: {e}")
+    # Sales by category, top products by revenue and sales by order type
+    if aggregates is not None and aggregates["matched_line_items"] > 0:
+        labels = {
+            'sales_by_category': 'sales by category',
+            'top_10_products': 'top products',
+            'sales_by_order_type': 'sales by order type',
+        }
+        for name, label in labels.items():
+            result = aggregates["breakdowns"][name]
+            if isinstance(result, Exception):
+                print(f"  Warning: Could not calculate {label}: {result}")
+            elif result is not None:
+                report["details"][name] = result.to_dict('index')
     
     # Store column names for reference
     report["details"]["customer_orders_columns"] = list(customer_orders_df.columns)
@@ -296,29 +307,12 @@ def filter_by_date_range(df, date_column, start_date, end_date):
     # Create a copy to avoid modifying original
     df_copy = df.copy()
     
-    # Ensure date column is text/string
-    df_copy[date_column] = df_copy[date_column].astype(str).replace(['nan', 'None', ''], '')
-    
-    # Convert date column from text to datetime - try explicit formats first, then default parsing
-    # First try MM-DD-YYYY format (most common)
-    df_copy[date_column] = pd.to_datetime(df_copy[date_column], errors='coerce', format='%m-%d-%Y')
-    # For any that didn't parse, try M/D/YYYY format
-    mask_not_parsed = df_copy[date_column].isna()
-    if mask_not_parsed.any():
-        df_copy.loc[mask_not_parsed, date_column] = pd.to_datetime(
-            df_copy.loc[mask_not_parsed, date_column], 
-            errors='coerce', 
-            format='%m/%d/%Y'
-        )
-    # For any still not parsed, try default parsing
-    mask_still_not_parsed = df_copy[date_column].isna()
-    if mask_still_not_parsed.any():
-        df_copy.loc[mask_still_not_parsed, date_column] = pd.to_datetime(
-            df_copy.loc[mask_still_not_parsed, date_column], 
-            errors='coerce', 
-            dayfirst=False, 
-            yearfirst=False
-        )
+    # Convert date column from text to datetime with the registry's rules
+    # (explicit formats first, then default parsing); no-op if already parsed
+    formats, fallback = schema_registry.table_plan(df.columns).date_rules.get(
+        date_column, schema_registry.DEFAULT_DATE_RULE
+    )
+    df_copy[date_column] = schema_registry.parse_date_text(df_copy[date_column], formats, fallback)
     
     # Filter by date range
     mask = (df_copy[date_column] >= pd.Timestamp(start_date)) & (df_copy[date_column] <= pd.Timestamp(end_date))
@@ -553,23 +547,32 @@ def generate_pdf_report(customer_orders_df, bakery_products_df, merged_df, repor
     return pdf_path
 
 
-def save_report_to_csv(customer_orders_df, bakery_products_df, output_dir="reports"):
-    """
-    Save the dataframes to CSV files for further analysis.
+def save_report_to_archive(customer_orders_df, bakery_products_df, start_date=None, end_date=None,
+                           output_dir=None):
     """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    customer_orders_path = os.path.join(output_dir, f"customer_orders_{timestamp}.csv")
-    bakery_products_path = os.path.join(output_dir, f"bakery_products_{timestamp}.csv")
+    Save the dataframes to the Parquet export archive for further analysis.
     
-    customer_orders_df.to_csv(customer_orders_path, index=False)
-    bakery_products_df.to_csv(bakery_products_path, index=False)
+    Files are named by content hash, so a run with unchanged data writes
+    nothing. Load them back with export_archive.load_range(start, end).
+    Needs pyarrow (requirements-optional.txt).
+    """
+    import export_archive
+    output_dir = output_dir or export_archive.EXPORT_DIR
+    entry, written = export_archive.export_frames(
+        {"customer_orders": customer_orders_df, "bakery_products": bakery_products_df},
+        date_column="Order Date",
+        start_date=start_date,
+        end_date=end_date,
+        output_dir=output_dir,
+    )
     
-    print(f"\n✓ Data exported to:")
-    print(f"  - {customer_orders_path}")
-    print(f"  - {bakery_products_path}")
+    if not written:
+        print(f"\n✓ Data unchanged since export {entry['hash']} ({entry['created_at']}); nothing written")
+        return entry
+    print(f"\n✓ Data exported to {output_dir}:")
+    for filename in entry["files"].values():
+        print(f"  - {filename}")
+    return entry
 
 
 def main():
@@ -584,29 +587,30 @@ def main():
     end_date = date(2025, 11, 15)
     print(f"\nFiltering data from {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}")
     
-    # Authenticate
+    # Authenticate (not needed when every source reads exported files)
+    client = None
     try:
         print("\n1. Authenticating with Google Sheets API...")
-        client = authenticate_google_sheets("long-canto-360620-6858c5a01c13.json")
-        print("✓ Authentication successful")
+        if all(source.is_file for source in data_sources.configured_sources()):
+            print("✓ Reading exported files; no authentication needed")
+        else:
+            client = authenticate_google_sheets("long-canto-360620-6858c5a01c13.json")
+            print("✓ Authentication successful")
     except Exception as e:
         print(f"✗ Authentication failed: {str(e)}")
         print("  Make sure 'long-canto-360620-6858c5a01c13.json' exists and the service account")
         print("  has been granted access to the Google Sheet.")
         return
     
-    # Read Customer Orders sheet
-    print("\n2. Reading Customer Orders sheet...")
-    customer_orders_df = read_sheet_data(client, CUSTOMER_ORDERS_SHEET_NAME)
+    # Read Customer Orders and Bakery Products Ordered sheets of every store
+    print(f"\n2. Reading Customer Orders sheets ({len(data_sources.configured_sources())} store(s))...")
+    customer_orders_df, bakery_products_df = read_all_sources(client)
     
     if customer_orders_df.empty:
         print("✗ No data found in Customer Orders sheet")
         return
     
-    # Read Bakery Products Ordered sheet
-    print("\n3. Reading Bakery Products Ordered sheet...")
-    bakery_products_df = read_sheet_data(client, BAKERY_PRODUCTS_SHEET_NAME)
-    
+    print("\n3. Checking Bakery Products Ordered sheets...")
     if bakery_products_df.empty:
         print("✗ No data found in Bakery Products Ordered sheet")
         return
@@ -689,9 +693,12 @@ def main():
         end_date=end_date
     )
     
-    # Save to CSV
-    print("\n7. Exporting filtered data to CSV...")
-    save_report_to_csv(customer_orders_filtered, bakery_products_filtered)
+    # Save to the Parquet export archive
+    print("\n7. Exporting filtered data to the Parquet archive...")
+    if importlib.util.find_spec('pyarrow') is None:
+        print("  - skipped: pyarrow is not installed (pip install -r requirements-optional.txt)")
+    else:
+        save_report_to_archive(customer_orders_filtered, bakery_products_filtered, start_date, end_date)
     
     # Save report JSON
     report_path = os.path.join("reports", f"sales_report_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.json")
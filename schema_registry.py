@@ -0,0 +1,278 @@
+"""
+Schema registry for the order sheets
+Fingerprints the header rows of Customer Orders and Bakery Products, resolves
+the semantic role of each column once (order ID, money, quantity, date,
+category) and compiles a conversion plan cached per fingerprint. load_data,
+filter_data and the report code share the plan, so each refresh converts
+every column exactly once and header changes are detected from the
+fingerprint alone.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+
+import pandas as pd
+
+# Explicit formats tried in order before falling back to pandas' parser
+MDY_FORMATS = ('%m-%d-%Y', '%m/%d/%Y')
+
+# Known date columns: (formats, fall back to inferred parsing)
+DATE_RULES = {
+    'Order Date': (MDY_FORMATS, True),
+    'Due Pickup Date': (MDY_FORMATS, True),
+    'Pickup Timestamp': (('%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M'), True),
+    'Due Date': (MDY_FORMATS, False),
+}
+DEFAULT_DATE_RULE = (MDY_FORMATS, True)
+
+# Keyword heuristics, matched against lower-cased header names
+ORDER_ID_KEYWORDS = ['order', 'id', 'key', 'number']
+MONEY_KEYWORDS = ['amount', 'price', 'cost', 'total', 'value']
+QUANTITY_KEYWORDS = ['quantity', 'qty', 'amount', 'count']
+DATE_KEYWORDS = ['date', 'timestamp']
+CATEGORY_KEYWORDS = ['category', 'type']
+
+# Named columns the API filters and aggregates on, with accepted spellings
+ROLE_ALIASES = {
+    'order_date': ['Order Date'],
+    'pickup_date': ['Due Pickup Date'],
+    'pickup_timestamp': ['Pickup Timestamp'],
+    'pickup_time': ['Due Pickup Time'],
+    'order_type': ['Order Type ', 'Order Type'],
+    'product': ['Product Description'],
+    'category': ['Category'],
+    'first_name': ['Customer First Name'],
+    'last_name': ['Customer Last Name'],
+    'revenue': ['Subtotal (Calculated)'],
+    'quantity': ['CakeQty'],
+    'order_total': ['Total'],
+    'location': ['Location'],
+}
+
+# Text values Sheets exports for empty cells
+BLANK_VALUES = ['nan', 'None', 'NaT', 'NaN']
+
+_plans = {}
+_schemas = {}
+_plans_lock = threading.Lock()
+_last_fingerprints = {}  # origin (e.g. spreadsheet id) -> last header fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_headers(*headers):
+    """Stable hash of one or more header rows."""
+    payload = json.dumps([list(map(str, h)) for h in headers])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _matching(columns, keywords):
+    return [col for col in columns if any(k in str(col).lower() for k in keywords)]
+
+
+def parse_date_text(values, formats=MDY_FORMATS, fallback=True):
+    """
+    Parse a column of date text, trying each format on the still-unparsed rows.
+
+    Args:
+        values: Series of date strings (blank cells as '' / 'nan')
+        formats: strptime formats to try in order
+        fallback: Whether to try pandas' inferred parsing last
+
+    Returns:
+        datetime64 Series (NaT where nothing matched)
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    text = values.astype(str).replace(BLANK_VALUES, '').str.strip()
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    pending = (text != '').to_numpy()
+    for fmt in formats:
+        if not pending.any():
+            break
+        result.iloc[pending] = pd.to_datetime(text[pending], errors='coerce', format=fmt).to_numpy()
+        pending &= result.isna().to_numpy()
+    if fallback and pending.any():
+        result.iloc[pending] = pd.to_datetime(
+            text[pending], errors='coerce', dayfirst=False, yearfirst=False
+        ).to_numpy()
+        pending &= result.isna().to_numpy()
+    if fallback and pending.any():
+        # pandas infers one format from the first value; parse stragglers one by one
+        result.iloc[pending] = pd.to_datetime(text[pending], errors='coerce', format='mixed').to_numpy()
+    return result
+
+
+def numeric(values):
+    """Return a column as numbers, converting text only when needed."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    return pd.to_numeric(values, errors='coerce')
+
+
+def _coerce_numeric(values):
+    """
+    Convert a money/quantity column to numbers unless it is really text.
+
+    A header can match the keywords without holding numbers (e.g. a
+    "Discount Code" column); such columns are left untouched.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    converted = pd.to_numeric(values, errors='coerce')
+    non_blank = values.notna() & (values.astype(str).str.strip() != '')
+    lost = non_blank & converted.isna()
+    if lost.sum() * 2 > non_blank.sum():
+        return values
+    return converted
+
+
+class TablePlan:
+    """Column roles and the compiled conversions for one sheet's header row."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.fingerprint = fingerprint_headers(self.columns)
+        self.date_rules = {
+            col: DATE_RULES.get(col, DEFAULT_DATE_RULE)
+            for col in self.columns
+            if col in DATE_RULES or any(k in str(col).lower() for k in DATE_KEYWORDS)
+        }
+        self.money_columns = [c for c in _matching(self.columns, MONEY_KEYWORDS) if c not in self.date_rules]
+        self.quantity_columns = [c for c in _matching(self.columns, QUANTITY_KEYWORDS) if c not in self.date_rules]
+        self.category_columns = [
+            c for c in _matching(self.columns, CATEGORY_KEYWORDS)
+            if c not in self.date_rules and c not in self.money_columns
+        ]
+        self.numeric_columns = list(dict.fromkeys(self.money_columns + self.quantity_columns))
+
+    @property
+    def date_columns(self):
+        return list(self.date_rules)
+
+    def convert_dates(self, df):
+        """Parse every date column of df in place."""
+        for col, (formats, fallback) in self.date_rules.items():
+            if col in df.columns:
+                df[col] = parse_date_text(df[col], formats, fallback)
+        return df
+
+    def convert(self, df):
+        """Apply the full plan (dates and numbers) to df in place."""
+        self.convert_dates(df)
+        for col in self.numeric_columns:
+            if col in df.columns:
+                df[col] = _coerce_numeric(df[col])
+        return df
+
+
+class SheetSchema:
+    """Resolved roles across both sheets, keyed by their combined fingerprint."""
+
+    def __init__(self, orders_plan, products_plan):
+        self.orders = orders_plan
+        self.products = products_plan
+        self.fingerprint = fingerprint_headers(orders_plan.columns, products_plan.columns)
+        self.order_id_col = self._resolve_order_id()
+        self.roles = {}
+        for role, aliases in ROLE_ALIASES.items():
+            column = self._resolve_alias(aliases)
+            if column is not None:
+                self.roles[role] = column
+
+    def _resolve_order_id(self):
+        for col in self.orders.columns:
+            if str(col).lower() == 'orderid':
+                return col
+        for col in self.orders.columns:
+            if any(k in str(col).lower() for k in ORDER_ID_KEYWORDS):
+                return col
+        return None
+
+    def _resolve_alias(self, aliases):
+        all_columns = self.orders.columns + self.products.columns
+        for alias in aliases:
+            if alias in all_columns:
+                return alias
+        wanted = {a.strip().lower() for a in aliases}
+        for col in all_columns:
+            if str(col).strip().lower() in wanted:
+                return col
+        return None
+
+    def role(self, name, default=None):
+        """Column playing a named role (e.g. 'order_type'), or default."""
+        return self.roles.get(name, default)
+
+    def describe(self):
+        """JSON-friendly summary of the resolved roles."""
+        return {
+            "fingerprint": self.fingerprint,
+            "order_id": self.order_id_col,
+            "roles": self.roles,
+            "orders": {
+                "dates": self.orders.date_columns,
+                "money": self.orders.money_columns,
+                "quantity": self.orders.quantity_columns,
+                "category": self.orders.category_columns,
+            },
+            "products": {
+                "dates": self.products.date_columns,
+                "money": self.products.money_columns,
+                "quantity": self.products.quantity_columns,
+                "category": self.products.category_columns,
+            },
+        }
+
+
+def table_plan(columns):
+    """Compiled plan for one header row, cached by fingerprint."""
+    key = fingerprint_headers(list(columns))
+    plan = _plans.get(key)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.setdefault(key, TablePlan(columns))
+    return plan
+
+
+def schema_for(orders_columns, products_columns, origin=None):
+    """
+    Resolved schema for the two sheets' headers, cached by fingerprint.
+
+    When origin names the spreadsheet the headers were read from, logs a
+    warning the first time its fingerprint differs from the previous one,
+    i.e. when someone edited the header row of either sheet. Stores with
+    different spreadsheets are tracked separately.
+    """
+    key = fingerprint_headers(list(orders_columns), list(products_columns))
+    schema = _schemas.get(key)
+    if schema is None:
+        with _plans_lock:
+            schema = _schemas.get(key)
+            if schema is None:
+                schema = SheetSchema(TablePlan(orders_columns), TablePlan(products_columns))
+                _schemas[key] = schema
+    if origin is not None:
+        last = _last_fingerprints.get(origin)
+        if last is not None and key != last:
+            logger.warning(f"Sheet headers changed (schema {last} -> {key})")
+        _last_fingerprints[origin] = key
+    return schema
+
+
+def prepare_frames(customer_orders_df, bakery_products_df, origin='sheets'):
+    """
+    Apply the compiled conversion plan to freshly read sheets, in place.
+
+    Args:
+        origin: Spreadsheet the frames were read from, for header change warnings
+
+    Returns:
+        The SheetSchema used
+    """
+    schema = schema_for(customer_orders_df.columns, bakery_products_df.columns, origin)
+    schema.orders.convert(customer_orders_df)
+    schema.products.convert(bakery_products_df)
+    return schema
@@ -0,0 +1,381 @@
+"""
+Multi-season order archive
+Freezes a finished season's orders and line items into Parquet files
+partitioned by season and order date:
+
+    archive/season=2024/frozen=20250105T101500/order_date=2024-11-20/orders.parquet
+    archive/season=2024/frozen=20250105T101500/order_date=2024-11-20/line_items.parquet
+
+manifest.json records min/max order and pickup dates for every partition,
+so a date-filtered query opens only the partitions that can match. Each
+freeze writes a new frozen= directory and switches the manifest to it
+atomically before the previous one is removed, so the manifest never
+points at missing or half-written partitions. The
+year-over-year summary puts the live snapshot next to each archived season,
+with the dashboard filters shifted to the same calendar window.
+
+Usage:
+    python season_archive.py freeze SEASON [SPREADSHEET_ID]
+    python season_archive.py list
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+
+ARCHIVE_DIR = os.environ.get(
+    "SEASON_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+)
+MANIFEST_NAME = "manifest.json"
+UNKNOWN_DATE = "unknown"
+SEASON_CACHE_SIZE = 16
+# pyarrow is optional (requirements-optional.txt); without it archived
+# seasons cannot be read or written and only the live season is summarized
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Built stores for archived seasons, keyed by the partition paths they were read from
+_season_cache = {}
+_cache_lock = threading.Lock()
+
+
+# ============================================================================
+# WRITING
+# ============================================================================
+
+def _date_stats(values):
+    """(min, max) ISO dates of a datetime column, or (None, None)."""
+    values = values.dropna() if values is not None else None
+    if values is None or values.empty:
+        return None, None
+    return values.min().date().isoformat(), values.max().date().isoformat()
+
+
+def _write_frame(df, path):
+    import pyarrow.parquet as pq
+    import arrow_ipc
+    pq.write_table(arrow_ipc.frame_to_table(df.reset_index(drop=True)), path)
+
+
+def freeze_season(store, season, archive_dir=None):
+    """
+    Write one season's orders and line items as date partitions.
+
+    An existing archive of the same season is replaced, so a season can be
+    re-frozen after late corrections. The partitions are written to a new
+    directory and the manifest is switched to it in one step, so a crash
+    leaves either the old or the new freeze, never a mix.
+
+    Args:
+        store: OrderStore holding the season (e.g. loaded from its spreadsheet)
+        season: Season label, usually the year (e.g. 2024)
+        archive_dir: Archive root (default ARCHIVE_DIR)
+
+    Returns:
+        List of manifest entries written
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    season = str(season)
+    order_date_col = store.role('order_date')
+    pickup_col = store.role('pickup_date')
+
+    orders = store.orders.reset_index()
+    line_items = store.line_items.copy()
+    line_items['OrderID'] = line_items['OrderID'].astype(str)
+
+    if order_date_col in orders.columns:
+        keys = orders[order_date_col].dt.strftime('%Y-%m-%d').fillna(UNKNOWN_DATE)
+    else:
+        keys = pd.Series(UNKNOWN_DATE, index=orders.index)
+    line_keys = keys.to_numpy()[store.line_order_pos]
+
+    season_dir = os.path.join(archive_dir, f"season={season}")
+    frozen = f"frozen={time.strftime('%Y%m%dT%H%M%S')}"
+    while os.path.exists(os.path.join(season_dir, frozen)):
+        frozen += "_"
+    tmp_dir = os.path.join(season_dir, f".tmp-{os.getpid()}")
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    entries = []
+    try:
+        for key in sorted(keys.unique()):
+            order_rows = orders[(keys == key).to_numpy()]
+            line_rows = line_items[line_keys == key]
+            part_dir = os.path.join(tmp_dir, f"order_date={key}")
+            os.makedirs(part_dir, exist_ok=True)
+            _write_frame(order_rows, os.path.join(part_dir, "orders.parquet"))
+            _write_frame(line_rows, os.path.join(part_dir, "line_items.parquet"))
+            rel_dir = os.path.join(f"season={season}", frozen, f"order_date={key}")
+
+            order_min, order_max = _date_stats(order_rows.get(order_date_col))
+            pickup_min, pickup_max = _date_stats(order_rows.get(pickup_col))
+            entries.append({
+                "season": season,
+                "path": rel_dir,
+                "orders": int(len(order_rows)),
+                "line_items": int(len(line_rows)),
+                "order_date_min": order_min,
+                "order_date_max": order_max,
+                "pickup_date_min": pickup_min,
+                "pickup_date_max": pickup_max,
+            })
+        # An empty season still gets a directory to switch to
+        os.makedirs(tmp_dir, exist_ok=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Readers only follow the manifest: the new partitions are live once it is replaced
+    os.replace(tmp_dir, os.path.join(season_dir, frozen))
+    manifest = [e for e in read_manifest(archive_dir) if e["season"] != season] + entries
+    _write_manifest(manifest, archive_dir)
+    # The previous freeze (or the older unversioned layout) is no longer referenced
+    for name in os.listdir(season_dir):
+        path = os.path.join(season_dir, name)
+        if name == frozen or name.startswith(".tmp-"):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return entries
+
+
+def _write_manifest(entries, archive_dir):
+    os.makedirs(archive_dir, exist_ok=True)
+    tmp_path = os.path.join(archive_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(sorted(entries, key=lambda e: (e["season"], e["path"])), f, indent=2)
+    os.replace(tmp_path, os.path.join(archive_dir, MANIFEST_NAME))
+
+
+# ============================================================================
+# READING
+# ============================================================================
+
+def read_manifest(archive_dir=None):
+    """Return the manifest entries, or [] if nothing has been archived."""
+    path = os.path.join(archive_dir or ARCHIVE_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def seasons(archive_dir=None):
+    """Archived season labels, oldest first."""
+    return sorted({e["season"] for e in read_manifest(archive_dir)})
+
+
+def _overlaps(low, high, start, end):
+    """True if [low, high] may intersect [start, end]; missing stats never prune."""
+    if low is None or high is None:
+        return True
+    if start is not None and high < start:
+        return False
+    if end is not None and low > end:
+        return False
+    return True
+
+
+def prune_partitions(filters, season=None, archive_dir=None):
+    """
+    Select the partitions whose min/max statistics can satisfy the filters.
+
+    Only the date filters prune; order type and product filters are applied
+    to the rows that are read.
+
+    Args:
+        filters: Dashboard filter dict (date_start, date_end, pickup_dates, ...)
+        season: Optional season label to restrict to
+
+    Returns:
+        List of manifest entries
+    """
+    start = pd.Timestamp(filters['date_start']).date().isoformat() if filters.get('date_start') else None
+    end = pd.Timestamp(filters['date_end']).date().isoformat() if filters.get('date_end') else None
+    pickup_days = []
+    for value in (filters.get('pickup_dates') or '').split(','):
+        if not value.strip():
+            continue
+        try:
+            pickup_days.append(pd.Timestamp(value.strip()).date().isoformat())
+        except ValueError:
+            continue
+
+    selected = []
+    for entry in read_manifest(archive_dir):
+        if season is not None and entry["season"] != str(season):
+            continue
+        if not _overlaps(entry["order_date_min"], entry["order_date_max"], start, end):
+            continue
+        if pickup_days and not any(
+            _overlaps(entry["pickup_date_min"], entry["pickup_date_max"], day, day) for day in pickup_days
+        ):
+            continue
+        selected.append(entry)
+    return selected
+
+
+def _read_frame(path):
+    import pyarrow.parquet as pq
+    df = pq.read_table(path).to_pandas()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def load_partitions(entries, archive_dir=None):
+    """
+    Build an OrderStore from archived partitions.
+
+    Stores are cached by the exact partition set and manifest version, so
+    repeated YoY queries over the same window do not touch the files again
+    while a re-frozen season is picked up.
+    """
+    archive_dir = archive_dir or ARCHIVE_DIR
+    manifest_path = os.path.join(archive_dir, MANIFEST_NAME)
+    manifest_mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+    key = (archive_dir, manifest_mtime, tuple(e["path"] for e in entries))
+    store = _season_cache.get(key)
+    if store is not None:
+        return store
+
+    orders = [_read_frame(os.path.join(archive_dir, e["path"], "orders.parquet")) for e in entries]
+    line_items = [_read_frame(os.path.join(archive_dir, e["path"], "line_items.parquet")) for e in entries]
+    orders = pd.concat(orders, ignore_index=True) if orders else pd.DataFrame({'OrderID': []})
+    line_items = pd.concat(line_items, ignore_index=True) if line_items else pd.DataFrame({'OrderID': []})
+    store = api_utils.build_order_store(orders, line_items, copy=False)
+    with _cache_lock:
+        while len(_season_cache) >= SEASON_CACHE_SIZE:
+            _season_cache.pop(next(iter(_season_cache)))
+        _season_cache[key] = store
+    return store
+
+
+def query_season(season, filters, columns=None, archive_dir=None):
+    """
+    filter_data over one archived season, reading only the pruned partitions.
+
+    Returns:
+        DataFrame with one row per matching line item
+    """
+    entries = prune_partitions(filters, season, archive_dir)
+    return api_utils.filter_data(load_partitions(entries, archive_dir), filters, columns)
+
+
+# ============================================================================
+# YEAR-OVER-YEAR
+# ============================================================================
+
+def live_season(store):
+    """Season label of a live snapshot: the most common order year."""
+    col = store.role('order_date')
+    if col not in store.orders.columns:
+        return None
+    years = store.orders[col].dropna().dt.year
+    return str(int(years.mode().iloc[0])) if len(years) else None
+
+
+def shift_filters(filters, years):
+    """Move the date filters by a whole number of years (same calendar window)."""
+    if not years:
+        return dict(filters)
+    offset = pd.DateOffset(years=years)
+    shifted = dict(filters)
+    for key in ('date_start', 'date_end'):
+        if filters.get(key):
+            shifted[key] = (pd.Timestamp(filters[key]) + offset).date().isoformat()
+    if filters.get('pickup_dates'):
+        days = []
+        for value in filters['pickup_dates'].split(','):
+            if not value.strip():
+                continue
+            try:
+                days.append((pd.Timestamp(value.strip()) + offset).date().isoformat())
+            except ValueError:
+                continue
+        shifted['pickup_dates'] = ','.join(days)
+    return shifted
+
+
+def season_summary(store, filters):
+    """Orders, line items and revenue matching the filters in one store."""
+    order_mask, line_mask = api_utils.filter_masks(store, filters)
+    revenue_col = store.role('revenue')
+    total_col = store.role('order_total')
+    if revenue_col in store.line_items.columns:
+        revenue = pd.to_numeric(store.line_items[revenue_col], errors='coerce').to_numpy()[line_mask]
+    elif total_col in store.orders.columns:
+        revenue = pd.to_numeric(store.orders[total_col], errors='coerce').to_numpy()[order_mask]
+    else:
+        revenue = np.zeros(0)
+    return {
+        "total_orders": int(order_mask.sum()),
+        "total_items": int(line_mask.sum()),
+        "revenue": round(float(np.nansum(revenue)), 2),
+    }
+
+
+def yoy_summary(live_store, filters, archive_dir=None):
+    """
+    Summaries for the live season and every archived season.
+
+    The filters are interpreted in the live season's calendar and shifted
+    to each archived season, so "Nov 24-27" compares the same window every
+    year. A season that is both live and archived is reported once, from
+    the live snapshot. Without pyarrow only the live season is reported.
+
+    Returns:
+        List of dicts (season, source, partitions_read, total_orders,
+        total_items, revenue), oldest season first
+    """
+    current = live_season(live_store) if live_store is not None else None
+    rows = []
+    for season in seasons(archive_dir) if PARQUET_AVAILABLE else []:
+        if season == current:
+            continue
+        years_back = int(season) - int(current) if current and season.isdigit() else 0
+        season_filters = shift_filters(filters, years_back)
+        entries = prune_partitions(season_filters, season, archive_dir)
+        if entries:
+            summary = season_summary(load_partitions(entries, archive_dir), season_filters)
+        else:
+            summary = {"total_orders": 0, "total_items": 0, "revenue": 0.0}
+        rows.append({"season": season, "source": "archive", "partitions_read": len(entries), **summary})
+    if live_store is not None:
+        rows.append({"season": current, "source": "live", "partitions_read": 0,
+                     **season_summary(live_store, filters)})
+    return rows
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("freeze", "list"):
+        print(__doc__)
+        sys.exit(1)
+    if sys.argv[1] == "list":
+        for entry in read_manifest():
+            print(f"{entry['path']:45s} {entry['orders']:>7,} orders {entry['line_items']:>8,} items")
+        return
+    season = sys.argv[2]
+    spreadsheet_id = sys.argv[3] if len(sys.argv) > 3 else api_utils.SPREADSHEET_ID
+    from sheets_scheduler import PRIORITY_BATCH
+    customer_orders_df, bakery_products_df = api_utils.fetch_sheets(PRIORITY_BATCH, spreadsheet_id)
+    store = api_utils.build_order_store(customer_orders_df, bakery_products_df, copy=False)
+    entries = freeze_season(store, season)
+    print(f"Archived season {season}: {len(entries)} partitions, "
+          f"{sum(e['orders'] for e in entries):,} orders, {sum(e['line_items'] for e in entries):,} line items")
+
+
+if __name__ == "__main__":
+    main()
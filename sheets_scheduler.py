@@ -0,0 +1,228 @@
+"""
+Quota-aware scheduler for Google Sheets API calls
+Every Sheets request goes through a shared token bucket sized to the API
+quota, so bursts wait for budget instead of failing with 429 errors.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+# Google Sheets allows 60 read requests per minute per user
+SHEETS_QUOTA_PER_MINUTE = 60
+
+# Priority classes - lower values are served first
+PRIORITY_INTERACTIVE = 0  # A dashboard request is waiting on the result
+PRIORITY_BACKGROUND = 1   # Pushed or scheduled cache refreshes
+PRIORITY_BATCH = 2        # Reports and exports run from the command line
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+    PRIORITY_BATCH: "batch",
+}
+
+# Tokens only interactive calls may use, so batch work cannot drain the bucket
+INTERACTIVE_RESERVE = 10
+
+# Retry settings for 429 / RESOURCE_EXHAUSTED responses
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0   # seconds
+BACKOFF_MAX = 32.0   # seconds
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(e):
+    """Return True if an exception is a Sheets quota / rate limit error."""
+    response = getattr(e, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    error_str = str(e)
+    return '429' in error_str or 'RESOURCE_EXHAUSTED' in error_str or 'quota' in error_str.lower()
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate tokens per second."""
+
+    def __init__(self, capacity, rate):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now=None):
+        """Add the tokens earned since the last refill."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, needed=1.0):
+        """Seconds until the bucket holds the needed number of tokens."""
+        self.refill()
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def drain(self):
+        """Empty the bucket, e.g. after the API reported the quota exhausted."""
+        self.refill()
+        self.tokens = 0.0
+
+
+class SheetsScheduler:
+    """
+    Shared gate for Sheets API calls.
+
+    Callers queue by priority and take one token per call. When the API still
+    answers 429, the call is retried with jittered exponential backoff and the
+    bucket is drained so queued callers back off too.
+    """
+
+    def __init__(self, per_minute=SHEETS_QUOTA_PER_MINUTE, interactive_reserve=INTERACTIVE_RESERVE,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX):
+        self.bucket = TokenBucket(per_minute, per_minute / 60.0)
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._stats = {
+            "calls": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "failed": 0,
+            "wait_seconds": 0.0,
+        }
+
+    def _needed(self, priority):
+        """Tokens that must be in the bucket before a call of this priority may run."""
+        if priority == PRIORITY_INTERACTIVE:
+            return 1.0
+        return 1.0 + self.interactive_reserve
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """Block until this caller is first in line and a token is available."""
+        started = time.monotonic()
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            try:
+                while True:
+                    if self._waiting[0] == entry:
+                        wait = self.bucket.wait_time(self._needed(priority))
+                        if wait == 0.0:
+                            self.bucket.tokens -= 1.0
+                            break
+                    else:
+                        wait = None
+                    self._cond.wait(timeout=wait)
+            finally:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+    def backoff_delay(self, attempt):
+        """Full-jitter exponential backoff delay for a retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Run one Sheets API call within the shared budget.
+
+        Args:
+            fn: Callable that performs exactly one API request
+            priority: One of the PRIORITY_* classes
+
+        Returns:
+            The callable's result
+
+        Raises:
+            The last rate limit error once retries are exhausted, or any
+            other error from the call immediately
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(priority)
+            with self._cond:
+                self._stats["calls"] += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                with self._cond:
+                    self._stats["rate_limited"] += 1
+                    self.bucket.drain()
+                    if attempt == self.max_retries:
+                        self._stats["failed"] += 1
+                        raise
+                    self._stats["retries"] += 1
+                delay = self.backoff_delay(attempt)
+                logger.warning(
+                    f"Sheets rate limit hit ({PRIORITY_NAMES.get(priority, priority)}), "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    async def call_async(self, fn, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """
+        Awaitable counterpart of call() for coroutine functions.
+
+        Waiting for a token happens on the loop's default executor, so the
+        same bucket and priority queue govern sync and async callers.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            await loop.run_in_executor(None, self.acquire, priority)
+            with self._cond:
+                self._stats["calls"] += 1
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                with self._cond:
+                    self._stats["rate_limited"] += 1
+                    self.bucket.drain()
+                    if attempt == self.max_retries:
+                        self._stats["failed"] += 1
+                        raise
+                    self._stats["retries"] += 1
+                delay = self.backoff_delay(attempt)
+                logger.warning(
+                    f"Sheets rate limit hit ({PRIORITY_NAMES.get(priority, priority)}), "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    def retry_after(self):
+        """Seconds a client should wait before an interactive call can run."""
+        with self._cond:
+            return self.bucket.wait_time(1.0 + len(self._waiting))
+
+    def metrics(self):
+        """Remaining budget, queue depth and call counters."""
+        with self._cond:
+            self.bucket.refill()
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiting:
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            return {
+                "tokens_available": round(self.bucket.tokens, 2),
+                "capacity": self.bucket.capacity,
+                "refill_per_second": self.bucket.rate,
+                "interactive_reserve": self.interactive_reserve,
+                "waiting": waiting,
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self._stats.items()},
+            }
+
+
+# Shared by api_utils and sales_report so both draw on one quota
+scheduler = SheetsScheduler()
@@ -0,0 +1,391 @@
+"""
+Slow-request capture and offline replay
+With SLOW_REQUEST_MS set, every API request runs under the request
+profiler's stage timer, and requests slower than the threshold are written
+to a rotating JSON-lines log under SLOW_REQUEST_DIR: endpoint, canonical
+filters, snapshot version, stage timings and response size. The snapshot
+the request ran against is saved once next to the log (as Parquet, named by
+its content hash), so the request can be reproduced after the data has
+moved on.
+
+Capture hooks into Flask's request cycle, so under asgi.py it covers only
+the routes passed through to Flask: the natively served /api/summary,
+/api/data and /api/product-by-day are never recorded in ASGI mode.
+
+Usage:
+    python slow_requests.py list
+    python slow_requests.py replay [--last N] [--endpoint NAME] [--repeat N] [--profile sample|cprofile]
+
+Replay rebuilds each recorded snapshot and re-runs the request's data work
+(filter_data, the report functions, the indexes) offline, printing the
+recorded and replayed timings side by side. With --profile each replay is
+also profiled into PROFILE_DIR, as a live profiled request would be.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import api_utils
+import request_profiler
+
+SLOW_REQUEST_MS_ENV = "SLOW_REQUEST_MS"
+SLOW_REQUEST_DIR = os.environ.get(
+    "SLOW_REQUEST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_requests")
+)
+LOG_NAME = "slow_requests.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+MAX_SNAPSHOTS = 10
+FILTER_KEYS = ('date_start', 'date_end', 'order_type', 'product', 'pickup_dates')
+# Non-filter query parameters that change the work a request does
+REPLAY_ARGS = ('columns', 'format', 'sort', 'dir', 'page', 'page_size', 'axis', 'by', 'q', 'limit', 'day', 'include')
+# Endpoints never recorded (long-lived streams, health checks, diagnostics)
+SKIP_ENDPOINTS = {'events', 'health', 'index', 'test', 'static', 'profile_file', 'profile_list', 'admission_metrics', 'cache_stats',
+                  'snapshot_sync_status'}
+
+logger = logging.getLogger(__name__)
+
+_record_logger = None
+_snapshot_ids = {}  # id(orders table) -> snapshot id
+_written_snapshots = set()
+_snapshot_lock = threading.Lock()
+
+
+def canonical_filters(args):
+    """Dashboard filters with blanks dropped and comma lists sorted and de-duplicated."""
+    filters = {}
+    for key in FILTER_KEYS:
+        value = (args.get(key) or '').strip()
+        if not value:
+            continue
+        if key in ('order_type', 'product', 'pickup_dates'):
+            value = ','.join(sorted({v.strip() for v in value.split(',') if v.strip()}))
+        filters[key] = value
+    return filters
+
+
+def snapshot_id(store):
+    """Content hash of a snapshot, stable across processes and restarts."""
+    key = id(store.orders)
+    cached = _snapshot_ids.get(key)
+    if cached is not None and cached[0] is store.orders:
+        return cached[1]
+    digest = hashlib.sha256(store.order_hashes.to_numpy().tobytes())
+    digest.update(json.dumps(list(store.columns)).encode('utf-8'))
+    value = digest.hexdigest()[:16]
+    _snapshot_ids.clear()
+    _snapshot_ids[key] = (store.orders, value)
+    return value
+
+
+def _snapshot_dir(sid):
+    return os.path.join(SLOW_REQUEST_DIR, "snapshots", sid)
+
+
+def _write_snapshot(store, sid):
+    """Write a snapshot's tables as Parquet and prune the oldest snapshots."""
+    import pyarrow.parquet as pq
+    import arrow_ipc
+    target = _snapshot_dir(sid)
+    tmp_dir = target + ".tmp"
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        line_items = store.line_items.copy()
+        line_items['OrderID'] = line_items['OrderID'].astype(str)
+        pq.write_table(arrow_ipc.frame_to_table(store.orders.reset_index()), os.path.join(tmp_dir, "orders.parquet"))
+        pq.write_table(arrow_ipc.frame_to_table(line_items), os.path.join(tmp_dir, "line_items.parquet"))
+        with open(os.path.join(tmp_dir, "snapshot.json"), "w") as f:
+            json.dump({"id": sid, "version": store.version, "columns": list(store.columns),
+                       "orders": len(store.orders), "line_items": len(store.line_items)}, f, indent=2)
+        os.replace(tmp_dir, target)
+    except Exception as e:
+        logger.warning(f"Could not save snapshot {sid} for slow-request replay: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        with _snapshot_lock:
+            _written_snapshots.discard(sid)
+        return
+
+    root = os.path.dirname(target)
+    kept = sorted(
+        (os.path.join(root, name) for name in os.listdir(root) if not name.endswith(".tmp")),
+        key=os.path.getmtime, reverse=True
+    )
+    for path in kept[MAX_SNAPSHOTS:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def save_snapshot(store):
+    """
+    Make sure a snapshot is saved for replay, writing it in the background once.
+
+    Returns:
+        The snapshot id
+    """
+    sid = snapshot_id(store)
+    with _snapshot_lock:
+        if sid in _written_snapshots:
+            return sid
+        _written_snapshots.add(sid)
+    if os.path.isdir(_snapshot_dir(sid)):
+        return sid
+    threading.Thread(target=_write_snapshot, args=(store, sid), name="slow-request-snapshot", daemon=True).start()
+    return sid
+
+
+def _get_record_logger():
+    global _record_logger
+    if _record_logger is None:
+        os.makedirs(SLOW_REQUEST_DIR, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(SLOW_REQUEST_DIR, LOG_NAME), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        record_logger = logging.getLogger("slow_requests.records")
+        record_logger.setLevel(logging.INFO)
+        record_logger.propagate = False
+        record_logger.addHandler(handler)
+        _record_logger = record_logger
+    return _record_logger
+
+
+def record(endpoint, path, args, elapsed_ms, stages_ms, status, response_bytes):
+    """Append one slow request to the log, together with its snapshot."""
+    store = api_utils.current_snapshot()
+    entry = {
+        "ts": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "endpoint": endpoint,
+        "path": path,
+        "filters": canonical_filters(args),
+        "args": {key: args[key] for key in REPLAY_ARGS if args.get(key)},
+        "version": store.version if store is not None else None,
+        "snapshot": save_snapshot(store) if store is not None else None,
+        "elapsed_ms": round(elapsed_ms, 3),
+        "stages_ms": stages_ms,
+        "status": status,
+        "response_bytes": response_bytes,
+        "pid": os.getpid(),
+    }
+    _get_record_logger().info(json.dumps(entry))
+    return entry
+
+
+def install(app):
+    """
+    Register the slow-request hooks on a Flask app.
+
+    Nothing is registered unless SLOW_REQUEST_MS is set. Install after the
+    request profiler so a profiled request's stage timer is shared.
+    """
+    threshold = os.environ.get(SLOW_REQUEST_MS_ENV)
+    if not threshold:
+        return False
+    threshold_ms = float(threshold)
+
+    from flask import g, request
+
+    @app.before_request
+    def _start_slow_request_timer():
+        g.slow_request_started = time.perf_counter()
+        if request_profiler.current_stage_timer() is None:
+            request_profiler.start_stage_timer()
+            g.slow_request_owns_timer = True
+        return None
+
+    @app.after_request
+    def _record_slow_request(response):
+        started = g.pop('slow_request_started', None)
+        if g.pop('slow_request_owns_timer', False):
+            timer = request_profiler.stop_stage_timer()
+        else:
+            timer = request_profiler.current_stage_timer()
+        if started is None or request.endpoint in SKIP_ENDPOINTS or response.is_streamed:
+            return response
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= threshold_ms:
+            try:
+                record(request.endpoint or 'unknown', request.path, request.args, elapsed_ms,
+                       timer.as_dict() if timer else {}, response.status_code,
+                       response.calculate_content_length())
+            except Exception as e:
+                logger.warning(f"Could not record slow request: {e}")
+        return response
+
+    @app.teardown_request
+    def _drop_slow_request_timer(exc):
+        # after_request is skipped when a view raises; never leak the timer
+        if g.pop('slow_request_owns_timer', False):
+            request_profiler.stop_stage_timer()
+
+    return True
+
+
+# ============================================================================
+# OFFLINE REPLAY
+# ============================================================================
+
+def read_records(log_dir=None):
+    """All recorded slow requests, oldest first, across rotated log files."""
+    log_dir = log_dir or SLOW_REQUEST_DIR
+    path = os.path.join(log_dir, LOG_NAME)
+    paths = [f"{path}.{n}" for n in range(LOG_BACKUPS, 0, -1)] + [path]
+    records = []
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def load_snapshot(sid, log_dir=None):
+    """Rebuild a saved snapshot as an OrderStore (None if it was pruned)."""
+    import pyarrow.parquet as pq
+    directory = os.path.join(log_dir or SLOW_REQUEST_DIR, "snapshots", sid)
+    if not os.path.isdir(directory):
+        return None
+    frames = []
+    for name in ("orders", "line_items"):
+        df = pq.read_table(os.path.join(directory, f"{name}.parquet")).to_pandas()
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+        frames.append(df)
+    with open(os.path.join(directory, "snapshot.json")) as f:
+        version = json.load(f)["version"]
+    return api_utils.build_order_store(*frames, copy=False).restamp(time.time(), version)
+
+
+def _full_filters(filters):
+    return {key: filters.get(key, '') for key in FILTER_KEYS}
+
+
+def replay_work(store, entry):
+    """
+    Re-run the data work behind a recorded request.
+
+    Returns:
+        Size in bytes of the serialized result
+    """
+    endpoint, args = entry["endpoint"], entry.get("args", {})
+    filters = _full_filters(entry.get("filters", {}))
+    columns = [c.strip() for c in args.get('columns', '').split(',') if c.strip()] or None
+
+    if endpoint == 'summary':
+        return len(json.dumps(api_utils.order_summary(store, filters)))
+    if endpoint == 'product_by_day':
+        result = api_utils.product_by_day(store, filters)
+    elif endpoint == 'table':
+        import sort_index
+        result, _, _ = sort_index.table_page(
+            store, filters, args.get('sort'), args.get('dir') == 'desc',
+            int(args.get('page', 1)), int(args.get('page_size', sort_index.DEFAULT_PAGE_SIZE)), columns
+        )
+    elif endpoint in ('totals', 'trend'):
+        import day_index
+        axis = day_index.get_day_index(store).axis(args.get('axis', 'order'))
+        start, end = filters['date_start'] or None, filters['date_end'] or None
+        if endpoint == 'totals':
+            return len(json.dumps(axis.totals(start, end, args.get('by'))))
+        result = axis.trend(start, end, args.get('by'))
+    elif endpoint == 'lookup':
+        import customer_index
+        index = customer_index.get_index(store)
+        searched, positions, _ = index.lookup(args.get('q', ''), int(args.get('limit', customer_index.DEFAULT_LIMIT)))
+        return len(json.dumps(index.orders_with_lines(searched, positions)))
+    elif endpoint in ('export_pdf', 'export_xls'):
+        import exports
+        render = exports.orders_pdf if endpoint == 'export_pdf' else exports.orders_xlsx
+        return len(render(store, filters))
+    else:
+        # /api/data and anything else that returns filtered line items
+        result = api_utils.filter_data(store, filters, columns)
+    with request_profiler.stage('serialize'):
+        return len(result.to_json(orient='records', date_format='iso'))
+
+
+def replay(entries, repeat=3, profile=None, log_dir=None):
+    """
+    Replay recorded requests and print recorded vs replayed timings.
+
+    Args:
+        entries: Records from read_records()
+        repeat: Runs per request; the first (cold) run is reported separately
+        profile: None, 'sample' or 'cprofile' to profile one extra run
+    """
+    stores = {}
+    print(f"{'endpoint':16s} {'recorded ms':>12s} {'cold ms':>9s} {'warm ms':>9s}  stages (warm)")
+    for entry in entries:
+        sid = entry.get("snapshot")
+        if sid not in stores:
+            stores[sid] = load_snapshot(sid, log_dir) if sid else None
+        store = stores[sid]
+        if store is None:
+            print(f"{entry['endpoint']:16s} snapshot {sid} no longer available, skipped")
+            continue
+
+        timings, stages = [], {}
+        for _ in range(max(repeat, 1)):
+            request_profiler.start_stage_timer()
+            started = time.perf_counter()
+            try:
+                replay_work(store, entry)
+            finally:
+                timings.append((time.perf_counter() - started) * 1000)
+                timer = request_profiler.stop_stage_timer()
+                stages = timer.as_dict() if timer else {}
+
+        profile_id = None
+        if profile:
+            # One extra run under the profiler, kept out of the timings
+            job = request_profiler.RequestProfile(f"replay_{entry['endpoint']}", mode=profile)
+            try:
+                replay_work(store, entry)
+            finally:
+                profile_id = job.finish()
+
+        warm = sorted(timings[1:])[len(timings[1:]) // 2] if len(timings) > 1 else timings[0]
+        stage_text = ' '.join(f"{k}={v:.1f}" for k, v in stages.items())
+        print(f"{entry['endpoint']:16s} {entry['elapsed_ms']:>12.1f} {timings[0]:>9.1f} {warm:>9.1f}  {stage_text}")
+        print(f"{'':16s} filters={entry.get('filters')} args={entry.get('args')}"
+              + (f" profile={profile_id}" if profile_id else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay recorded slow API requests")
+    parser.add_argument("command", choices=("list", "replay"))
+    parser.add_argument("--last", type=int, default=20, help="Only the N most recent records")
+    parser.add_argument("--endpoint", help="Only records for this endpoint (e.g. data, product_by_day)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per request (first run is cold)")
+    parser.add_argument("--profile", choices=("sample", "cprofile"), help="Profile one extra run of each request")
+    parser.add_argument("--dir", default=None, help=f"Log directory (default {SLOW_REQUEST_DIR})")
+    options = parser.parse_args()
+
+    entries = read_records(options.dir)
+    if options.endpoint:
+        entries = [e for e in entries if e["endpoint"] == options.endpoint]
+    entries = entries[-options.last:]
+    if not entries:
+        print("No slow requests recorded.")
+        return
+
+    if options.command == "list":
+        for e in entries:
+            stages = ' '.join(f"{k}={v:.0f}" for k, v in e.get("stages_ms", {}).items())
+            print(f"{e['ts']} {e['endpoint']:16s} {e['elapsed_ms']:>9.1f}ms v{e['version']} "
+                  f"{e.get('snapshot')} {e.get('filters')} {stages}")
+        return
+    replay(entries, options.repeat, options.profile, options.dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
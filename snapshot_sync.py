@@ -0,0 +1,428 @@
+"""
+Snapshot distribution between API nodes
+With SNAPSHOT_STORE set, the nodes of a deployment share one snapshot
+through a common object store instead of each polling Google Sheets:
+
+    SNAPSHOT_STORE=/mnt/shared/snapshots       a shared directory
+    SNAPSHOT_STORE=s3://bucket/prefix          S3 or an S3-compatible server
+                                               (S3_ENDPOINT_URL, needs boto3)
+
+One node holds a renewable lease (leader.json) and is the only one that
+reads the sheets, at most once per CACHE_DURATION unless a refresh was
+requested. It writes each new version as zstd-compressed Parquet and then
+replaces the latest.json pointer. Every node polls the pointer every
+SNAPSHOT_POLL_SECONDS, downloads only versions it does not have and swaps
+them in with the leader's version number, so all nodes agree on the
+version clients see. An /api/invalidate on any node leaves a refresh
+request for the leader.
+
+    latest.json                                version, fetch time, columns
+    leader.json                                lease owner and expiry
+    refresh-request.json                       last invalidation
+    snapshots/<version>/orders.parquet
+    snapshots/<version>/line_items.parquet
+
+The lease is best effort: if two nodes briefly both hold it, the pointer's
+fetch time still keeps the second one from reading the sheets again.
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import pandas as pd
+
+import api_utils
+
+SNAPSHOT_STORE_ENV = "SNAPSHOT_STORE"
+POLL_SECONDS = float(os.environ.get("SNAPSHOT_POLL_SECONDS", 5))
+LEASE_SECONDS = float(os.environ.get("SNAPSHOT_LEASE_SECONDS", 60))
+# How long a node with no data waits for the first published snapshot
+FIRST_SNAPSHOT_WAIT = float(os.environ.get("SNAPSHOT_WAIT_SECONDS", 30))
+KEEP_VERSIONS = int(os.environ.get("SNAPSHOT_KEEP", 5))
+POINTER = "latest.json"
+LEASE = "leader.json"
+REFRESH_REQUEST = "refresh-request.json"
+TABLES = ("orders", "line_items")
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+_poller_pid = None
+_sync_lock = threading.Lock()
+_state = {"role": None, "pulls": 0, "fetches": 0, "last_poll": None, "last_error": None}
+
+
+class DirectoryBackend:
+    """Objects as files under a shared directory; writes are atomic renames."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def get(self, name):
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, name, body):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def put_new(self, name, body):
+        """Create an object only if it does not exist; return True if created."""
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        return True
+
+    def list(self, prefix):
+        directory = self._path(prefix)
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def delete_prefix(self, prefix):
+        import shutil
+        shutil.rmtree(self._path(prefix), ignore_errors=True)
+
+    def describe(self):
+        return self.root
+
+
+class S3Backend:
+    """Objects in an S3 bucket (or MinIO and other S3-compatible servers)."""
+
+    def __init__(self, bucket, prefix='', endpoint_url=None):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self._missing = self.client.exceptions.NoSuchKey
+
+    def _key(self, name):
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def get(self, name):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._key(name))['Body'].read()
+        except self._missing:
+            return None
+
+    def put(self, name, body):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=body)
+
+    def put_new(self, name, body):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(name), Body=body, IfNoneMatch='*')
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                return False
+            raise
+
+    def list(self, prefix):
+        base = self._key(prefix).rstrip('/') + '/'
+        names = set()
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=base, Delimiter='/'):
+            names.update(p['Prefix'][len(base):].rstrip('/') for p in page.get('CommonPrefixes', []))
+        return sorted(names)
+
+    def delete_prefix(self, prefix):
+        base = self._key(prefix).rstrip('/') + '/'
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=base):
+            keys = [{'Key': o['Key']} for o in page.get('Contents', [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys})
+
+    def describe(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+
+def make_backend(location):
+    """Backend for a SNAPSHOT_STORE value (directory path or s3://bucket/prefix)."""
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        return S3Backend(bucket, prefix, os.environ.get('S3_ENDPOINT_URL'))
+    if location.startswith('file://'):
+        location = location[len('file://'):]
+    return DirectoryBackend(location)
+
+
+def enabled():
+    return bool(os.environ.get(SNAPSHOT_STORE_ENV))
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = make_backend(os.environ[SNAPSHOT_STORE_ENV])
+    return _backend
+
+
+def node_id():
+    """This process's identity in the lease (per process, so forked workers differ)."""
+    return os.environ.get('SNAPSHOT_NODE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _read_json(name):
+    body = get_backend().get(name)
+    return json.loads(body) if body else None
+
+
+def _put_json(name, payload):
+    get_backend().put(name, json.dumps(payload, indent=1).encode('utf-8'))
+
+
+# ============================================================================
+# LEADER ELECTION
+# ============================================================================
+
+def acquire_lease(now=None):
+    """
+    Take or renew the refresher lease.
+
+    Returns:
+        True if this node holds the lease
+    """
+    now = time.time() if now is None else now
+    me = node_id()
+    lease = {"node": me, "expires": now + LEASE_SECONDS}
+    held = _read_json(LEASE)
+    if held is None:
+        if not get_backend().put_new(LEASE, json.dumps(lease).encode('utf-8')):
+            return False
+    elif held.get("node") == me or held.get("expires", 0) < now:
+        _put_json(LEASE, lease)
+    else:
+        return False
+    # Last writer wins when two nodes take over an expired lease at once
+    held = _read_json(LEASE)
+    return held is not None and held.get("node") == me
+
+
+def request_refresh():
+    """Ask the leader to read the sheets at its next poll."""
+    _put_json(REFRESH_REQUEST, {"requested_at": time.time(), "node": node_id()})
+
+
+# ============================================================================
+# SNAPSHOT FILES
+# ============================================================================
+
+def _table_bytes(df):
+    import pyarrow.parquet as pq
+    import arrow_ipc
+    buffer = io.BytesIO()
+    pq.write_table(arrow_ipc.frame_to_table(df), buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+def _read_table(body):
+    import pyarrow.parquet as pq
+    df = pq.read_table(io.BytesIO(body)).to_pandas()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def write_snapshot(store, version, fetched_at):
+    """Upload a snapshot's tables, then point latest.json at them."""
+    backend = get_backend()
+    line_items = store.line_items.copy()
+    line_items['OrderID'] = line_items['OrderID'].astype(str)
+    frames = {"orders": store.orders.reset_index(), "line_items": line_items}
+    sizes = {}
+    for name in TABLES:
+        body = _table_bytes(frames[name])
+        backend.put(f"snapshots/{version}/{name}.parquet", body)
+        sizes[name] = len(body)
+    pointer = {
+        "version": version,
+        "fetched_at": fetched_at,
+        "published_at": time.time(),
+        "node": node_id(),
+        "columns": list(store.columns),
+        "orders": int(len(store.orders)),
+        "line_items": int(len(store.line_items)),
+        "bytes": sizes,
+    }
+    _put_json(POINTER, pointer)
+    _prune(version)
+    return pointer
+
+
+def _prune(latest_version):
+    backend = get_backend()
+    versions = sorted(int(v) for v in backend.list("snapshots") if v.isdigit())
+    for version in versions:
+        if version <= latest_version - KEEP_VERSIONS:
+            backend.delete_prefix(f"snapshots/{version}")
+
+
+def read_snapshot(pointer):
+    """Download the snapshot a pointer names and rebuild it as an OrderStore."""
+    backend = get_backend()
+    frames = []
+    for name in TABLES:
+        body = backend.get(f"snapshots/{pointer['version']}/{name}.parquet")
+        if body is None:
+            raise Exception(f"Snapshot {pointer['version']} is missing {name}.parquet")
+        frames.append(_read_table(body))
+    orders, line_items = frames
+    orders = orders[[c for c in pointer['columns'] if c in orders.columns]]
+    return api_utils.build_order_store(orders, line_items, copy=False)
+
+
+# ============================================================================
+# SYNC
+# ============================================================================
+
+def _fetch_and_publish(priority, pointer):
+    """Leader: read the sheets and publish a new version if anything changed."""
+    import data_sources
+    fetched_at = time.time()
+    customer_orders_df, bakery_products_df = data_sources.fetch_all(priority)
+    store = api_utils.build_order_store(customer_orders_df, bakery_products_df, copy=False)
+    _state["fetches"] += 1
+    return share(store, fetched_at, pointer)
+
+
+def share(store, fetched_at=None, pointer=None):
+    """
+    Publish a store this node built, as the next cluster-wide version.
+
+    Returns:
+        The snapshot now being served
+    """
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    pointer = _read_json(POINTER) if pointer is None else pointer
+    current = api_utils.current_snapshot()
+    if pointer is not None and current is not None and current.version == pointer['version'] \
+            and not api_utils.changed_orders(current, store):
+        # Nothing changed: record the fetch so no node reads the sheets again yet
+        _put_json(POINTER, {**pointer, "fetched_at": fetched_at})
+        return api_utils.publish_snapshot(current, fetched_at)
+    version = max(pointer['version'] if pointer else 0, current.version if current else 0) + 1
+    write_snapshot(store, version, fetched_at)
+    return api_utils.publish_snapshot(store, fetched_at, version=version)
+
+
+def _pull(pointer):
+    """Follower: swap in the pointer's snapshot under its version."""
+    store = read_snapshot(pointer)
+    _state["pulls"] += 1
+    logger.info(f"Pulled snapshot version {pointer['version']} from {get_backend().describe()}")
+    return api_utils.publish_snapshot(store, time.time(), version=pointer['version'])
+
+
+def sync(priority=None, force=False):
+    """
+    Bring this node up to the cluster's latest snapshot.
+
+    The lease holder reads the sheets when the shared snapshot is older than
+    CACHE_DURATION or a refresh was requested; every other node downloads
+    new versions. Called by load_data and the background poller.
+
+    Returns:
+        The snapshot now being served
+    """
+    with _sync_lock:
+        _state["last_poll"] = time.time()
+        pointer = _read_json(POINTER)
+        current = api_utils.current_snapshot()
+        leader = acquire_lease()
+        _state["role"] = "leader" if leader else "follower"
+        if force and not leader:
+            request_refresh()
+        if leader:
+            requested = _read_json(REFRESH_REQUEST)
+            due = (
+                force or pointer is None
+                or time.time() - pointer['fetched_at'] >= api_utils.CACHE_DURATION
+                or (requested is not None and requested['requested_at'] > pointer['fetched_at'])
+            )
+            if due:
+                from sheets_scheduler import PRIORITY_BACKGROUND
+                return _fetch_and_publish(priority if priority is not None else PRIORITY_BACKGROUND, pointer)
+
+        if pointer is None and current is None:
+            # Cold cluster: wait for the leader's first snapshot
+            deadline = time.time() + FIRST_SNAPSHOT_WAIT
+            while pointer is None and time.time() < deadline:
+                time.sleep(0.5)
+                pointer = _read_json(POINTER)
+            if pointer is None:
+                raise Exception("No snapshot has been published to the shared store yet")
+        if pointer is None:
+            return current
+        if current is None or current.version != pointer['version']:
+            return _pull(pointer)
+        # Up to date: the snapshot is as fresh as the leader's last fetch
+        return api_utils.publish_snapshot(current, max(pointer['fetched_at'], current.loaded_at))
+
+
+def _poll_forever():
+    while True:
+        try:
+            sync()
+            _state["last_error"] = None
+        except Exception as e:
+            _state["last_error"] = str(e)
+            logger.warning(f"Snapshot sync failed: {e}")
+        time.sleep(POLL_SECONDS)
+
+
+def ensure_started():
+    """Start this process's poller once (forked workers each start their own)."""
+    global _poller_pid
+    if not enabled() or _poller_pid == os.getpid():
+        return False
+    _poller_pid = os.getpid()
+    threading.Thread(target=_poll_forever, name="snapshot-sync", daemon=True).start()
+    return True
+
+
+def status():
+    """This node's role and the shared pointer, for /api/snapshot-sync."""
+    if not enabled():
+        return {"enabled": False}
+    current = api_utils.current_snapshot()
+    return {
+        "enabled": True,
+        "store": get_backend().describe(),
+        "node": node_id(),
+        "local_version": current.version if current is not None else None,
+        "latest": _read_json(POINTER),
+        "lease": _read_json(LEASE),
+        **_state,
+    }
+
+
+def install(app):
+    """Start the poller on the first request a worker serves."""
+    if not enabled():
+        return False
+
+    @app.before_request
+    def _start_snapshot_sync():
+        ensure_started()
+
+    return True
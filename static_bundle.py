@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Static data bundle for the dashboard
+Precomputes everything the dashboard asks the API for and writes it under
+public/data/, so the site is served entirely from the CDN and a scheduled
+rebuild replaces per-click function invocations:
+
+    public/data/manifest.json                  facets, totals, roles, file list
+    public/data/orders.<hash>.json             order-level filter columns
+    public/data/product_by_day.<hash>.json     per-pickup-day product counts
+    public/data/lines-<day>.<hash>.json        line items, one shard per pickup day
+
+Data files are named by the hash of their content, so they can be cached
+forever; only the small manifest is revalidated. Files from the previous
+build are kept until the next one, so a page that loaded the old manifest
+can still fetch its shards.
+
+Usage: python static_bundle.py [output_dir]
+"""
+
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import api_utils
+from sheets_scheduler import PRIORITY_BATCH
+
+BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public", "data")
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+NO_DATE = "none"
+# Text columns with at most this many distinct values are dictionary-encoded
+DICTIONARY_MAX_VALUES = 1000
+FILTER_ROLES = ('order_date', 'pickup_date', 'order_type', 'product')
+
+
+def _write_hashed(output_dir, prefix, payload):
+    """Write compact JSON under a content-hashed name; return the file name."""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    name = f"{prefix}.{hashlib.sha256(body).hexdigest()[:HASH_LENGTH]}.json"
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+    return name
+
+
+def encode_columns(df):
+    """
+    Column-oriented JSON payload for a frame.
+
+    Low-cardinality text columns are stored as indexes into a dictionary,
+    which is what makes a shard of line items small (product names, order
+    types and categories repeat on every row).
+
+    Returns:
+        Dict with "columns", "dictionaries" and row-major "rows"
+    """
+    values = json.loads(df.to_json(orient='split', index=False, date_format='iso'))
+    dictionaries = {}
+    for i, col in enumerate(values['columns']):
+        series = df[col]
+        if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'categorical'):
+            distinct = pd.unique(series.dropna().astype(str))
+            if 0 < len(distinct) <= DICTIONARY_MAX_VALUES and len(distinct) * 4 < len(series):
+                dictionaries[col] = sorted(distinct.tolist())
+                lookup = {v: n for n, v in enumerate(dictionaries[col])}
+                for row in values['data']:
+                    row[i] = lookup.get(row[i]) if row[i] is not None else None
+    return {"columns": values['columns'], "dictionaries": dictionaries, "rows": values['data']}
+
+
+def _day_keys(values):
+    """YYYY-MM-DD per value, NO_DATE for blanks."""
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, errors='coerce')
+    return values.dt.strftime('%Y-%m-%d').fillna(NO_DATE).to_numpy()
+
+
+def _sorted_text(values):
+    return sorted({str(v).strip() for v in values.dropna() if str(v).strip()})
+
+
+def build_bundle(store, output_dir=BUNDLE_DIR):
+    """
+    Write the bundle for a snapshot and replace the manifest.
+
+    Returns:
+        The manifest dict
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    roles = {role: store.role(role) for role in FILTER_ROLES}
+    order_date_col, pickup_col = roles['order_date'], roles['pickup_date']
+    order_type_col, product_col = roles['order_type'], roles['product']
+
+    # Order-level filter columns, so filtered order counts are exact even
+    # for orders without line items
+    order_columns = [c for c in (order_date_col, pickup_col, order_type_col) if c in store.orders.columns]
+    orders = store.orders[order_columns].reset_index()
+    orders_file = _write_hashed(output_dir, "orders", encode_columns(orders))
+
+    pivot = api_utils.product_by_day(store, {})
+    pivot_file = _write_hashed(output_dir, "product_by_day", encode_columns(pivot))
+
+    lines = store.join()
+    if pickup_col in lines.columns:
+        day_keys = _day_keys(lines[pickup_col])
+    else:
+        day_keys = np.full(len(lines), NO_DATE, dtype=object)
+    shards = []
+    for day in sorted(pd.unique(day_keys)):
+        shard = lines[day_keys == day]
+        shards.append({
+            "day": day,
+            "file": _write_hashed(output_dir, f"lines-{day}", encode_columns(shard)),
+            "rows": int(len(shard)),
+            "orders": int(shard['OrderID'].nunique()) if 'OrderID' in shard.columns else None,
+        })
+
+    order_dates = store.orders[order_date_col].dropna() if order_date_col in store.orders.columns else pd.Series(dtype='datetime64[ns]')
+    pickup_days = [s["day"] for s in shards if s["day"] != NO_DATE]
+    if pickup_col in store.orders.columns:
+        pickup_days = sorted(set(pickup_days) | {d for d in _day_keys(store.orders[pickup_col]) if d != NO_DATE})
+    manifest = {
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "version": store.version,
+        "roles": roles,
+        "columns": list(lines.columns),
+        "facets": {
+            "order_date_min": order_dates.min().date().isoformat() if len(order_dates) else None,
+            "order_date_max": order_dates.max().date().isoformat() if len(order_dates) else None,
+            "pickup_dates": pickup_days,
+            "products": _sorted_text(store.owner(product_col)[product_col]) if store.owner(product_col) is not None else [],
+            "order_types": _sorted_text(store.orders[order_type_col]) if order_type_col in store.orders.columns else [],
+        },
+        "summary": {"total_orders": int(len(store.orders)), "total_items": int(len(store.line_items))},
+        "files": {"orders": orders_file, "product_by_day": pivot_file},
+        "shards": shards,
+    }
+
+    previous = read_manifest(output_dir)
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    _prune(output_dir, [manifest, previous])
+    return manifest
+
+
+def read_manifest(output_dir=BUNDLE_DIR):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _manifest_files(manifest):
+    if not manifest:
+        return set()
+    return set(manifest.get("files", {}).values()) | {s["file"] for s in manifest.get("shards", [])}
+
+
+def _prune(output_dir, manifests):
+    """Delete data files referenced by neither the new nor the previous manifest."""
+    keep = set().union(*(_manifest_files(m) for m in manifests))
+    for name in os.listdir(output_dir):
+        if name.endswith(".json") and name != MANIFEST_NAME and name not in keep:
+            os.remove(os.path.join(output_dir, name))
+
+
+def main():
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else BUNDLE_DIR
+    store = api_utils.load_data(force=True, priority=PRIORITY_BATCH)
+    manifest = build_bundle(store, output_dir)
+    size = sum(os.path.getsize(os.path.join(output_dir, f)) for f in _manifest_files(manifest))
+    print(f"Static bundle written to {output_dir}: {manifest['summary']['total_orders']:,} orders, "
+          f"{len(manifest['shards'])} shards, {size / 1024:,.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
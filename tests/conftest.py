@@ -0,0 +1,74 @@
+"""
+Shared fixtures: snapshots built from the synthetic benchmark sheets
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import api_utils  # noqa: E402
+import schema_registry  # noqa: E402
+from benchmarks.synthetic_data import make_sheets  # noqa: E402
+
+# Orders whose Order Date cell is blank, as in half-filled sheet rows
+UNDATED_ORDERS = 10
+
+
+def build_store(n_orders=200, seed=0, edit=None):
+    """
+    Parse and normalize a synthetic season into an OrderStore.
+
+    Args:
+        n_orders: Number of orders
+        seed: Random seed of the synthetic sheets
+        edit: Optional callable(customer_orders_df, bakery_products_df)
+            applied to the raw frames before parsing
+
+    Returns:
+        OrderStore (not published)
+    """
+    customer_orders_df, bakery_products_df = make_sheets(n_orders, seed=seed)
+    customer_orders_df.loc[customer_orders_df.index[:UNDATED_ORDERS], 'Order Date'] = ''
+    if edit is not None:
+        edit(customer_orders_df, bakery_products_df)
+    schema_registry.prepare_frames(customer_orders_df, bakery_products_df)
+    return api_utils.build_order_store(customer_orders_df, bakery_products_df, copy=False)
+
+
+@pytest.fixture
+def store():
+    return build_store()
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    import app
+    monkeypatch.setattr(api_utils, '_data_cache', None)
+    api_utils.publish_snapshot(store)
+    monkeypatch.setattr(api_utils, 'load_data', lambda *a, **k: api_utils.current_snapshot())
+    return app.app.test_client()
+
+
+def edit_season(customer_orders_df, bakery_products_df):
+    """A refresh's worth of edits: renames, pickups, a moved day, a deletion and a new order."""
+    rows = customer_orders_df.index
+    customer_orders_df.loc[rows[20], 'Customer Last Name'] = 'Zimmerman'
+    customer_orders_df.loc[rows[21], 'Customer First Name'] = 'Quinn'
+    pending = rows[customer_orders_df['Pickup Timestamp'] == ''][:3]
+    customer_orders_df.loc[pending, 'Pickup Timestamp'] = '11/24/2025 10:15:00'
+    customer_orders_df.loc[rows[22], 'Due Pickup Date'] = '11/30/2025'
+    customer_orders_df.drop(index=rows[23], inplace=True)
+    new_order = customer_orders_df.iloc[[0]].assign(
+        **{'OrderID': 'TG25-NEW001', 'Customer Last Name': 'Zimmerman', 'Pickup Timestamp': ''}
+    )
+    customer_orders_df.loc[len(rows)] = new_order.iloc[0]
+
+
+def refreshed_pair():
+    """Return (old store, edited store, changed OrderIDs) for incremental-update tests."""
+    old, new = build_store(), build_store(edit=edit_season)
+    return old, new, api_utils.changed_orders(old, new)
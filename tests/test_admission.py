@@ -0,0 +1,41 @@
+"""
+Endpoint admission classes shared by the Flask views and the ASGI routes
+"""
+
+import pytest
+
+import admission
+
+NARROWED = {'date_start': '', 'date_end': '', 'order_type': '', 'product': '', 'pickup_dates': '2024-12-20'}
+UNFILTERED = dict(NARROWED, pickup_dates='')
+
+
+def test_every_class_names_a_flask_view():
+    import app
+    views = set(app.app.view_functions)
+    assert set(admission.ENDPOINT_CLASSES) <= views
+
+
+def test_data_class_depends_on_the_query():
+    assert admission.endpoint_class('data', NARROWED) == 'interactive'
+    assert admission.endpoint_class('data', NARROWED, arrow=True) == 'bulk'
+    assert admission.endpoint_class('data', UNFILTERED) == 'bulk'
+    assert admission.endpoint_class('product_by_day') == 'bulk'
+    assert admission.endpoint_class('health') is None
+
+
+def test_asgi_routes_use_the_flask_classes():
+    pytest.importorskip('httpx')
+    import asgi
+    limited = {h.__name__ for h in asgi.ROUTES.values()} & set(admission.ENDPOINT_CLASSES)
+    assert limited == {'summary', 'data', 'product_by_day'}
+
+
+def test_full_class_sheds_the_view(client, monkeypatch):
+    gate = admission.classes['interactive']
+    monkeypatch.setattr(gate, 'in_flight', gate.max_concurrent)
+    monkeypatch.setattr(gate, 'max_waiting', 0)
+    response = client.get('/api/summary')
+    assert response.status_code == 503
+    assert response.get_json()['overloaded'] is True
+    assert client.get('/api/product-by-day').status_code == 200
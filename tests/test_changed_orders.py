@@ -0,0 +1,35 @@
+import api_utils
+from conftest import build_store, edit_season
+
+
+def test_first_load_changes_every_order(store):
+    assert sorted(api_utils.changed_orders(None, store)) == sorted(store.orders.index)
+
+
+def test_identical_content_changes_nothing(store):
+    assert api_utils.changed_orders(store, build_store()) == []
+    assert api_utils.changed_orders(store, store.restamp(0, version=9)) == []
+
+
+def test_edited_orders_and_line_items_are_reported():
+    old = build_store()
+
+    def edit(customer_orders_df, bakery_products_df):
+        edit_season(customer_orders_df, bakery_products_df)
+        # A line item edit changes its order
+        moved = bakery_products_df.index[bakery_products_df['OrderID'] == old.orders.index[50]][0]
+        bakery_products_df.loc[moved, 'CakeQty'] = 12
+    new = build_store(edit=edit)
+
+    ids = old.orders.index
+    expected = {ids[20], ids[21], ids[22], ids[23], ids[50], 'TG25-NEW001'}
+    picked_up = old.orders[old.role('pickup_timestamp')].isna() & new.orders[new.role('pickup_timestamp')].reindex(ids).notna()
+    expected |= set(ids[picked_up.to_numpy()])
+    assert set(api_utils.changed_orders(old, new)) == expected
+
+
+def test_fingerprint_follows_content_not_version(store):
+    same = build_store().restamp(0, version=store.version + 5)
+    assert same.fingerprint == store.fingerprint
+    assert same.token != store.token
+    assert build_store(edit=edit_season).fingerprint != store.fingerprint
@@ -0,0 +1,44 @@
+import customer_index
+from conftest import refreshed_pair
+
+
+def test_customer_index_incremental_matches_rebuild():
+    old, new, changed = refreshed_pair()
+    incremental = customer_index.CustomerIndex()
+    incremental.update(old)
+    incremental.update(new, changed)
+    rebuilt = customer_index.CustomerIndex()
+    rebuilt.update(new)
+
+    for query in ('zimmerman', 'quinn', 'smi', 'ann', 'lee', 'TG25-NEW001', 'tg25-000005'):
+        _, got, got_total = incremental.lookup(query, 500)
+        _, want, want_total = rebuilt.lookup(query, 500)
+        assert got_total == want_total, query
+        assert list(got) == list(want), query
+    _, positions, total = incremental.lookup('zimmerman', 500)
+    assert total >= 2
+    removed = old.orders.index[23]
+    _, positions, total = incremental.lookup(removed, 500)
+    assert removed not in set(new.orders.index[positions])
+
+
+def test_customer_index_nests_line_items(store):
+    index = customer_index.CustomerIndex()
+    index.update(store)
+    order_id = store.orders.index[5]
+    searched, positions, total = index.lookup(order_id)
+    records = index.orders_with_lines(searched, positions)
+    assert total == 1 and records[0]['OrderID'] == order_id
+    assert len(records[0]['line_items']) == int((store.line_items['OrderID'] == order_id).sum())
+
+
+def test_lookup_rejects_bad_limit(client):
+    response = client.get('/api/lookup?q=smith&limit=ten')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_lookup_limit_is_clamped(client):
+    response = client.get('/api/lookup?q=smith&limit=0')
+    assert response.status_code == 200
+    assert len(response.get_json()['orders']) == 1
@@ -0,0 +1,82 @@
+import collections
+import json
+
+import pytest
+
+import api_utils
+import delta_sync
+from conftest import build_store, edit_season
+
+
+def edit_lines(customer_orders_df, bakery_products_df):
+    """Second refresh: line items change product, disappear and appear."""
+    edit_season(customer_orders_df, bakery_products_df)
+    rows = bakery_products_df.index
+    bakery_products_df.loc[rows[30], 'Product Description'] = 'Pumpkin Pie'
+    bakery_products_df.loc[rows[31], 'Product Description'] = 'Sourdough Loaf'
+    bakery_products_df.loc[rows[32], 'CakeQty'] = 9
+    bakery_products_df.drop(index=rows[33], inplace=True)
+    bakery_products_df.loc[len(rows)] = bakery_products_df.loc[rows[40]]
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    monkeypatch.setattr(delta_sync, '_history', collections.deque())
+    monkeypatch.setattr(delta_sync, '_history_keys', 0)
+    stores = [
+        build_store().restamp(0, version=1),
+        build_store(edit=edit_season).restamp(0, version=2),
+        build_store(edit=edit_lines).restamp(0, version=3),
+    ]
+    for old, new in zip(stores, stores[1:]):
+        delta_sync.record(old, new, api_utils.changed_orders(old, new))
+    return stores
+
+
+def apply_delta(rows, body):
+    """Merge a delta response into rows held by key, as the dashboard does."""
+    if not body['delta']:
+        return {row[delta_sync.KEY_COLUMN]: row for row in body['data']}
+    rows = dict(rows)
+    for key in body['deleted']:
+        rows.pop(key, None)
+    for row in body['inserted'] + body['updated']:
+        rows[row[delta_sync.KEY_COLUMN]] = row
+    return rows
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'product': 'pie'},
+    {'order_type': 'Pickup'},
+    {'date_start': '2025-10-25', 'product': 'bread'},
+])
+@pytest.mark.parametrize('base', [0, 1])
+def test_delta_applied_to_held_rows_matches_full_response(snapshots, filters, base):
+    held_body = json.loads(delta_sync.data_body(snapshots[base], filters))
+    held = apply_delta({}, held_body)
+
+    latest = snapshots[-1]
+    delta = json.loads(delta_sync.data_body(latest, filters, since=held_body['delta_base']))
+    full = json.loads(delta_sync.data_body(latest, filters))
+
+    assert delta['delta'] is True
+    assert delta['delta_base'] == full['delta_base'] == latest.token
+    assert apply_delta(held, delta) == apply_delta({}, full)
+    changed = len(delta['inserted']) + len(delta['updated']) + len(delta['deleted'])
+    assert changed < len(full['data'])
+    if not filters:
+        assert delta['inserted'] and delta['updated'] and delta['deleted']
+
+
+def test_unknown_base_gets_full_rows(snapshots):
+    body = json.loads(delta_sync.data_body(snapshots[-1], {}, since='7.0123456789abcdef'))
+    assert body['delta'] is False
+    assert len(body['data']) == len(snapshots[-1].line_items)
+
+
+def test_current_base_gets_empty_delta(snapshots):
+    latest = snapshots[-1]
+    body = json.loads(delta_sync.data_body(latest, {}, since=latest.token))
+    assert body['delta'] is True
+    assert body['inserted'] == body['updated'] == body['deleted'] == []
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import export_archive  # noqa: E402
+
+
+def run(orders, items):
+    customer_orders = pd.DataFrame(orders, columns=['OrderID', 'Order Date', 'Total'])
+    customer_orders['Order Date'] = pd.to_datetime(customer_orders['Order Date'])
+    bakery_products = pd.DataFrame(items, columns=['OrderID', 'Product'])
+    return {"customer_orders": customer_orders, "bakery_products": bakery_products}
+
+
+@pytest.fixture
+def archive(tmp_path):
+    older = run(
+        [('A', '2025-10-01', 10.0), ('B', '2025-10-05', 20.0), ('C', '2025-10-10', 30.0)],
+        [('A', 'Apple Pie'), ('B', 'Pecan Pie'), ('B', 'Rolls'), ('C', 'Scones')],
+    )
+    newer = run(
+        [('B', '2025-10-06', 25.0), ('D', '2025-10-20', 40.0)],
+        [('B', 'Pecan Pie'), ('D', 'Carrot Cake')],
+    )
+    for frames in (older, newer):
+        export_archive.export_frames(frames, date_column='Order Date', output_dir=str(tmp_path))
+    return str(tmp_path)
+
+
+def test_overlapping_runs_are_merged_newest_first(archive):
+    frames = export_archive.load_range(output_dir=archive)
+    orders = frames['customer_orders'].set_index('OrderID')
+    assert sorted(orders.index) == ['A', 'B', 'C', 'D']
+    assert orders.loc['B', 'Total'] == 25.0
+    items = frames['bakery_products']
+    assert items[items['OrderID'] == 'B']['Product'].tolist() == ['Pecan Pie']
+    assert len(items) == 4
+
+
+def test_range_is_clipped(archive):
+    frames = export_archive.load_range('2025-10-05', '2025-10-10', output_dir=archive)
+    assert sorted(frames['customer_orders']['OrderID']) == ['B', 'C']
+    assert sorted(frames['bakery_products']['OrderID']) == ['B', 'C']
+
+
+def test_range_end_is_inclusive(archive):
+    frames = export_archive.load_range('2025-10-20', '2025-10-20', output_dir=archive)
+    assert frames['customer_orders']['OrderID'].tolist() == ['D']
+
+
+def test_no_overlap(archive):
+    assert export_archive.load_range('2026-01-01', '2026-02-01', output_dir=archive) is None
+
+
+def test_identical_run_is_not_rewritten(archive):
+    frames = export_archive.load_export(export_archive.read_manifest(archive)[-1], archive)
+    entry, written = export_archive.export_frames(frames, date_column='Order Date', output_dir=archive)
+    assert not written
+    assert len(export_archive.read_manifest(archive)) == 2
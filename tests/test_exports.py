@@ -0,0 +1,15 @@
+import pytest
+
+import exports
+
+
+@pytest.mark.parametrize('product', ['pie<b', 'Pie & Rolls', '<para>', 'a>b'])
+def test_pdf_filter_text_is_escaped(store, product):
+    body = exports.orders_pdf(store, {'product': product})
+    assert body.startswith(b'%PDF')
+
+
+def test_pdf_route_accepts_markup_characters(client):
+    response = client.get('/api/export/pdf?product=pie<b&order_type=A%26B')
+    assert response.status_code == 200
+    assert response.data.startswith(b'%PDF')
@@ -0,0 +1,61 @@
+import pytest
+
+import api_utils
+import day_index
+from conftest import UNDATED_ORDERS
+
+
+def test_undated_orders_are_present(store):
+    assert store.orders[store.role('order_date')].isna().sum() == UNDATED_ORDERS
+
+
+def test_no_filters_counts_every_order(store):
+    summary = api_utils.order_summary(store, {})
+    assert summary == {"total_orders": len(store.orders), "total_items": len(store.line_items)}
+
+
+def test_blank_filters_count_every_order(store):
+    summary = api_utils.order_summary(store, {'date_start': '', 'date_end': '', 'product': ''})
+    assert summary == {"total_orders": len(store.orders), "total_items": len(store.line_items)}
+
+
+@pytest.mark.parametrize('filters', [
+    {'date_start': '2025-10-20'},
+    {'date_end': '2025-11-01'},
+    {'date_start': '2025-10-20', 'date_end': '2025-11-01'},
+    {'date_start': '2025-11-30'},
+])
+def test_day_index_matches_masks(store, filters):
+    order_mask, line_mask = api_utils.filter_masks(store, filters)
+    assert day_index.is_date_only(filters)
+    assert api_utils.order_summary(store, filters) == {
+        "total_orders": int(order_mask.sum()),
+        "total_items": int(line_mask.sum()),
+    }
+
+
+def test_date_range_excludes_undated_orders(store):
+    order_mask, _ = api_utils.filter_masks(store, {'date_start': '2000-01-01'})
+    assert int(order_mask.sum()) == len(store.orders) - UNDATED_ORDERS
+
+
+@pytest.mark.parametrize('filters', [
+    {},
+    {'product': 'pie'},
+    {'order_type': 'Pickup,Delivery'},
+    {'date_start': '2025-10-20', 'product': 'bread'},
+])
+def test_masks_match_filter_data(store, filters):
+    order_mask, line_mask = api_utils.filter_masks(store, filters)
+    df = api_utils.filter_data(store, filters)
+    assert int(line_mask.sum()) == len(df)
+    if not any(filters.values()):
+        assert int(order_mask.sum()) == len(store.orders)
+
+
+@pytest.mark.parametrize('path', ['/api/summary', '/api/data', '/api/product-by-day', '/api/export/xls'])
+def test_unparseable_date_is_a_bad_request(client, path):
+    response = client.get(path, query_string={'date_start': 'bad'})
+    assert response.status_code == 400
+    assert 'date_start' in response.get_json()['error']
+    assert client.get(path, query_string={'date_end': '2025-13-45'}).status_code == 400
@@ -0,0 +1,58 @@
+"""
+The API and the CLI must work on an install without requirements-optional.txt
+(the Vercel function). Each check runs in a fresh interpreter where importing
+pyarrow fails.
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import ROOT
+
+PRELUDE = f"""
+import sys
+sys.modules['pyarrow'] = None
+sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, 'tests')!r}]
+import logging
+logging.disable(logging.CRITICAL)
+"""
+
+CLIENT = """
+from conftest import build_store
+import api_utils
+api_utils.publish_snapshot(build_store())
+api_utils.load_data = lambda *a, **k: api_utils.current_snapshot()
+import app
+client = app.app.test_client()
+"""
+
+
+def run_without_pyarrow(*blocks):
+    code = PRELUDE + ''.join(textwrap.dedent(block) for block in blocks)
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, text=True, cwd=ROOT, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return result.stdout
+
+
+def test_seasons_without_pyarrow():
+    run_without_pyarrow(CLIENT, """
+    response = client.get('/api/seasons')
+    assert response.status_code == 501, response.status_code
+    assert response.get_json()['success'] is False
+    body = client.get('/api/seasons/summary').get_json()
+    assert body['success'] and [s['source'] for s in body['seasons']] == ['live'], body
+    """)
+
+
+def test_sales_report_imports_without_pyarrow():
+    run_without_pyarrow("""
+    import sales_report
+    import export_archive
+    assert callable(sales_report.save_report_to_archive)
+    assert export_archive.read_manifest('/nonexistent') == []
+    """)
@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+import pickup_queue
+from conftest import refreshed_pair
+
+
+def test_pickup_queue_incremental_matches_rebuild():
+    old, new, changed = refreshed_pair()
+    incremental = pickup_queue.PickupQueue()
+    incremental.update(old)
+    incremental.update(new, changed)
+    rebuilt = pickup_queue.PickupQueue()
+    rebuilt.update(new)
+
+    assert incremental.all_days() == rebuilt.all_days()
+    for day in rebuilt.all_days():
+        assert incremental.day_summary(day) == rebuilt.day_summary(day)
+        assert incremental.pending_orders(day) == rebuilt.pending_orders(day)
+    assert incremental.day_summary('2025-11-30')['total'] >= 1
+
+
+def test_pickup_queue_counts_match_snapshot(store):
+    queue = pickup_queue.PickupQueue()
+    queue.update(store)
+    days = queue.all_days()
+    assert sum(d['total'] for d in days.values()) == len(store.orders)
+    picked_up = store.orders[store.role('pickup_timestamp')].notna()
+    assert sum(d['completed'] for d in days.values()) == int(picked_up.sum())
+
+
+def test_day_key_normalizes():
+    assert pickup_queue.day_key('11/24/2025') == '2025-11-24'
+    assert pickup_queue.day_key('2025-11-24T15:30') == '2025-11-24'
+    assert pickup_queue.day_key('Unscheduled') == pickup_queue.UNSCHEDULED
+    assert pickup_queue.day_key('') == pd.Timestamp.today().strftime('%Y-%m-%d')
+
+
+@pytest.mark.parametrize('url', [
+    '/api/pickup-queue?include=orders&limit=1.5',
+    '/api/pickup-queue?day=not-a-day',
+])
+def test_bad_parameters_are_rejected(client, url):
+    response = client.get(url)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_pickup_queue_day_is_normalized(client):
+    body = client.get('/api/pickup-queue?day=11/24/2025&include=orders&limit=3').get_json()
+    assert body['day'] == '2025-11-24'
+    assert body['queue']['total'] > 0
+    assert len(body['pending_orders']) == 3
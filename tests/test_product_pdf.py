@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+import product_pdf
+
+pypdf = pytest.importorskip('pypdf')
+
+
+def page_texts(body):
+    return [page.extract_text() for page in pypdf.PdfReader(io.BytesIO(body)).pages]
+
+
+def test_sections_are_reused(store):
+    product_pdf._sections.clear()
+    _, rendered, reused = product_pdf.product_by_day_pdf(store, {})
+    assert rendered > 0 and reused == 0
+    _, rendered, reused = product_pdf.product_by_day_pdf(store, {})
+    assert rendered == 0 and reused > 0
+
+
+def test_without_pypdf_the_same_pages_are_rendered(store, monkeypatch):
+    merged, *_ = product_pdf.product_by_day_pdf(store, {})
+    monkeypatch.setattr(product_pdf, 'PYPDF_AVAILABLE', False)
+    whole, rendered, reused = product_pdf.product_by_day_pdf(store, {})
+    assert reused == 0
+    merged_pages, whole_pages = page_texts(merged), page_texts(whole)
+    assert len(merged_pages) == len(whole_pages)
+    for got, want in zip(whole_pages[1:], merged_pages[1:]):
+        assert sorted(got.splitlines()) == sorted(want.splitlines())
+
+
+@pytest.mark.parametrize('product', ['pie<b', 'Pie & Rolls'])
+def test_filter_text_is_escaped(store, monkeypatch, product):
+    for available in (True, False):
+        monkeypatch.setattr(product_pdf, 'PYPDF_AVAILABLE', available)
+        body, _, _ = product_pdf.product_by_day_pdf(store, {'product': product})
+        assert body.startswith(b'%PDF')
@@ -0,0 +1,28 @@
+import pandas as pd
+
+import data_sources
+import sales_report
+import schema_registry
+
+
+def test_xlsx_dates_keep_their_time_of_day(tmp_path):
+    path = str(tmp_path / "orders.xlsx")
+    pd.DataFrame({
+        'OrderID': ['A', 'B'],
+        'Order Date': [pd.Timestamp('2025-11-01'), pd.Timestamp('2025-11-02')],
+        'Pickup Timestamp': [pd.Timestamp('2025-11-24 10:15:30'), pd.NaT],
+    }).to_excel(path, sheet_name='Customer Orders', index=False)
+
+    df = sales_report.read_export_data(path, 'Customer Orders')
+    assert df['Pickup Timestamp'].tolist() == ['11/24/2025 10:15:30', '']
+    parsed = schema_registry.table_plan(df.columns).convert_dates(df.copy())
+    assert parsed['Pickup Timestamp'][0] == pd.Timestamp('2025-11-24 10:15:30')
+    assert parsed['Order Date'].tolist() == [pd.Timestamp('2025-11-01'), pd.Timestamp('2025-11-02')]
+
+
+def test_every_store_empty_gives_empty_frames(monkeypatch):
+    sources = [data_sources.DataSource('north', 'sheet-a'), data_sources.DataSource('south', 'sheet-b')]
+    monkeypatch.setattr(data_sources, 'configured_sources', lambda: sources)
+    monkeypatch.setattr(sales_report, 'read_sheet_data', lambda client, sheet, spreadsheet_id: pd.DataFrame())
+    customer_orders_df, bakery_products_df = sales_report.read_all_sources(client=None)
+    assert customer_orders_df.empty and bakery_products_df.empty
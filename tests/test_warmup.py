@@ -0,0 +1,71 @@
+import concurrent.futures
+import os
+
+import pandas as pd
+import pytest
+
+import data_sources
+import warmup
+
+
+@pytest.fixture
+def source_state(monkeypatch):
+    monkeypatch.setattr(data_sources, '_states', {})
+    monkeypatch.setattr(data_sources, '_executor', None)
+    # after_fork replaces the locks; put the originals back afterwards
+    monkeypatch.setattr(data_sources, '_executor_lock', data_sources._executor_lock)
+    monkeypatch.setattr(data_sources, '_states_lock', data_sources._states_lock)
+    source = data_sources.DataSource('north', 'sheet-id')
+    return source, data_sources._state(source)
+
+
+def test_after_fork_drops_inherited_fetch_pool(source_state):
+    source, state = source_state
+    executor = data_sources._get_executor()
+    pending = concurrent.futures.Future()
+    done = concurrent.futures.Future()
+    done.set_result(None)
+    state.future, state.waited, state.frames = pending, True, ('orders', 'line items')
+    other = data_sources._state(data_sources.DataSource('south', 'sheet-id'))
+    other.future = done
+
+    warmup.after_fork()
+
+    assert data_sources._executor is None
+    assert state.future is None and state.waited is False
+    assert state.frames == ('orders', 'line items')
+    assert other.future is done
+    assert data_sources._get_executor() is not executor
+    executor.shutdown()
+    data_sources._get_executor().shutdown()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_fetch_completes_in_forked_child(source_state, monkeypatch):
+    source, state = source_state
+    monkeypatch.setattr(data_sources, 'fetch_source', lambda source, priority: ('orders', 'line items'))
+    executor = data_sources._get_executor()
+    # A fetch left pending in the parent, as when the master forks mid-refresh
+    state.future = concurrent.futures.Future()
+
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            warmup.after_fork()
+            future = data_sources._start_fetch(source, None)
+            code = 0 if future.result(timeout=5) == ('orders', 'line items') else 1
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    executor.shutdown()
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_warm_filters_follow_the_snapshot(store, monkeypatch):
+    monkeypatch.setattr(warmup.pd.Timestamp, 'now', classmethod(lambda cls, tz=None: pd.Timestamp('2025-11-23 08:00')))
+    days = [f['pickup_dates'] for f in warmup.warm_filters(store) if 'pickup_dates' in f]
+    pickup = store.orders[store.role('pickup_date')].dt.strftime('%Y-%m-%d')
+    busiest = pickup[pickup >= '2025-11-23'].value_counts().idxmax()
+    assert days[:2] == ['2025-11-23', '2025-11-24']
+    assert busiest in days and len(days) == len(set(days))
@@ -0,0 +1,133 @@
+"""
+Pre-fork warm-up for gunicorn
+With preload enabled, the master process imports the app and calls warm()
+before forking. That loads the snapshot once and builds the day index, the
+customer lookup index, the pickup queue, the sort permutations, the warmed
+hot queries and the Arrow columns. gc.freeze() then moves everything
+allocated so far out of the collector's reach, so the workers share those
+pages copy-on-write instead of each dirtying its own copy on the first
+collection.
+after_fork() runs in each worker and resets the state that must not be
+shared between processes.
+"""
+
+import gc
+import importlib.util
+import logging
+import random
+import sys
+import time
+
+import pandas as pd
+
+import api_utils
+
+logger = logging.getLogger(__name__)
+
+# Filters run once so the pandas code paths behind them are imported and
+# warm; the pickup days are added per snapshot by warm_filters()
+WARM_FILTERS = [
+    {},
+    {'product': 'pie'},
+]
+
+
+def warm_filters(store):
+    """
+    WARM_FILTERS plus the pickup days about to be queried: today, tomorrow
+    and the busiest pickup day from today on (the busiest overall once the
+    season is over).
+    """
+    today = pd.Timestamp.now().normalize()
+    days = [today, today + pd.Timedelta(days=1)]
+    col = store.role('pickup_date')
+    if col in store.orders.columns:
+        counts = store.orders[col].dropna().dt.normalize().value_counts()
+        upcoming = counts[counts.index >= today]
+        if len(counts):
+            days.append((upcoming if len(upcoming) else counts).idxmax())
+    days = list(dict.fromkeys(day.strftime('%Y-%m-%d') for day in days))
+    return WARM_FILTERS + [{'pickup_dates': day} for day in days]
+
+
+def warm():
+    """
+    Load the snapshot and build every per-snapshot structure.
+
+    Failures are logged and never prevent the server from starting; the
+    workers then load lazily as before.
+
+    Returns:
+        Dict of step name -> seconds
+    """
+    timings = {}
+
+    def step(name, fn):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    step('load', api_utils.load_data)
+    store = api_utils.current_snapshot()
+    if store is not None:
+        import customer_index
+        import day_index
+        import pickup_queue
+        import sort_index
+        step('order_hashes', lambda: store.order_hashes)
+        step('day_index', lambda: day_index.get_day_index(store))
+        step('customer_index', lambda: customer_index.get_index(store))
+        step('pickup_queue', lambda: pickup_queue.get_queue(store))
+        step('sort_index', lambda: sort_index.get_sort_index(store))
+        step('filters', lambda: [api_utils.filter_data(store, f) for f in warm_filters(store)])
+
+        def hot_queries():
+            # Synchronously here, so the forked workers inherit the warmed entries
+            import query_cache
+            query_cache.warm(store)
+        step('query_cache', hot_queries)
+
+        def arrow_columns():
+            import arrow_ipc
+            arrow_ipc.snapshot_columns(store)
+        if importlib.util.find_spec('pyarrow') is not None:
+            step('arrow', arrow_columns)
+
+    step('freeze', freeze)
+    logger.info(f"Pre-fork warm-up finished: {timings}")
+    return timings
+
+
+def freeze():
+    """Collect garbage once, then exempt all surviving objects from future collections."""
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def after_fork():
+    """
+    Reset per-process state in a freshly forked worker.
+
+    HTTP clients and credentials are re-created lazily, and the random
+    generator is reseeded so workers do not draw identical backoff jitter.
+    """
+    random.seed()
+    import live_updates
+    # Invalidations received by the other workers reach this one through a shared file
+    live_updates.ensure_watching()
+    sources = sys.modules.get('data_sources')
+    if sources is not None:
+        # The master's source fetch pool has no threads in this process
+        sources.after_fork()
+    sync = sys.modules.get('snapshot_sync')
+    if sync is not None:
+        # The master's poller thread did not survive the fork
+        sync.ensure_started()
+    asgi = sys.modules.get('asgi')
+    if asgi is not None:
+        asgi._http_client = None
+        asgi._credentials = None